@@ -0,0 +1,58 @@
+// Benchmark runner for the worker's calculateKPIs.
+//
+// Usage: node bench-kpi.js <series.json> [iterations]
+//
+// <series.json> holds columns { ts, pv, op, sp, mode, valve_position, quality_code }
+// (ts in epoch seconds). The methods are loaded from src/index.js as-is, because
+// importing that module would start the worker. Prints one JSON object with the
+// KPIs of the last run and per-iteration timings in milliseconds.
+import { readFileSync } from 'fs';
+import { dirname, join } from 'path';
+import { fileURLToPath } from 'url';
+
+const here = dirname(fileURLToPath(import.meta.url));
+const source = readFileSync(join(here, 'src', 'index.js'), 'utf8');
+
+const start = source.indexOf('  calculateKPIs(data, config, loop) {');
+const end = source.indexOf('  async getActiveLoops() {');
+if (start < 0 || end < 0) {
+  throw new Error('Could not locate calculateKPIs in src/index.js');
+}
+
+let lastError = null;
+const log = {
+  debug() {},
+  info() {},
+  warn() {},
+  error(obj) { lastError = obj && obj.error; },
+};
+const KPICalculator = new Function('log', `return class { ${source.slice(start, end)} }`)(log);
+
+const [, , seriesPath, iterationsArg] = process.argv;
+const iterations = parseInt(iterationsArg || '5', 10);
+const columns = JSON.parse(readFileSync(seriesPath, 'utf8'));
+
+// Row objects as produced by influxClient.queryData
+const buildStart = process.hrtime.bigint();
+const data = columns.ts.map((ts, i) => ({
+  ts: new Date(ts * 1000),
+  loop_id: 'BENCH',
+  pv: columns.pv[i],
+  op: columns.op[i],
+  sp: columns.sp[i],
+  mode: columns.mode ? columns.mode[i] : null,
+  valve_position: columns.valve_position ? columns.valve_position[i] : null,
+  quality_code: columns.quality_code ? columns.quality_code[i] : 192,
+}));
+const buildMs = Number(process.hrtime.bigint() - buildStart) / 1e6;
+
+const calculator = new KPICalculator();
+const timings = [];
+let kpis = null;
+for (let i = 0; i < iterations; i++) {
+  const t0 = process.hrtime.bigint();
+  kpis = calculator.calculateKPIs(data, {}, { loop_id: 'BENCH' });
+  timings.push(Number(process.hrtime.bigint() - t0) / 1e6);
+}
+
+console.log(JSON.stringify({ kpis, timings_ms: timings, build_rows_ms: buildMs, error: lastError }));
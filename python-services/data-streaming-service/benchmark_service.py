@@ -0,0 +1,272 @@
+#!/usr/bin/env python3
+"""Throughput benchmarks for the data streaming service.
+
+Measures sample generation (``generate_batch`` and the legacy
+``generate_multiple_loops``), line protocol serialization (columnar and legacy
+record paths) and end-to-end ``InfluxDBStreamingClient.write_data_points``
+against a local mock of InfluxDB's write endpoint, for a range of loop counts
+and ticks per write. Each case runs in a fresh process so its peak RSS is its
+own; memory is traced in a separate tracemalloc pass so it does not skew the
+timings. Memory is reported in bytes per sample (the traced peak of one call
+and what its result keeps), not as a count of allocations. Results can be saved as, and compared against, a JSON
+baseline.
+"""
+
+import os
+import sys
+import json
+import time
+import platform
+import argparse
+import resource
+import threading
+import tracemalloc
+import multiprocessing
+from datetime import datetime
+from concurrent.futures import ProcessPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import numpy as np
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+DEFAULT_BASELINE = os.path.join(HERE, "benchmark_baseline.json")
+
+# Add the src directory to the Python path
+sys.path.insert(0, os.path.join(HERE, "src"))
+
+STAGES = ("generate_batch", "generate_records", "serialize_batch", "serialize_records", "write")
+LEGACY_STAGES = ("generate_records", "serialize_records")
+# Stages whose calls carry several ticks; generation is always one tick per call
+BATCHED_STAGES = ("serialize_batch", "serialize_records", "write")
+START_NS = 1_736_500_000 * 10**9
+
+
+class MockWriteHandler(BaseHTTPRequestHandler):
+    """Accepts InfluxDB v2 writes and counts the lines received."""
+
+    protocol_version = "HTTP/1.1"
+
+    def do_POST(self):
+        body = self.rfile.read(int(self.headers.get("Content-Length", 0)))
+        if self.path.startswith("/api/v2/write"):
+            with self.server.lock:
+                self.server.lines += body.count(b"\n") + (1 if body and not body.endswith(b"\n") else 0)
+                self.server.bytes += len(body)
+        self.send_response(204)
+        self.end_headers()
+
+    def do_GET(self):
+        self.send_response(204)
+        self.end_headers()
+
+    do_HEAD = do_GET
+
+    def log_message(self, format, *args):
+        pass
+
+
+def start_mock_influx() -> ThreadingHTTPServer:
+    """Start the mock write endpoint on a free local port."""
+    server = ThreadingHTTPServer(("127.0.0.1", 0), MockWriteHandler)
+    server.daemon_threads = True
+    server.lock = threading.Lock()
+    server.lines = 0
+    server.bytes = 0
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def peak_rss_mb() -> float:
+    """Peak resident set size of this process (ru_maxrss is KiB on Linux, bytes on macOS)."""
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return rss / 2**20 if sys.platform == "darwin" else rss / 2**10
+
+
+def run_case(stage: str, n_loops: int, ticks: int, influx_url: str, min_time: float, max_repeats: int) -> dict:
+    """Run one benchmark case (in a worker process) and return its measurements."""
+    os.environ["INFLUXDB_URL"] = influx_url
+    os.environ["INFLUXDB_TOKEN"] = "benchmark"
+    import logging
+    logging.disable(logging.WARNING)
+
+    from data_streaming_service.batch import SampleBatch
+    from data_streaming_service.data_generator import ControlLoopDataGenerator
+    from data_streaming_service.influx_client import InfluxDBStreamingClient
+
+    rss_base = peak_rss_mb()
+    generator = ControlLoopDataGenerator(seed=0)
+    loop_ids = [f"BENCH{i:05d}" for i in range(n_loops)]
+    client = InfluxDBStreamingClient()
+    tick = iter(range(10**9))
+
+    def next_ts() -> int:
+        return START_NS + next(tick) * 10**9
+
+    if stage == "generate_batch":
+        call = lambda: generator.generate_batch(next_ts(), loop_ids)
+    elif stage == "generate_records":
+        call = lambda: generator.generate_multiple_loops(datetime.utcfromtimestamp(next_ts() / 1e9), loop_ids)
+    else:
+        batch = SampleBatch.concat([generator.generate_batch(next_ts(), loop_ids) for _ in range(ticks)])
+        if stage == "serialize_batch":
+            call = lambda: client.serialize(batch)
+        elif stage == "serialize_records":
+            records = batch.to_records()
+            call = lambda: client.serialize(records)
+        else:
+            call = lambda: client.write_data_points(batch)
+    samples = n_loops * ticks
+
+    # Warm-up, then repeat until min_time has passed
+    if call() is False:
+        raise RuntimeError(f"{stage} failed against {influx_url}")
+    timings = []
+    started = time.perf_counter()
+    while len(timings) < max_repeats and (not timings or time.perf_counter() - started < min_time):
+        t0 = time.perf_counter_ns()
+        call()
+        timings.append(time.perf_counter_ns() - t0)
+
+    # Before tracemalloc, whose own bookkeeping would inflate it
+    rss_peak = peak_rss_mb()
+
+    # Peak traced bytes during one call, and bytes still held by its result
+    tracemalloc.start()
+    before, _ = tracemalloc.get_traced_memory()
+    result = call()
+    current, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    del result
+
+    ns_per_sample = float(np.median(timings)) / samples
+    client.close()
+    return {
+        "stage": stage,
+        "loops": n_loops,
+        "ticks": ticks,
+        "samples": samples,
+        "repeats": len(timings),
+        "ns_per_sample": ns_per_sample,
+        "samples_per_s": 1e9 / ns_per_sample,
+        "peak_bytes_per_sample": (peak - before) / samples,
+        "retained_bytes_per_sample": (current - before) / samples,
+        "rss_base_mb": rss_base,
+        "peak_rss_mb": rss_peak,
+    }
+
+
+def case_key(result: dict) -> str:
+    return f"{result['stage']}/{result['loops']}/{result['ticks']}"
+
+
+def load_baseline(path: str) -> dict:
+    if not path or not os.path.exists(path):
+        return {}
+    with open(path, encoding="utf-8") as f:
+        return json.load(f).get("results", {})
+
+
+def save_baseline(path: str, results: list):
+    data = {
+        "meta": {
+            "created": datetime.utcnow().isoformat(timespec="seconds") + "Z",
+            "python": platform.python_version(),
+            "numpy": np.__version__,
+            "machine": f"{platform.system()} {platform.machine()} ({os.cpu_count()} CPUs)",
+        },
+        "results": {case_key(r): {k: r[k] for k in ("ns_per_sample", "peak_bytes_per_sample", "peak_rss_mb")}
+                    for r in results},
+    }
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(data, f, indent=2)
+        f.write("\n")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark generation, serialization and write throughput")
+    parser.add_argument("--loops", default="5,50,500,5000,50000", help="Comma separated loop counts")
+    parser.add_argument("--ticks", default="1,10", help="Comma separated ticks per serialize/write call")
+    parser.add_argument("--stages", default=",".join(STAGES), help=f"Comma separated subset of {STAGES}")
+    parser.add_argument("--legacy-max-loops", type=int, default=5000,
+                        help="Largest loop count for the legacy record stages (they are slow)")
+    parser.add_argument("--min-time", type=float, default=1.0, help="Seconds of timed calls per case")
+    parser.add_argument("--max-repeats", type=int, default=1000, help="Most timed calls per case")
+    parser.add_argument("--baseline", default=DEFAULT_BASELINE, help="Baseline JSON to compare against")
+    parser.add_argument("--save-baseline", metavar="PATH", help="Write these results as a baseline")
+    parser.add_argument("--tolerance", type=float, default=0.25,
+                        help="Allowed slowdown against the baseline before a case is flagged")
+    parser.add_argument("--fail-on-regression", action="store_true", help="Exit with status 1 on regressions")
+    parser.add_argument("--json", metavar="PATH", help="Also write the raw results to this file")
+    args = parser.parse_args()
+
+    loop_counts = [int(v) for v in args.loops.split(",") if v.strip()]
+    tick_counts = [int(v) for v in args.ticks.split(",") if v.strip()]
+    stages = [s.strip() for s in args.stages.split(",") if s.strip()]
+    unknown = set(stages) - set(STAGES)
+    if unknown:
+        parser.error(f"unknown stages: {', '.join(sorted(unknown))}")
+
+    cases = []
+    for stage in stages:
+        for n_loops in loop_counts:
+            if stage in LEGACY_STAGES and n_loops > args.legacy_max_loops:
+                continue
+            for ticks in (tick_counts if stage in BATCHED_STAGES else [1]):
+                cases.append((stage, n_loops, ticks))
+
+    server = start_mock_influx()
+    influx_url = f"http://127.0.0.1:{server.server_address[1]}"
+    baseline = load_baseline(args.baseline)
+    context = multiprocessing.get_context("spawn")
+
+    print(f"{len(cases)} cases, mock InfluxDB at {influx_url}, baseline: {args.baseline if baseline else 'none'}\n")
+    header = (f"{'stage':<18} {'loops':>6} {'ticks':>5} {'ns/sample':>10} {'samples/s':>11} "
+              f"{'peak B/smp':>10} {'kept B/smp':>10} {'RSS MB':>7} {'vs base':>8}")
+    print(header)
+    print("-" * len(header))
+
+    results, regressions = [], []
+    for stage, n_loops, ticks in cases:
+        lines_before = server.lines
+        # One process per case so the RSS high-water mark belongs to it
+        with ProcessPoolExecutor(max_workers=1, mp_context=context) as pool:
+            result = pool.submit(run_case, stage, n_loops, ticks, influx_url,
+                                 args.min_time, args.max_repeats).result()
+        if stage == "write":
+            expected = (result["repeats"] + 2) * result["samples"]
+            if server.lines - lines_before != expected:
+                raise RuntimeError(f"mock endpoint received {server.lines - lines_before} lines, expected {expected}")
+        results.append(result)
+
+        compared = ""
+        base = baseline.get(case_key(result))
+        if base:
+            ratio = result["ns_per_sample"] / base["ns_per_sample"]
+            compared = f"{ratio:>7.2f}x"
+            if ratio > 1 + args.tolerance:
+                compared += " SLOWER"
+                regressions.append((case_key(result), ratio))
+        print(f"{stage:<18} {n_loops:>6} {ticks:>5} {result['ns_per_sample']:>10.0f} "
+              f"{result['samples_per_s']:>11,.0f} {result['peak_bytes_per_sample']:>10.0f} "
+              f"{result['retained_bytes_per_sample']:>10.0f} {result['peak_rss_mb']:>7.0f} {compared}", flush=True)
+
+    server.shutdown()
+    print(f"\nSample = one loop at one timestamp (PV, OP and SP). Peak B/smp is the tracemalloc peak of one call "
+          f"in bytes per sample, kept B/smp the bytes per sample its result still holds.")
+
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=2)
+    if args.save_baseline:
+        save_baseline(args.save_baseline, results)
+        print(f"Baseline written to {args.save_baseline}")
+    if regressions:
+        print(f"\n{len(regressions)} case(s) more than {args.tolerance:.0%} slower than the baseline:")
+        for key, ratio in regressions:
+            print(f"  {key}: {ratio:.2f}x")
+        if args.fail_on_regression:
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -6,39 +6,122 @@ import time
 import signal
 import logging
 import asyncio
+from logging.handlers import RotatingFileHandler
 from datetime import datetime, timedelta
-from typing import Optional
+from typing import List, Optional
 from dotenv import load_dotenv
 
-from .influx_client import InfluxDBStreamingClient
+from .sinks import Sink, TeeSink, create_sink
 from .data_generator import ControlLoopDataGenerator
+from .scheduler import TickScheduler, parse_loop_intervals
+from .pipeline import StreamingPipeline
+from .metrics import MetricsServer, MetricsWriter
+from .replay import HistorianReplaySource, parse_mapping
+from .scenarios import FaultScenarioSimulator, parse_scenario_mix
+from .change_detector import ChangeDetector, ChangeEvent, WebhookNotifier
+from .shm_ring import SharedRingPublisher
 
 # Configure logging
+_log_handlers = [logging.StreamHandler(sys.stdout)]
+_log_file = os.getenv("LOG_FILE", "data_streaming_service.log")
+if _log_file:
+    _log_handlers.append(RotatingFileHandler(
+        _log_file,
+        maxBytes=int(os.getenv("LOG_FILE_MAX_BYTES", str(10 * 1024 * 1024))),
+        backupCount=int(os.getenv("LOG_FILE_BACKUPS", "5"))
+    ))
 logging.basicConfig(
-    level=logging.INFO,
+    level=os.getenv("LOG_LEVEL", "INFO").upper(),
     format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
-    handlers=[
-        logging.StreamHandler(sys.stdout),
-        logging.FileHandler('data_streaming_service.log')
-    ]
+    handlers=_log_handlers
 )
 
 logger = logging.getLogger(__name__)
 
 
 class DataStreamingService:
-    """Main service for streaming real-time data to InfluxDB."""
+    """Main service for streaming real-time data to InfluxDB and other sinks."""
     
     def __init__(self):
         """Initialize the streaming service."""
-        self.influx_client: Optional[InfluxDBStreamingClient] = None
-        self.data_generator = ControlLoopDataGenerator()
+        self.sink: Optional[Sink] = None
+        self.pipeline: Optional[StreamingPipeline] = None
         self.running = False
-        self.stream_interval = float(os.getenv("STREAM_INTERVAL", "1.0"))  # seconds
         
         # Load environment variables
         load_dotenv()
         
+        self.stream_interval = float(os.getenv("STREAM_INTERVAL", "1.0"))  # seconds
+        self.sink_spec = os.getenv("STREAM_SINKS", "influx")
+        self.stream_source = os.getenv("STREAM_SOURCE", "generator")  # generator, scenario or replay
+        
+        # Per-loop sampling intervals (milliseconds, as in loop_configs.sampling_interval)
+        self.loop_intervals = parse_loop_intervals(os.getenv("LOOP_SAMPLING_INTERVALS", ""))
+        
+        if self.stream_source == "scenario":
+            # Seeded closed-loop simulation with labeled faults; each loop steps
+            # once per tick, so its step size is its sampling interval
+            self.data_generator = FaultScenarioSimulator(
+                n_loops=int(os.getenv("SCENARIO_LOOPS", "10")),
+                seed=int(os.getenv("SCENARIO_SEED", "0")),
+                dt=self.stream_interval,
+                scenario_mix=parse_scenario_mix(os.getenv("SCENARIO_MIX", "")) or None,
+                loop_dt=self.loop_intervals
+            )
+            logger.info(f"Scenario labels: {self.data_generator.labels()}")
+        else:
+            seed = os.getenv("GENERATOR_SEED")
+            self.data_generator = ControlLoopDataGenerator(seed=int(seed) if seed else None)
+        
+        self.scheduler = TickScheduler(
+            overrun_policy=os.getenv("OVERRUN_POLICY", "skip"),
+            max_catch_up=int(os.getenv("MAX_CATCH_UP_TICKS", "10"))
+        )
+        
+        # Generate -> serialize -> write pipeline settings
+        self.queue_size = int(os.getenv("PIPELINE_QUEUE_SIZE", "100"))
+        self.backpressure_policy = os.getenv("BACKPRESSURE_POLICY", "block")
+        self.spool_dir = os.getenv("SPOOL_DIR", "spool")
+        self.write_retries = int(os.getenv("WRITE_RETRIES", "3"))
+        self.write_retry_delay = float(os.getenv("WRITE_RETRY_DELAY", "1.0"))  # seconds
+        self.stats_interval = float(os.getenv("PIPELINE_STATS_INTERVAL", "60"))  # seconds
+        
+        # Prometheus metrics endpoint (0 disables it)
+        self.metrics_port = int(os.getenv("METRICS_PORT", "9464"))
+        self.metrics_host = os.getenv("METRICS_HOST", "0.0.0.0")
+        self.metrics_server: Optional[MetricsServer] = None
+        self._summary_stats = {"overruns": 0, "skipped": 0, "written": 0}
+        
+        # Change-point triggered diagnostics
+        self.change_detector: Optional[ChangeDetector] = None
+        self.change_notifier: Optional[WebhookNotifier] = None
+        if os.getenv("CHANGE_DETECTION", "false").lower() == "true":
+            self.change_detector = ChangeDetector(
+                baseline_samples=float(os.getenv("CHANGE_BASELINE_SAMPLES", "7200")),
+                fast_samples=float(os.getenv("CHANGE_FAST_SAMPLES", "600")),
+                cusum_k=float(os.getenv("CHANGE_CUSUM_K", "0.5")),
+                cusum_h=float(os.getenv("CHANGE_CUSUM_H", "8")),
+                variance_ratio=float(os.getenv("CHANGE_VARIANCE_RATIO", "3")),
+                warmup_samples=int(os.getenv("CHANGE_WARMUP_SAMPLES", "3600")),
+                min_interval=float(os.getenv("CHANGE_MIN_INTERVAL", "900")),
+                max_events_per_minute=float(os.getenv("CHANGE_MAX_EVENTS_PER_MINUTE", "60")),
+                context=float(os.getenv("CHANGE_CONTEXT", "600"))
+            )
+            webhook_url = os.getenv("CHANGE_WEBHOOK_URL", "")
+            if webhook_url:
+                self.change_notifier = WebhookNotifier(webhook_url)
+        
+        # Recent samples in shared memory for co-located diagnostics
+        self.ring_publisher: Optional[SharedRingPublisher] = None
+        ring_hours = float(os.getenv("SHM_RING_HOURS", "0"))
+        if ring_hours > 0:
+            self.ring_publisher = SharedRingPublisher(
+                seconds=ring_hours * 3600,
+                default_interval=self.stream_interval,
+                loop_intervals=self.loop_intervals,
+                prefix=os.getenv("SHM_RING_PREFIX", "clpm_ring_")
+            )
+        
         # Setup signal handlers for graceful shutdown
         signal.signal(signal.SIGINT, self._signal_handler)
         signal.signal(signal.SIGTERM, self._signal_handler)
@@ -53,21 +136,34 @@ class DataStreamingService:
         try:
             logger.info("Initializing data streaming service...")
             
-            # Initialize InfluxDB client
-            self.influx_client = InfluxDBStreamingClient()
+            # Initialize output sink(s)
+            self.sink = create_sink(self.sink_spec)
             
-            # Test connection
-            test_data = self.data_generator.generate_loop_data("TEST_LOOP")
-            success = self.influx_client.write_data_points(test_data)
-            
-            if success:
-                logger.info("Successfully connected to InfluxDB")
+            # Test connectivity without writing data
+            if self.sink.health_check():
+                logger.info(f"Sink health check passed: {self.sink_spec}")
             else:
-                logger.error("Failed to connect to InfluxDB")
+                logger.error(f"Sink health check failed: {self.sink_spec}")
                 return False
             
-            # Clean up test data
-            logger.info("InfluxDB connection test completed")
+            self.pipeline = StreamingPipeline(
+                serializer=self.sink.serialize,
+                writer=self.sink.write,
+                queue_size=self.queue_size,
+                policy=self.backpressure_policy,
+                spool_dir=self.spool_dir,
+                write_retries=self.write_retries,
+                retry_delay=self.write_retry_delay
+            )
+            
+            if self.metrics_port:
+                self.metrics_server = MetricsServer(
+                    collect=self.collect_metrics,
+                    health=lambda: self.running,
+                    host=self.metrics_host,
+                    port=self.metrics_port
+                )
+                await self.metrics_server.start()
             
             return True
             
@@ -78,45 +174,214 @@ class DataStreamingService:
     async def stream_data(self):
         """Main data streaming loop."""
         logger.info("Starting data streaming...")
-        logger.info(f"Stream interval: {self.stream_interval} seconds")
-        logger.info(f"Available loops: {self.data_generator.get_available_loops()}")
+        
+        for loop_id in self.data_generator.get_available_loops():
+            self.scheduler.add_loop(loop_id, self.loop_intervals.get(loop_id, self.stream_interval))
+        
+        logger.info(f"Default stream interval: {self.stream_interval} seconds")
+        logger.info(f"Loop sampling intervals: {self.scheduler.get_intervals()}")
+        logger.info(f"Overrun policy: {self.scheduler.overrun_policy}")
         
         self.running = True
-        stream_count = 0
+        await self.pipeline.start()
+        stats_task = asyncio.create_task(self._log_pipeline_stats())
         
         try:
             while self.running:
-                start_time = time.time()
-                
-                # Generate data for all loops
-                current_time = datetime.utcnow()
-                data_points = self.data_generator.generate_multiple_loops(current_time)
+                tick = await self.scheduler.next_tick()
+                if not self.running:
+                    break
                 
-                # Write to InfluxDB
-                if self.influx_client:
-                    success = self.influx_client.write_data_points(data_points)
-                    
-                    if success:
-                        stream_count += 1
-                        logger.info(f"Stream #{stream_count}: Wrote {len(data_points)} data points "
-                                  f"for {len(self.data_generator.get_available_loops())} loops")
-                    else:
-                        logger.error(f"Failed to write data points in stream #{stream_count}")
+                # Overruns are counted by the scheduler and reported in the periodic summary
                 
-                # Calculate sleep time to maintain consistent interval
-                elapsed_time = time.time() - start_time
-                sleep_time = max(0, self.stream_interval - elapsed_time)
+                # Generate data for every loop due on this grid point
+                start_time = time.perf_counter()
+                batch = self.data_generator.generate_batch(tick.timestamp_ns, tick.loop_ids)
                 
-                if sleep_time > 0:
-                    await asyncio.sleep(sleep_time)
-                else:
-                    logger.warning(f"Stream cycle took {elapsed_time:.2f}s, "
-                                 f"longer than interval {self.stream_interval}s")
+                # Hand off to the serialize/write stages
+                await self.pipeline.put(batch, time.perf_counter() - start_time)
+                self._publish_recent(batch)
+                self._detect_changes(batch)
                 
         except Exception as e:
             logger.error(f"Error in streaming loop: {e}")
         finally:
-            logger.info("Data streaming stopped")
+            stats_task.cancel()
+            await self.pipeline.stop()
+            logger.info(f"Data streaming stopped, scheduler stats: {self.scheduler.get_stats()}")
+            logger.info(f"Pipeline stats: {self.pipeline.get_stats()}")
+    
+    async def stream_replay(self):
+        """Replay historian exports through the pipeline."""
+        files = [f.strip() for f in os.getenv("REPLAY_FILES", "").split(",") if f.strip()]
+        source = HistorianReplaySource(
+            paths=files,
+            speed=float(os.getenv("REPLAY_SPEED", "1.0")),
+            tag_map=parse_mapping(os.getenv("REPLAY_TAG_MAP", "")),
+            columns=parse_mapping(os.getenv("REPLAY_COLUMNS", "")),
+            chunk_rows=int(os.getenv("REPLAY_CHUNK_ROWS", "100000")),
+            shift_to_now=os.getenv("REPLAY_SHIFT_TO_NOW", "false").lower() == "true"
+        )
+        logger.info(f"Starting historian replay of {len(files)} file(s)...")
+        
+        self.running = True
+        await self.pipeline.start()
+        stats_task = asyncio.create_task(self._log_pipeline_stats())
+        
+        try:
+            async for batch in source.stream():
+                if not self.running:
+                    break
+                await self.pipeline.put(batch)
+                self._publish_recent(batch)
+                self._detect_changes(batch)
+                
+        except Exception as e:
+            logger.error(f"Error in replay: {e}")
+        finally:
+            stats_task.cancel()
+            await self.pipeline.stop()
+            logger.info(f"Replay stopped after {source.samples_emitted} samples")
+            logger.info(f"Pipeline stats: {self.pipeline.get_stats()}")
+    
+    def _publish_recent(self, batch):
+        """Append a batch to the shared-memory rings read by co-located diagnostics."""
+        if self.ring_publisher is None:
+            return
+        try:
+            self.ring_publisher.publish(batch)
+        except Exception as e:
+            logger.error(f"Failed to publish samples to shared memory: {e}")
+    
+    def _detect_changes(self, batch):
+        """Run change detection on a batch and dispatch any resulting events."""
+        if self.change_detector is None:
+            return
+        events = self.change_detector.update(batch)
+        if events:
+            self._dispatch_change_events(events)
+    
+    def _dispatch_change_events(self, events: List[ChangeEvent]):
+        """Log change events and post them to the webhook without blocking the stream."""
+        for event in events:
+            start = datetime.utcfromtimestamp(event.start_ns / 1e9)
+            end = datetime.utcfromtimestamp(event.end_ns / 1e9)
+            logger.info(f"Change detected on {event.loop_id} ({event.reason}, score {event.score:.2f}), "
+                        f"diagnose {start:%Y-%m-%d %H:%M:%S} to {end:%H:%M:%S} UTC")
+        if self.change_notifier:
+            asyncio.get_running_loop().run_in_executor(None, self.change_notifier.send, events)
+    
+    async def _log_pipeline_stats(self):
+        """Periodically log a summary of throughput, queues, latencies and overruns."""
+        while True:
+            await asyncio.sleep(self.stats_interval)
+            stats = self.pipeline.get_stats()
+            queues = stats["queues"]
+            stages = stats["stages"]
+            scheduler = self.scheduler.get_stats()
+            
+            # Report changes since the previous summary
+            last = self._summary_stats
+            written = stats["samples"]["written"]
+            overruns = scheduler["overruns"] - last["overruns"]
+            skipped = scheduler["skipped"] - last["skipped"]
+            self._summary_stats = {
+                "overruns": scheduler["overruns"],
+                "skipped": scheduler["skipped"],
+                "written": written,
+            }
+            
+            logger.info(
+                f"Pipeline: samples_written={written - last['written']} "
+                f"({stats['samples']['per_second']:.1f}/s) "
+                f"failed_writes={stages['write']['failed']} "
+                f"queue_depth=serialize:{queues['serialize']['depth']}/"
+                f"write:{queues['write']['depth']} "
+                f"spooled={queues['serialize']['spool_depth'] + queues['write']['spool_depth']} "
+                f"dropped={queues['serialize']['dropped'] + queues['write']['dropped']} "
+                f"latency_ms=generate:{stages['generate']['avg_latency'] * 1000:.1f}/"
+                f"serialize:{stages['serialize']['avg_latency'] * 1000:.1f}/"
+                f"write:{stages['write']['avg_latency'] * 1000:.1f}"
+            )
+            if overruns:
+                logger.warning(f"{overruns} stream cycle overrun(s) and {skipped} skipped tick(s) "
+                               f"in the last {self.stats_interval:.0f}s; "
+                               f"max scheduler lag {scheduler['max_lag']:.3f}s")
+    
+    def collect_metrics(self) -> str:
+        """
+        Render the service metrics in Prometheus text format.
+        
+        Returns:
+            Exposition text for the ``/metrics`` endpoint
+        """
+        out = MetricsWriter(prefix="clpm_stream_")
+        out.gauge("up", "Whether the streaming loop is running", 1 if self.running else 0)
+        
+        scheduler = self.scheduler.get_stats()
+        out.gauge("loops", "Number of scheduled loops", len(self.scheduler.get_intervals()))
+        out.counter("ticks_total", "Scheduler ticks processed", scheduler["ticks"])
+        out.counter("cycle_overruns_total", "Ticks that started after their deadline", scheduler["overruns"])
+        out.counter("skipped_ticks_total", "Ticks skipped because of overruns", scheduler["skipped"])
+        out.gauge("scheduler_lag_seconds", "Lag of the most recent tick behind its deadline", scheduler["last_lag"])
+        out.gauge("scheduler_max_lag_seconds", "Largest tick lag seen", scheduler["max_lag"])
+        
+        if self.change_detector is not None:
+            change = self.change_detector.get_stats()
+            out.gauge("change_loops_alarmed", "Loops whose behaviour currently differs from baseline",
+                      change["alarmed"])
+            out.counter("change_events_total", "Diagnose-now events emitted", change["events"])
+            out.counter("change_events_deferred_total", "Events held back by the rate limits",
+                        change["deferred"])
+            if self.change_notifier:
+                out.counter("change_webhook_failures_total", "Events the webhook did not accept",
+                            self.change_notifier.failed)
+        
+        if self.ring_publisher is not None:
+            out.gauge("shm_rings", "Loops published to shared memory", len(self.ring_publisher.rings))
+            out.counter("shm_samples_published_total", "Samples appended to shared-memory rings",
+                        self.ring_publisher.samples_published)
+        
+        if isinstance(self.sink, TeeSink):
+            for position, (sink, failures) in enumerate(zip(self.sink.sinks, self.sink.failures)):
+                out.counter("sink_write_failures_total", "Failed writes per sink of a multi-sink setup",
+                            failures, {"sink": sink.name, "position": str(position)})
+        
+        if self.pipeline is None:
+            return out.render()
+        
+        stats = self.pipeline.get_stats()
+        out.counter("samples_written_total", "Samples written successfully", stats["samples"]["written"])
+        out.counter("samples_failed_total", "Samples in batches whose write failed after all retries",
+                    stats["samples"]["failed"])
+        out.counter("samples_lost_total", "Samples discarded because they could not be spooled",
+                    stats["samples"]["lost"])
+        out.gauge("samples_per_second", "Samples written per second over the last minute",
+                  stats["samples"]["per_second"])
+        out.histogram("write_latency_seconds", "Sink write call duration", self.pipeline.write_latency)
+        out.histogram("batch_size_samples", "Samples per written batch", self.pipeline.batch_sizes)
+        
+        for stage, stage_stats in stats["stages"].items():
+            labels = {"stage": stage}
+            out.counter("stage_batches_total", "Batches processed per pipeline stage",
+                        stage_stats["processed"], labels)
+            out.counter("stage_failures_total", "Batches that failed per pipeline stage",
+                        stage_stats["failed"], labels)
+            out.gauge("stage_avg_latency_seconds", "Average processing time per pipeline stage",
+                      stage_stats["avg_latency"], labels)
+        
+        for queue, queue_stats in stats["queues"].items():
+            if not queue_stats:
+                continue
+            labels = {"queue": queue}
+            out.gauge("queue_depth", "Batches waiting in memory", queue_stats["depth"], labels)
+            out.gauge("spool_depth", "Batches spilled to disk and not yet written",
+                      queue_stats["spool_depth"], labels)
+            out.counter("dropped_batches_total", "Batches dropped by the drop_oldest policy",
+                        queue_stats["dropped"], labels)
+            out.counter("spilled_batches_total", "Batches spilled to disk", queue_stats["spilled"], labels)
+        
+        return out.render()
     
     async def stream_trending_data(self, duration_minutes: int = 5):
         """Stream trending data for demonstration purposes."""
@@ -135,9 +400,9 @@ class DataStreamingService:
                     loop_id, current_time, duration_minutes=1, interval_seconds=1
                 )
                 
-                # Write to InfluxDB
-                if self.influx_client:
-                    success = self.influx_client.write_data_points(trending_data)
+                # Write to the configured sink(s)
+                if self.sink:
+                    success = self.sink.write_data_points(trending_data)
                     
                     if success:
                         logger.info(f"Wrote trending data for {loop_id}: {len(trending_data)} points")
@@ -160,7 +425,10 @@ class DataStreamingService:
         
         try:
             # Start data streaming
-            await self.stream_data()
+            if self.stream_source == "replay":
+                await self.stream_replay()
+            else:
+                await self.stream_data()
             
         except KeyboardInterrupt:
             logger.info("Received keyboard interrupt")
@@ -175,8 +443,14 @@ class DataStreamingService:
         
         self.running = False
         
-        if self.influx_client:
-            self.influx_client.close()
+        if self.metrics_server:
+            await self.metrics_server.stop()
+        
+        if self.sink:
+            self.sink.close()
+        
+        if self.ring_publisher:
+            self.ring_publisher.close()
         
         logger.info("Service shutdown complete")
 
@@ -0,0 +1,260 @@
+"""Columnar sample batch passed between generator, pipeline and sinks."""
+
+from datetime import datetime, timedelta
+from typing import Any, Dict, List, Optional, Sequence, Union
+
+import numpy as np
+
+FIELDS = ("pv", "op", "sp")
+
+_EPOCH = datetime(1970, 1, 1)
+
+
+def _escape_tag(value: str) -> str:
+    """Escape a tag key or value for line protocol."""
+    return value.replace("\\", "\\\\").replace(",", "\\,").replace("=", "\\=").replace(" ", "\\ ")
+
+
+def _escape_measurement(value: str) -> str:
+    """Escape a measurement name for line protocol."""
+    return value.replace("\\", "\\\\").replace(",", "\\,").replace(" ", "\\ ")
+
+
+class SampleBatch:
+    """
+    Struct-of-arrays batch of control loop samples.
+
+    One sample is one loop at one timestamp with its PV, OP and SP values
+    and control mode. Timestamps are epoch nanoseconds (UTC) and missing
+    values are NaN. Compared with the legacy form of three dictionaries per
+    sample, this keeps a handful of NumPy arrays per batch no matter how
+    many samples it holds.
+    """
+
+    __slots__ = ("ts", "loop_id", "mode", "pv", "op", "sp")
+
+    def __init__(self, ts: np.ndarray, loop_id: np.ndarray, mode: np.ndarray,
+                 pv: np.ndarray, op: np.ndarray, sp: np.ndarray):
+        """
+        Initialize the batch from equally sized arrays.
+
+        Args:
+            ts: Timestamps in epoch nanoseconds (int64)
+            loop_id: Loop identifiers (object array of str)
+            mode: Control modes (object array of str)
+            pv: Process variable values (float64)
+            op: Controller output values (float64)
+            sp: Set point values (float64)
+        """
+        self.ts = np.asarray(ts, dtype=np.int64)
+        self.loop_id = np.asarray(loop_id, dtype=object)
+        self.mode = np.asarray(mode, dtype=object)
+        self.pv = np.asarray(pv, dtype=np.float64)
+        self.op = np.asarray(op, dtype=np.float64)
+        self.sp = np.asarray(sp, dtype=np.float64)
+
+        n = len(self.ts)
+        if any(len(getattr(self, name)) != n for name in self.__slots__):
+            raise ValueError("All SampleBatch columns must have the same length")
+
+    def __len__(self) -> int:
+        return len(self.ts)
+
+    def __getstate__(self):
+        return tuple(getattr(self, name) for name in self.__slots__)
+
+    def __setstate__(self, state):
+        for name, value in zip(self.__slots__, state):
+            setattr(self, name, value)
+
+    @classmethod
+    def empty(cls) -> "SampleBatch":
+        """Create a batch with no samples."""
+        return cls(np.empty(0, np.int64), np.empty(0, object), np.empty(0, object),
+                   np.empty(0), np.empty(0), np.empty(0))
+
+    @classmethod
+    def for_tick(cls, timestamp_ns: int, loop_ids: Sequence[str]) -> "SampleBatch":
+        """
+        Allocate a batch for several loops sharing one timestamp.
+
+        Values start as NaN and modes as ``AUT``; the caller fills them in.
+        """
+        n = len(loop_ids)
+        return cls(
+            np.full(n, timestamp_ns, dtype=np.int64),
+            np.array(loop_ids, dtype=object),
+            np.full(n, "AUT", dtype=object),
+            np.full(n, np.nan), np.full(n, np.nan), np.full(n, np.nan),
+        )
+
+    @classmethod
+    def concat(cls, batches: Sequence["SampleBatch"]) -> "SampleBatch":
+        """Concatenate several batches into one."""
+        batches = [batch for batch in batches if len(batch)]
+        if not batches:
+            return cls.empty()
+        if len(batches) == 1:
+            return batches[0]
+        return cls(*(np.concatenate([getattr(b, name) for b in batches]) for name in cls.__slots__))
+
+    def slice(self, start: int, stop: Optional[int] = None) -> "SampleBatch":
+        """Get a view of samples ``start`` to ``stop``."""
+        return SampleBatch(*(getattr(self, name)[start:stop] for name in self.__slots__))
+
+    def take(self, indices: np.ndarray) -> "SampleBatch":
+        """Get the samples at ``indices`` (integer or boolean array)."""
+        return SampleBatch(*(getattr(self, name)[indices] for name in self.__slots__))
+
+    def sorted_by_time(self) -> "SampleBatch":
+        """Get the batch stably sorted by timestamp."""
+        if len(self) < 2 or np.all(self.ts[1:] >= self.ts[:-1]):
+            return self
+        return self.take(np.argsort(self.ts, kind="stable"))
+
+    def timestamp(self, index: int) -> datetime:
+        """Get one sample's timestamp as a naive UTC datetime."""
+        return _EPOCH + timedelta(microseconds=int(self.ts[index]) // 1000)
+
+    @classmethod
+    def from_records(cls, data_points: List[Dict[str, Any]]) -> "SampleBatch":
+        """
+        Build a batch from legacy data point dictionaries.
+
+        Points sharing a timestamp, loop and mode become one sample. Fields
+        other than PV, OP and SP are ignored.
+
+        Args:
+            data_points: Dictionaries with ``_time``, ``loop_id``, ``_field``,
+                ``_value`` and ``Mode`` keys
+
+        Returns:
+            The equivalent batch
+        """
+        index: Dict[tuple, int] = {}
+        ts, loop_ids, modes = [], [], []
+        values = {field: [] for field in FIELDS}
+
+        for data_point in data_points:
+            timestamp = data_point.get("_time")
+            if timestamp is None:
+                timestamp = datetime.utcnow()
+            if isinstance(timestamp, str):
+                timestamp = datetime.fromisoformat(timestamp.replace('Z', '+00:00'))
+            if timestamp.tzinfo is not None:
+                timestamp = (timestamp - timestamp.utcoffset()).replace(tzinfo=None)
+            ts_ns = (timestamp - _EPOCH) // timedelta(microseconds=1) * 1000
+
+            loop_id = data_point.get("loop_id")
+            mode = data_point.get("Mode", "AUT")
+            key = (ts_ns, loop_id, mode)
+            row = index.get(key)
+            if row is None:
+                row = index[key] = len(ts)
+                ts.append(ts_ns)
+                loop_ids.append(loop_id)
+                modes.append(mode)
+                for field in FIELDS:
+                    values[field].append(np.nan)
+
+            field = str(data_point.get("_field", "")).lower()
+            if field in values:
+                values[field][row] = float(data_point.get("_value", 0.0))
+
+        return cls(np.array(ts, dtype=np.int64), np.array(loop_ids, dtype=object),
+                   np.array(modes, dtype=object), values["pv"], values["op"], values["sp"])
+
+    def to_records(self, measurement: str = "control_loops") -> List[Dict[str, Any]]:
+        """
+        Convert to legacy data point dictionaries.
+
+        Args:
+            measurement: Value for the ``_measurement`` key
+
+        Returns:
+            List of data points for PV, OP, and SP (NaN and infinite values
+            are skipped)
+        """
+        data_points = []
+        timestamps: Dict[int, datetime] = {}
+        columns = {"PV": self.pv.tolist(), "OP": self.op.tolist(), "SP": self.sp.tolist()}
+        ts = self.ts.tolist()
+
+        for i in range(len(ts)):
+            timestamp = timestamps.get(ts[i])
+            if timestamp is None:
+                timestamp = timestamps[ts[i]] = _EPOCH + timedelta(microseconds=ts[i] // 1000)
+            for field, values in columns.items():
+                value = values[i]
+                if value - value == 0:  # skip NaN and +-inf
+                    data_points.append({
+                        "_time": timestamp,
+                        "loop_id": self.loop_id[i],
+                        "_field": field,
+                        "_value": value,
+                        "Mode": self.mode[i],
+                        "_measurement": measurement
+                    })
+        return data_points
+
+    def to_columns(self) -> Dict[str, np.ndarray]:
+        """Get the batch as a dictionary of arrays (``time`` as datetime64[ns])."""
+        return {
+            "time": self.ts.view("datetime64[ns]"),
+            "loop_id": self.loop_id,
+            "mode": self.mode,
+            "pv": self.pv,
+            "op": self.op,
+            "sp": self.sp,
+        }
+
+    def to_line_protocol(self, measurement: str = "control_loops") -> List[str]:
+        """
+        Serialize to InfluxDB line protocol, one line per sample.
+
+        Tags are written in sorted key order and NaN or infinite fields are
+        omitted (line protocol has no representation for them), matching
+        what ``influxdb_client.Point`` produces.
+
+        Args:
+            measurement: Measurement name
+
+        Returns:
+            List of line protocol records
+        """
+        prefix = _escape_measurement(measurement) + ",Mode="
+        tag_cache: Dict[tuple, str] = {}
+        ts = self.ts.tolist()
+        pv, op, sp = self.pv.tolist(), self.op.tolist(), self.sp.tolist()
+        finite = np.isfinite(np.stack([self.op, self.pv, self.sp]))
+        all_finite = finite.all(axis=0).tolist()
+        finite = finite.T.tolist()
+
+        lines = []
+        for i in range(len(ts)):
+            key = (self.mode[i], self.loop_id[i])
+            tags = tag_cache.get(key)
+            if tags is None:
+                tags = tag_cache[key] = (
+                    f"{prefix}{_escape_tag(str(key[0]))},loop_id={_escape_tag(str(key[1]))} "
+                )
+
+            o, p, s = op[i], pv[i], sp[i]
+            if all_finite[i]:
+                fields = f"op={o!r},pv={p!r},sp={s!r}"
+            else:
+                fields = ",".join(
+                    f"{name}={value!r}"
+                    for name, value, ok in zip(("op", "pv", "sp"), (o, p, s), finite[i]) if ok
+                )
+                if not fields:
+                    continue
+            lines.append(f"{tags}{fields} {ts[i]}")
+        return lines
+
+
+def as_batch(data: Union[SampleBatch, List[Dict[str, Any]]]) -> SampleBatch:
+    """Return ``data`` as a SampleBatch, converting legacy data point lists."""
+    if isinstance(data, SampleBatch):
+        return data
+    return SampleBatch.from_records(data)
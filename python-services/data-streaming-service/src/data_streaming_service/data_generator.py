@@ -2,18 +2,29 @@
 
 import random
 import numpy as np
-from typing import Dict, List, Any, Tuple
+from typing import Dict, List, Any, Optional, Tuple, Union
 from datetime import datetime, timedelta
 import logging
 
+from .batch import SampleBatch
+
 logger = logging.getLogger(__name__)
 
+_EPOCH = datetime(1970, 1, 1)
+
 
 class ControlLoopDataGenerator:
     """Generates realistic control loop data based on patterns from CSV file."""
     
-    def __init__(self):
-        """Initialize the data generator with default parameters."""
+    def __init__(self, seed: Optional[int] = None):
+        """
+        Initialize the data generator with default parameters.
+        
+        Args:
+            seed: Seed for reproducible output (default: unseeded)
+        """
+        self.random = random.Random(seed)
+        
         # Base values from the CSV data analysis
         self.base_pv = 405.0  # Process Variable base value
         self.base_sp = 405.41  # Set Point base value  
@@ -65,10 +76,91 @@ class ControlLoopDataGenerator:
         if timestamp is None:
             timestamp = datetime.utcnow()
         
+        pv_value, sp_value, op_value, mode = self._generate_loop_values(loop_id)
+        
+        data_points = [
+            {
+                "_time": timestamp,
+                "loop_id": loop_id,
+                "_field": "PV",
+                "_value": pv_value,
+                "Mode": mode,
+                "_measurement": "control_loops"
+            },
+            {
+                "_time": timestamp,
+                "loop_id": loop_id,
+                "_field": "OP", 
+                "_value": op_value,
+                "Mode": mode,
+                "_measurement": "control_loops"
+            },
+            {
+                "_time": timestamp,
+                "loop_id": loop_id,
+                "_field": "SP",
+                "_value": sp_value,
+                "Mode": mode,
+                "_measurement": "control_loops"
+            }
+        ]
+        
+        return data_points
+    
+    def generate_batch(self, timestamp: Union[datetime, int] = None,
+                       loop_ids: List[str] = None) -> SampleBatch:
+        """
+        Generate one sample per loop as a columnar batch.
+        
+        Args:
+            timestamp: Timestamp as a naive UTC datetime or epoch nanoseconds
+                (default: current time)
+            loop_ids: Loops to generate (default: all available loops)
+            
+        Returns:
+            SampleBatch with one sample per loop
+        """
+        if timestamp is None:
+            timestamp = datetime.utcnow()
+        if isinstance(timestamp, datetime):
+            timestamp = (timestamp - _EPOCH) // timedelta(microseconds=1) * 1000
+        if loop_ids is None:
+            loop_ids = self.loop_ids
+        
+        batch = SampleBatch.for_tick(timestamp, loop_ids)
+        for i, loop_id in enumerate(loop_ids):
+            batch.pv[i], batch.sp[i], batch.op[i], batch.mode[i] = self._generate_loop_values(loop_id)
+        
+        return batch
+    
+    def generate_multiple_loops(self, timestamp: datetime = None,
+                                loop_ids: List[str] = None) -> List[Dict[str, Any]]:
+        """
+        Generate data for multiple control loops.
+        
+        Args:
+            timestamp: Timestamp for the data (default: current time)
+            loop_ids: Loops to generate (default: all available loops)
+            
+        Returns:
+            List of data points for all loops
+        """
+        return self.generate_batch(timestamp, loop_ids).to_records()
+    
+    def _generate_loop_values(self, loop_id: str) -> Tuple[float, float, float, str]:
+        """
+        Advance one loop's state and generate its next PV, SP, OP and mode.
+        
+        Args:
+            loop_id: Loop identifier
+            
+        Returns:
+            Tuple of (pv, sp, op, mode)
+        """
         # Initialize state for this loop if not exists
         if loop_id not in self.loop_states:
             self.loop_states[loop_id] = {
-                'phase': random.uniform(0, 2 * np.pi),
+                'phase': self.random.uniform(0, 2 * np.pi),
                 'last_trend': 0,
                 'counter': 0,
                 'start_time': datetime.utcnow()
@@ -109,56 +201,9 @@ class ControlLoopDataGenerator:
             logger.debug(f"Loop {loop_id}: NORMAL mode - {position_in_cycle:.0f}s into cycle")
         
         # Select mode (mostly AUT, occasionally others)
-        mode = random.choices(self.modes, weights=[0.8, 0.15, 0.05])[0]
+        mode = self.random.choices(self.modes, weights=[0.8, 0.15, 0.05])[0]
         
-        data_points = [
-            {
-                "_time": timestamp,
-                "loop_id": loop_id,
-                "_field": "PV",
-                "_value": pv_value,
-                "Mode": mode,
-                "_measurement": "control_loops"
-            },
-            {
-                "_time": timestamp,
-                "loop_id": loop_id,
-                "_field": "OP", 
-                "_value": op_value,
-                "Mode": mode,
-                "_measurement": "control_loops"
-            },
-            {
-                "_time": timestamp,
-                "loop_id": loop_id,
-                "_field": "SP",
-                "_value": sp_value,
-                "Mode": mode,
-                "_measurement": "control_loops"
-            }
-        ]
-        
-        return data_points
-    
-    def generate_multiple_loops(self, timestamp: datetime = None) -> List[Dict[str, Any]]:
-        """
-        Generate data for multiple control loops.
-        
-        Args:
-            timestamp: Timestamp for the data (default: current time)
-            
-        Returns:
-            List of data points for all loops
-        """
-        if timestamp is None:
-            timestamp = datetime.utcnow()
-        
-        all_data = []
-        for loop_id in self.loop_ids:
-            loop_data = self.generate_loop_data(loop_id, timestamp)
-            all_data.extend(loop_data)
-        
-        return all_data
+        return pv_value, sp_value, op_value, mode
     
     def generate_trending_data(self, loop_id: str, start_time: datetime, 
                              duration_minutes: int = 5, interval_seconds: int = 1) -> List[Dict[str, Any]]:
@@ -179,7 +224,7 @@ class ControlLoopDataGenerator:
         # Initialize state for this loop if not exists
         if loop_id not in self.loop_states:
             self.loop_states[loop_id] = {
-                'phase': random.uniform(0, 2 * np.pi),
+                'phase': self.random.uniform(0, 2 * np.pi),
                 'last_trend': 0,
                 'counter': 0,
                 'start_time': start_time
@@ -272,10 +317,10 @@ class ControlLoopDataGenerator:
             Stable value with minimal noise
         """
         # Small random variation
-        random_variation = random.uniform(-variation, variation)
+        random_variation = self.random.uniform(-variation, variation)
         
         # Small Gaussian noise for realism
-        noise = random.gauss(0, self.noise_std_normal)
+        noise = self.random.gauss(0, self.noise_std_normal)
         
         return round(base_value + random_variation + noise, 7)
     
@@ -309,17 +354,17 @@ class ControlLoopDataGenerator:
         )
         
         # Random walk component for unpredictability
-        random_walk = random.uniform(-variation * 0.4, variation * 0.4)
+        random_walk = self.random.uniform(-variation * 0.4, variation * 0.4)
         
         # Larger Gaussian noise
-        noise = random.gauss(0, self.noise_std_abnormal)
+        noise = self.random.gauss(0, self.noise_std_abnormal)
         
         # Combine all components
         total_variation = fast_osc + medium_osc + slow_trend + random_walk + noise
         
         # Add frequent spikes during abnormal mode (20% chance)
-        if random.random() < 0.2:
-            spike = random.choice([-1, 1]) * variation * random.uniform(0.8, 1.5)
+        if self.random.random() < 0.2:
+            spike = self.random.choice([-1, 1]) * variation * self.random.uniform(0.8, 1.5)
             total_variation += spike
         
         return round(base_value + total_variation, 7)
@@ -2,14 +2,74 @@
 
 import os
 import logging
-from typing import Dict, List, Any
+from typing import Dict, List, Any, Union
 from datetime import datetime
 from influxdb_client import InfluxDBClient, Point
 from influxdb_client.client.write_api import SYNCHRONOUS
 
+from .batch import SampleBatch
+
 logger = logging.getLogger(__name__)
 
 
+def to_line_protocol(data_points: List[Dict[str, Any]], measurement: str) -> List[str]:
+    """
+    Convert data points to InfluxDB line protocol.
+    
+    Fields sharing a timestamp, loop and mode are combined into one line.
+    
+    Args:
+        data_points: List of dictionaries containing data to write
+        measurement: Measurement name for the records
+        
+    Returns:
+        List of line protocol records
+    """
+    # Group data points by timestamp and loop_id to combine fields
+    grouped_data = {}
+    
+    for data_point in data_points:
+        timestamp = data_point.get("_time", datetime.utcnow())
+        if isinstance(timestamp, str):
+            timestamp = datetime.fromisoformat(timestamp.replace('Z', '+00:00'))
+        
+        loop_id = data_point.get("loop_id")
+        mode = data_point.get("Mode", "AUT")
+        field_name = data_point.get("_field", "value").lower()
+        field_value = data_point.get("_value", 0.0)
+        
+        # Create a key for grouping
+        key = (timestamp, loop_id, mode)
+        
+        if key not in grouped_data:
+            grouped_data[key] = {
+                "timestamp": timestamp,
+                "loop_id": loop_id,
+                "mode": mode,
+                "fields": {}
+            }
+        
+        grouped_data[key]["fields"][field_name] = field_value
+    
+    # Create points from grouped data
+    records = []
+    for key, data in grouped_data.items():
+        point = Point(measurement)
+        point.time(data["timestamp"])
+        
+        # Add tags
+        point.tag("loop_id", data["loop_id"])
+        point.tag("Mode", data["mode"])
+        
+        # Add all fields
+        for field_name, field_value in data["fields"].items():
+            point.field(field_name, field_value)
+        
+        records.append(point.to_line_protocol())
+    
+    return records
+
+
 class InfluxDBStreamingClient:
     """InfluxDB client for streaming real-time data."""
     
@@ -35,62 +95,51 @@ class InfluxDBStreamingClient:
         logger.info(f"Connected to InfluxDB at {self.url}")
         logger.info(f"Organization: {self.org}, Bucket: {self.bucket}")
     
-    def write_data_points(self, data_points: List[Dict[str, Any]]) -> bool:
+    def write_data_points(self, data_points: Union[SampleBatch, List[Dict[str, Any]]]) -> bool:
         """
         Write data points to InfluxDB.
         
         Args:
-            data_points: List of dictionaries containing data to write
+            data_points: SampleBatch, or list of dictionaries containing data to write
             
         Returns:
             bool: True if successful, False otherwise
         """
         try:
-            # Group data points by timestamp and loop_id to combine fields
-            grouped_data = {}
-            
-            for data_point in data_points:
-                timestamp = data_point.get("_time", datetime.utcnow())
-                if isinstance(timestamp, str):
-                    timestamp = datetime.fromisoformat(timestamp.replace('Z', '+00:00'))
-                
-                loop_id = data_point.get("loop_id")
-                mode = data_point.get("Mode", "AUT")
-                field_name = data_point.get("_field", "value").lower()
-                field_value = data_point.get("_value", 0.0)
-                
-                # Create a key for grouping
-                key = (timestamp, loop_id, mode)
-                
-                if key not in grouped_data:
-                    grouped_data[key] = {
-                        "timestamp": timestamp,
-                        "loop_id": loop_id,
-                        "mode": mode,
-                        "fields": {}
-                    }
-                
-                grouped_data[key]["fields"][field_name] = field_value
+            records = self.serialize(data_points)
+        except Exception as e:
+            logger.error(f"Failed to serialize data points: {e}")
+            return False
+        
+        return self.write_records(records)
+    
+    def serialize(self, data: Union[SampleBatch, List[Dict[str, Any]]]) -> List[str]:
+        """
+        Convert samples to InfluxDB line protocol.
+        
+        Args:
+            data: SampleBatch, or legacy list of data point dictionaries
             
-            # Create points from grouped data
-            points = []
-            for key, data in grouped_data.items():
-                point = Point(self.measurement)
-                point.time(data["timestamp"])
-                
-                # Add tags
-                point.tag("loop_id", data["loop_id"])
-                point.tag("Mode", data["mode"])
-                
-                # Add all fields
-                for field_name, field_value in data["fields"].items():
-                    point.field(field_name, field_value)
-                
-                points.append(point)
+        Returns:
+            List of line protocol records
+        """
+        if isinstance(data, SampleBatch):
+            return data.to_line_protocol(self.measurement)
+        return to_line_protocol(data, self.measurement)
+    
+    def write_records(self, records: List[str]) -> bool:
+        """
+        Write serialized line protocol records to InfluxDB.
+        
+        Args:
+            records: Line protocol records from ``serialize``
             
-            # Write to InfluxDB
-            self.write_api.write(bucket=self.bucket, record=points)
-            logger.debug(f"Successfully wrote {len(points)} data points to InfluxDB")
+        Returns:
+            bool: True if successful, False otherwise
+        """
+        try:
+            self.write_api.write(bucket=self.bucket, record=records)
+            logger.debug(f"Successfully wrote {len(records)} data points to InfluxDB")
             return True
             
         except Exception as e:
@@ -126,6 +175,19 @@ class InfluxDBStreamingClient:
         
         return self.write_data_points([data_point])
     
+    def health_check(self) -> bool:
+        """
+        Check that InfluxDB is reachable without writing any data.
+        
+        Returns:
+            bool: True if the server responds to a ping, False otherwise
+        """
+        try:
+            return self.client.ping()
+        except Exception as e:
+            logger.error(f"InfluxDB health check failed: {e}")
+            return False
+    
     def close(self):
         """Close the InfluxDB client connection."""
         if self.client:
@@ -0,0 +1,230 @@
+"""Prometheus-format self-metrics for the data streaming service."""
+
+import time
+import asyncio
+import logging
+from bisect import bisect_left
+from collections import deque
+from typing import Callable, Dict, List, Optional, Sequence, Tuple
+
+logger = logging.getLogger(__name__)
+
+# Seconds; write calls range from sub-millisecond (null/memory sinks) to
+# multi-second (InfluxDB retries)
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+# Samples per written batch
+BATCH_SIZE_BUCKETS = (1, 10, 50, 100, 500, 1000, 5000, 10000, 50000, 100000)
+
+
+class Histogram:
+    """Cumulative-bucket histogram in the Prometheus sense."""
+
+    def __init__(self, buckets: Sequence[float]):
+        """
+        Initialize the histogram.
+
+        Args:
+            buckets: Increasing upper bounds; ``+Inf`` is added implicitly
+        """
+        self.buckets = tuple(buckets)
+        self.counts = [0] * (len(self.buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value: float):
+        """Record one observation."""
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+    def cumulative(self) -> List[Tuple[str, int]]:
+        """Get ``(le, cumulative count)`` pairs including ``+Inf``."""
+        pairs = []
+        total = 0
+        for bound, count in zip(self.buckets, self.counts):
+            total += count
+            pairs.append((_format_value(bound), total))
+        pairs.append(("+Inf", self.count))
+        return pairs
+
+
+class RateMeter:
+    """Rate of a monotonically increasing total over a sliding time window."""
+
+    def __init__(self, window: float = 60.0):
+        """
+        Initialize the meter.
+
+        Args:
+            window: Averaging window in seconds
+        """
+        self.window = window
+        self._points: deque = deque()
+
+    def update(self, total: float, now: Optional[float] = None):
+        """Record the current total."""
+        now = time.monotonic() if now is None else now
+        self._points.append((now, total))
+        while len(self._points) > 2 and now - self._points[1][0] >= self.window:
+            self._points.popleft()
+
+    def rate(self) -> float:
+        """Get the average rate per second over the window."""
+        if len(self._points) < 2:
+            return 0.0
+        (t0, v0), (t1, v1) = self._points[0], self._points[-1]
+        return (v1 - v0) / (t1 - t0) if t1 > t0 else 0.0
+
+
+def _format_value(value: float) -> str:
+    """Format a sample value for the text exposition format."""
+    if value != value:
+        return "NaN"
+    if value in (float("inf"), float("-inf")):
+        return "+Inf" if value > 0 else "-Inf"
+    if float(value).is_integer():
+        return str(int(value))
+    return repr(float(value))
+
+
+def _format_labels(labels: Optional[Dict[str, str]]) -> str:
+    """Format a label set, escaping values."""
+    if not labels:
+        return ""
+    parts = []
+    for key, value in labels.items():
+        value = str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+        parts.append(f'{key}="{value}"')
+    return "{" + ",".join(parts) + "}"
+
+
+class MetricsWriter:
+    """
+    Builds a Prometheus text exposition (version 0.0.4).
+
+    Each metric name is declared once with its ``HELP`` and ``TYPE`` lines
+    the first time it is written; further calls with the same name add
+    labelled samples to it.
+    """
+
+    def __init__(self, prefix: str = ""):
+        """
+        Initialize the writer.
+
+        Args:
+            prefix: Prepended to every metric name
+        """
+        self.prefix = prefix
+        self._families: Dict[str, List[str]] = {}
+
+    def _family(self, name: str, metric_type: str, help_text: str) -> Tuple[str, List[str]]:
+        name = self.prefix + name
+        lines = self._families.get(name)
+        if lines is None:
+            lines = self._families[name] = [f"# HELP {name} {help_text}", f"# TYPE {name} {metric_type}"]
+        return name, lines
+
+    def counter(self, name: str, help_text: str, value: float,
+                labels: Optional[Dict[str, str]] = None):
+        """Add a counter sample (``name`` should end in ``_total``)."""
+        name, lines = self._family(name, "counter", help_text)
+        lines.append(f"{name}{_format_labels(labels)} {_format_value(value)}")
+
+    def gauge(self, name: str, help_text: str, value: float,
+              labels: Optional[Dict[str, str]] = None):
+        """Add a gauge sample."""
+        name, lines = self._family(name, "gauge", help_text)
+        lines.append(f"{name}{_format_labels(labels)} {_format_value(value)}")
+
+    def histogram(self, name: str, help_text: str, histogram: Histogram,
+                  labels: Optional[Dict[str, str]] = None):
+        """Add a histogram's bucket, sum and count samples."""
+        name, lines = self._family(name, "histogram", help_text)
+        labels = labels or {}
+        for bound, count in histogram.cumulative():
+            lines.append(f"{name}_bucket{_format_labels({**labels, 'le': bound})} {count}")
+        lines.append(f"{name}_sum{_format_labels(labels)} {_format_value(histogram.sum)}")
+        lines.append(f"{name}_count{_format_labels(labels)} {histogram.count}")
+
+    def render(self) -> str:
+        """Get the exposition text."""
+        return "\n".join(line for lines in self._families.values() for line in lines) + "\n"
+
+
+class MetricsServer:
+    """
+    Minimal HTTP server for ``/metrics`` and ``/health``.
+
+    Runs on the service's event loop with ``asyncio.start_server`` so it
+    needs no extra thread or dependency. Metrics are produced by the
+    ``collect`` callback at scrape time, so nothing is computed between
+    scrapes.
+    """
+
+    def __init__(self, collect: Callable[[], str], health: Callable[[], bool],
+                 host: str = "0.0.0.0", port: int = 9464):
+        """
+        Initialize the server.
+
+        Args:
+            collect: Returns the metrics exposition text
+            health: Returns whether the service is healthy
+            host: Interface to listen on
+            port: Port to listen on
+        """
+        self.collect = collect
+        self.health = health
+        self.host = host
+        self.port = port
+        self._server: Optional[asyncio.AbstractServer] = None
+
+    async def start(self):
+        """Start listening."""
+        self._server = await asyncio.start_server(self._handle, self.host, self.port)
+        # The port actually bound, when asked for any free one (0)
+        self.port = self._server.sockets[0].getsockname()[1]
+        logger.info(f"Metrics endpoint listening on http://{self.host}:{self.port}/metrics")
+
+    async def stop(self):
+        """Stop listening."""
+        if self._server is not None:
+            self._server.close()
+            await self._server.wait_closed()
+            self._server = None
+
+    async def _handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        """Serve one request and close the connection."""
+        try:
+            request_line = await asyncio.wait_for(reader.readline(), timeout=5.0)
+            # Discard headers
+            while True:
+                line = await asyncio.wait_for(reader.readline(), timeout=5.0)
+                if line in (b"\r\n", b"\n", b""):
+                    break
+
+            parts = request_line.decode("latin-1").split()
+            method, path = (parts[0], parts[1].split("?")[0]) if len(parts) >= 2 else ("", "")
+
+            if method != "GET":
+                status, content_type, body = "405 Method Not Allowed", "text/plain", "method not allowed\n"
+            elif path == "/metrics":
+                status, content_type, body = "200 OK", "text/plain; version=0.0.4; charset=utf-8", self.collect()
+            elif path == "/health":
+                healthy = self.health()
+                status = "200 OK" if healthy else "503 Service Unavailable"
+                content_type, body = "text/plain", "ok\n" if healthy else "unhealthy\n"
+            else:
+                status, content_type, body = "404 Not Found", "text/plain", "not found\n"
+
+            payload = body.encode("utf-8")
+            writer.write(
+                f"HTTP/1.1 {status}\r\nContent-Type: {content_type}\r\n"
+                f"Content-Length: {len(payload)}\r\nConnection: close\r\n\r\n".encode("latin-1")
+                + payload
+            )
+            await writer.drain()
+        except Exception as e:
+            logger.debug(f"Metrics request failed: {e}")
+        finally:
+            writer.close()
@@ -0,0 +1,419 @@
+"""Bounded producer/consumer pipeline between data generation and writing."""
+
+import os
+import time
+import pickle
+import asyncio
+import logging
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Deque, Dict, List, Optional
+
+from .metrics import BATCH_SIZE_BUCKETS, LATENCY_BUCKETS, Histogram, RateMeter
+
+logger = logging.getLogger(__name__)
+
+POLICY_BLOCK = "block"
+POLICY_DROP_OLDEST = "drop_oldest"
+POLICY_SPILL = "spill"
+BACKPRESSURE_POLICIES = (POLICY_BLOCK, POLICY_DROP_OLDEST, POLICY_SPILL)
+
+
+class StageStats:
+    """Latency and throughput counters for one pipeline stage."""
+
+    def __init__(self):
+        """Initialize empty counters."""
+        self.processed = 0
+        self.failed = 0
+        self.total_latency = 0.0
+        self.last_latency = 0.0
+        self.max_latency = 0.0
+
+    def record(self, latency: float, success: bool = True):
+        """Record one processed item."""
+        self.processed += 1
+        if not success:
+            self.failed += 1
+        self.total_latency += latency
+        self.last_latency = latency
+        self.max_latency = max(self.max_latency, latency)
+
+    def as_dict(self) -> Dict[str, float]:
+        """Get the counters as a dictionary."""
+        return {
+            "processed": self.processed,
+            "failed": self.failed,
+            "avg_latency": self.total_latency / self.processed if self.processed else 0.0,
+            "last_latency": self.last_latency,
+            "max_latency": self.max_latency,
+        }
+
+
+class StageQueue:
+    """
+    Bounded queue between two pipeline stages with a backpressure policy.
+
+    ``block`` makes the producer wait for room, ``drop_oldest`` discards the
+    oldest queued item to make room, and ``spill`` writes overflow items to a
+    spool directory on disk. Once anything has been spilled, new items keep
+    going to the spool until it is drained so FIFO order is preserved.
+    Spooled items survive a restart and are picked up again on startup.
+
+    With a spool directory any policy can also hand items to the spool
+    explicitly through ``spill``, e.g. batches whose write kept failing or
+    that were still queued at shutdown. Spool files are read and written in
+    the default executor so disk I/O does not stall the event loop.
+    """
+
+    def __init__(self, name: str, maxsize: int, policy: str = POLICY_BLOCK,
+                 spool_dir: Optional[str] = None):
+        """
+        Initialize the queue.
+
+        Args:
+            name: Queue name used in stats and spool file names
+            maxsize: Maximum number of in-memory items
+            policy: Backpressure policy (block, drop_oldest or spill)
+            spool_dir: Directory for spilled items (required for ``spill``,
+                optional otherwise)
+        """
+        if policy not in BACKPRESSURE_POLICIES:
+            raise ValueError(f"Unknown backpressure policy: {policy!r}")
+        if policy == POLICY_SPILL and not spool_dir:
+            raise ValueError("spool_dir is required for the spill policy")
+
+        self.name = name
+        self.policy = policy
+        self.queue: asyncio.Queue = asyncio.Queue(maxsize=max(1, maxsize))
+        self.dropped = 0
+        self.spilled = 0
+
+        self._spool_dir = None
+        self._spool: Deque[str] = deque()
+        self._spool_seq = 0
+        self._writing = set()  # spooled paths whose file is not complete yet
+        # Set whenever an item becomes available in memory or on disk
+        self._available = asyncio.Event()
+        if spool_dir:
+            self._spool_dir = os.path.join(spool_dir, name)
+            os.makedirs(self._spool_dir, exist_ok=True)
+            existing = sorted(f for f in os.listdir(self._spool_dir) if f.endswith(".spool"))
+            self._spool.extend(os.path.join(self._spool_dir, f) for f in existing)
+            if existing:
+                self._spool_seq = int(existing[-1].split(".")[0]) + 1
+                logger.info(f"Recovered {len(existing)} spooled items for queue {name}")
+
+    async def put(self, item: Any):
+        """Add an item, applying the backpressure policy when full."""
+        if self.policy == POLICY_BLOCK:
+            await self.queue.put(item)
+        elif self.policy == POLICY_DROP_OLDEST:
+            if self.queue.full():
+                self.queue.get_nowait()
+                self.dropped += 1
+            self.queue.put_nowait(item)
+        elif self._spool or self.queue.full():
+            await self.spill(item)
+            return
+        else:
+            self.queue.put_nowait(item)
+        self._available.set()
+
+    async def get(self) -> Any:
+        """Remove and return the oldest item, waiting if none is available."""
+        while True:
+            if not self.queue.empty():
+                return self.queue.get_nowait()
+            if self._spool and self._spool[0] not in self._writing:
+                path = self._spool.popleft()
+                return await asyncio.get_running_loop().run_in_executor(None, self._read_spooled, path)
+            # Woken by put() or by a spill whose file is complete
+            self._available.clear()
+            await self._available.wait()
+
+    async def spill(self, item: Any) -> bool:
+        """
+        Append an item to the on-disk spool.
+
+        Returns:
+            bool: False if the queue has no spool directory
+        """
+        if self._spool_dir is None:
+            return False
+        # Take the spool slot before yielding so concurrent spills keep their
+        # order; get() does not read it until the file is complete
+        path = os.path.join(self._spool_dir, f"{self._spool_seq:012d}.spool")
+        self._spool_seq += 1
+        self._spool.append(path)
+        self._writing.add(path)
+        try:
+            await asyncio.get_running_loop().run_in_executor(None, self._write_spooled, path, item)
+        except BaseException:
+            self._spool.remove(path)
+            raise
+        finally:
+            self._writing.discard(path)
+            self._available.set()
+        self.spilled += 1
+        return True
+
+    def drain(self) -> List[Any]:
+        """Remove and return every item held in memory, oldest first."""
+        items = []
+        while not self.queue.empty():
+            items.append(self.queue.get_nowait())
+        return items
+
+    def depth(self) -> int:
+        """Number of items waiting, including spooled ones."""
+        return self.queue.qsize() + len(self._spool)
+
+    def empty(self) -> bool:
+        """Whether nothing is waiting in memory or on disk."""
+        return self.depth() == 0
+
+    @staticmethod
+    def _write_spooled(path: str, item: Any):
+        """Pickle an item to a spool file, renaming it into place when complete."""
+        with open(f"{path}.tmp", "wb") as f:
+            pickle.dump(item, f, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(f"{path}.tmp", path)
+
+    @staticmethod
+    def _read_spooled(path: str) -> Any:
+        """Read back and remove a spool file."""
+        with open(path, "rb") as f:
+            item = pickle.load(f)
+        os.remove(path)
+        return item
+
+    def get_stats(self) -> Dict[str, int]:
+        """Get queue statistics."""
+        return {
+            "depth": self.queue.qsize(),
+            "spool_depth": len(self._spool),
+            "maxsize": self.queue.maxsize,
+            "dropped": self.dropped,
+            "spilled": self.spilled,
+        }
+
+
+class StreamingPipeline:
+    """
+    Generate -> serialize -> write pipeline connected by bounded queues.
+
+    The generation stage is the caller of ``put``. Serialization and the
+    blocking write each run as their own consumer task and execute in a
+    thread pool, so a slow write no longer delays the next tick's
+    generation; how the pipeline reacts when a stage falls behind is
+    governed by the backpressure policy.
+
+    A failed write is retried with exponential backoff. If it still fails,
+    or the pipeline is stopped before its queues drain, the remaining
+    batches go to the spool directory and are written after the next
+    start; batches are only lost when there is no spool directory.
+    """
+
+    def __init__(self, serializer: Callable[[Any], Any], writer: Callable[[Any], bool],
+                 queue_size: int = 100, policy: str = POLICY_BLOCK,
+                 spool_dir: Optional[str] = None, write_retries: int = 3,
+                 retry_delay: float = 1.0):
+        """
+        Initialize the pipeline.
+
+        Args:
+            serializer: Converts a generated batch into a write payload
+            writer: Writes a payload, returning True on success
+            queue_size: Capacity of each inter-stage queue
+            policy: Backpressure policy (block, drop_oldest or spill)
+            spool_dir: Spool directory for the spill policy, failed writes
+                and batches left over at shutdown
+            write_retries: Extra attempts for a failed write
+            retry_delay: Seconds before the first retry, doubled for each
+                further one
+        """
+        self.serializer = serializer
+        self.writer = writer
+        self.policy = policy
+        self.queue_size = queue_size
+        self.spool_dir = spool_dir
+        self.write_retries = max(0, write_retries)
+        self.retry_delay = retry_delay
+
+        self.serialize_queue: Optional[StageQueue] = None
+        self.write_queue: Optional[StageQueue] = None
+        self.stage_stats = {
+            "generate": StageStats(),
+            "serialize": StageStats(),
+            "write": StageStats(),
+        }
+        
+        # Sample counts and distributions of completed writes
+        self.samples_written = 0
+        self.samples_failed = 0
+        self.samples_lost = 0
+        self.write_latency = Histogram(LATENCY_BUCKETS)
+        self.batch_sizes = Histogram(BATCH_SIZE_BUCKETS)
+        self.write_rate = RateMeter()
+
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self._tasks = []
+        self._busy = {"serialize": False, "write": False}
+        # Item each consumer stage is working on, spooled if it is cancelled;
+        # a write cancelled mid-call may be repeated after the restart
+        self._in_flight: Dict[str, Any] = {"serialize": None, "write": None}
+
+    async def start(self):
+        """Create the queues and start the consumer stages."""
+        # Queues bind to the running event loop, so create them here
+        self.serialize_queue = StageQueue("serialize", self.queue_size, self.policy, self.spool_dir)
+        self.write_queue = StageQueue("write", self.queue_size, self.policy, self.spool_dir)
+        self._executor = ThreadPoolExecutor(max_workers=2, thread_name_prefix="pipeline")
+
+        self._tasks = [
+            asyncio.create_task(self._serialize_stage()),
+            asyncio.create_task(self._write_stage()),
+        ]
+        logger.info(f"Pipeline started (queue size {self.queue_size}, policy {self.policy})")
+
+    async def put(self, batch: Any, generate_latency: float = 0.0):
+        """
+        Hand a generated batch to the pipeline.
+
+        Args:
+            batch: Generated SampleBatch
+            generate_latency: Time the caller spent generating the batch
+        """
+        self.stage_stats["generate"].record(generate_latency)
+        await self.serialize_queue.put(batch)
+
+    async def stop(self, timeout: float = 10.0):
+        """
+        Drain the queues and stop the consumer stages.
+
+        Batches that are not written within the timeout are spooled for
+        the next start.
+
+        Args:
+            timeout: Maximum seconds to wait for queued items to be written
+        """
+        deadline = time.monotonic() + timeout
+        while time.monotonic() < deadline:
+            if (self.serialize_queue.empty() and self.write_queue.empty()
+                    and not any(self._busy.values())):
+                break
+            await asyncio.sleep(0.05)
+        else:
+            logger.warning(f"Pipeline stopped with items still queued: {self.get_stats()['queues']}")
+
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+        # A cancelled stage may still be inside a blocking serialize or write
+        # call; wait for it without blocking the event loop
+        await asyncio.get_running_loop().run_in_executor(None, self._executor.shutdown)
+
+        for stage, queue in (("serialize", self.serialize_queue), ("write", self.write_queue)):
+            items = queue.drain()
+            if self._in_flight[stage] is not None:
+                items.insert(0, self._in_flight[stage])
+                self._in_flight[stage] = None
+            spooled = 0
+            for item in items:
+                if not await queue.spill(item):
+                    break
+                spooled += 1
+            if spooled:
+                logger.info(f"Spooled {spooled} unfinished {stage} batches for the next start")
+            if spooled < len(items):
+                lost = items[spooled:]
+                if stage == "write":
+                    self.samples_lost += sum(item[1] for item in lost)
+                logger.error(f"Discarded {len(lost)} unfinished {stage} batches: no spool directory")
+
+    async def _serialize_stage(self):
+        """Consume generated batches and serialize them."""
+        loop = asyncio.get_running_loop()
+        while True:
+            batch = await self.serialize_queue.get()
+            self._busy["serialize"] = True
+            self._in_flight["serialize"] = batch
+            start = time.perf_counter()
+            try:
+                payload = await loop.run_in_executor(self._executor, self.serializer, batch)
+                self.stage_stats["serialize"].record(time.perf_counter() - start)
+                # Carry the sample count along for the write-side metrics
+                await self.write_queue.put((payload, len(batch)))
+            except Exception as e:
+                logger.error(f"Failed to serialize batch: {e}")
+                self.stage_stats["serialize"].record(time.perf_counter() - start, success=False)
+            finally:
+                self._busy["serialize"] = False
+            # Left set when the task is cancelled so stop() can spool the batch
+            self._in_flight["serialize"] = None
+
+    async def _write_stage(self):
+        """Consume serialized payloads and write them."""
+        while True:
+            item = await self.write_queue.get()
+            self._busy["write"] = True
+            self._in_flight["write"] = item
+            try:
+                await self._write(item)
+            finally:
+                self._busy["write"] = False
+            self._in_flight["write"] = None
+
+    async def _write(self, item: Any):
+        """Write one payload with retries, spooling it if every attempt fails."""
+        loop = asyncio.get_running_loop()
+        # Spooled failures carry a flag so they are only counted as failed once
+        payload, samples, *failed_before = item
+        for attempt in range(self.write_retries + 1):
+            if attempt:
+                await asyncio.sleep(self.retry_delay * 2 ** (attempt - 1))
+            start = time.perf_counter()
+            try:
+                success = await loop.run_in_executor(self._executor, self.writer, payload)
+            except Exception as e:
+                logger.error(f"Failed to write batch: {e}")
+                success = False
+            latency = time.perf_counter() - start
+            self.stage_stats["write"].record(latency, success=success)
+            self.write_latency.observe(latency)
+            if success:
+                self.batch_sizes.observe(samples)
+                self.samples_written += samples
+                self.write_rate.update(self.samples_written)
+                return
+
+        if not failed_before:
+            self.samples_failed += samples
+        if await self.write_queue.spill((payload, samples, True)):
+            self._in_flight["write"] = None
+            logger.warning(f"Write failed after {self.write_retries + 1} attempts, "
+                           f"spooled batch of {samples} samples for a later retry")
+            # Back off before the spool hands the batch straight back
+            await asyncio.sleep(self.retry_delay * 2 ** self.write_retries)
+        else:
+            self.samples_lost += samples
+            logger.error(f"Write failed after {self.write_retries + 1} attempts, "
+                         f"dropped batch of {samples} samples")
+
+    def get_stats(self) -> Dict[str, Dict]:
+        """Get queue depth and per-stage latency statistics."""
+        return {
+            "queues": {
+                "serialize": self.serialize_queue.get_stats() if self.serialize_queue else {},
+                "write": self.write_queue.get_stats() if self.write_queue else {},
+            },
+            "stages": {name: stats.as_dict() for name, stats in self.stage_stats.items()},
+            "samples": {
+                "written": self.samples_written,
+                "failed": self.samples_failed,
+                "lost": self.samples_lost,
+                "per_second": self.write_rate.rate(),
+            },
+        }
@@ -0,0 +1,453 @@
+"""Seeded closed-loop fault-injection scenarios for labeled benchmark datasets."""
+
+import os
+import json
+import logging
+import argparse
+from datetime import datetime, timedelta
+from typing import Any, Dict, List, Optional, Sequence, Union
+
+import numpy as np
+
+from .batch import SampleBatch
+
+logger = logging.getLogger(__name__)
+
+# Scenario -> ground-truth label, using the diagnostics service classifications
+SCENARIO_LABELS = {
+    "normal": "normal",
+    "stiction": "stiction",
+    "deadband": "deadband",
+    "aggressive_tuning": "tuning",
+    "sluggish_tuning": "tuning",
+    "disturbance": "oscillating",
+}
+
+SCENARIOS = tuple(SCENARIO_LABELS)
+
+_EPOCH = datetime(1970, 1, 1)
+
+
+def parse_scenario_mix(spec: str) -> Dict[str, float]:
+    """
+    Parse a scenario mix such as ``normal=0.5,stiction=0.2,deadband=0.3``.
+
+    Args:
+        spec: Comma separated ``scenario=weight`` pairs
+
+    Returns:
+        Mapping of scenario to weight
+    """
+    mix = {}
+    for item in spec.split(","):
+        item = item.strip()
+        if not item:
+            continue
+        name, _, weight = item.partition("=")
+        name = name.strip()
+        if name not in SCENARIO_LABELS:
+            raise ValueError(f"Unknown scenario: {name!r}")
+        mix[name] = float(weight) if weight else 1.0
+    return mix
+
+
+class FaultScenarioSimulator:
+    """
+    Vectorized closed-loop simulation of many loops with injected faults.
+
+    Every loop is a first-order-plus-dead-time process under PI control with
+    a valve between controller output and process input. Faults are injected
+    per loop:
+
+    - ``stiction``: two-parameter stick-slip valve. The valve holds its
+      position until the controller output has moved more than ``S`` away
+      from it, then slips to ``S - J`` short of the output (``J`` is the slip
+      jump; ``J == S`` is pure stick-slip, ``J == 0`` pure backlash).
+    - ``deadband``: valve backlash of width ``d``.
+    - ``aggressive_tuning`` / ``sluggish_tuning``: PI gains far from the
+      SIMC tuning used for the other loops.
+    - ``disturbance``: external sinusoidal load disturbance.
+
+    All loops advance together as NumPy arrays, and all randomness comes
+    from one ``numpy.random.Generator`` seeded at construction, so the same
+    seed and call sequence always give the same data.
+    """
+
+    def __init__(self, n_loops: int = 10, seed: int = 0, dt: float = 1.0,
+                 scenario_mix: Optional[Dict[str, float]] = None,
+                 loop_ids: Optional[Sequence[str]] = None,
+                 scenarios: Optional[Sequence[str]] = None,
+                 warmup_steps: int = 600,
+                 loop_dt: Optional[Dict[str, float]] = None):
+        """
+        Initialize the simulator.
+
+        Args:
+            n_loops: Number of loops (ignored when ``loop_ids`` is given)
+            seed: Random seed
+            dt: Simulation step in seconds
+            scenario_mix: Relative weight per scenario used to assign
+                scenarios (default: equal weights)
+            loop_ids: Loop identifiers (default: ``SIM0000``, ``SIM0001``, ...)
+            scenarios: Explicit scenario per loop, overriding ``scenario_mix``
+            warmup_steps: Steps simulated and discarded at start-up so loops
+                begin in their steady behavior
+            loop_dt: Step size in seconds per loop ID, overriding ``dt`` for
+                loops sampled at their own rate
+        """
+        if loop_ids is None:
+            loop_ids = [f"SIM{i:04d}" for i in range(n_loops)]
+        self.loop_ids = list(loop_ids)
+        n = len(self.loop_ids)
+        if n == 0:
+            raise ValueError("At least one loop is required")
+
+        self.seed = seed
+        # Step size per loop; each step of a loop advances its time by its own dt
+        loop_dt = loop_dt or {}
+        self.dt = np.array([loop_dt.get(loop_id, dt) for loop_id in self.loop_ids], dtype=float)
+        dt = self.dt
+        self.rng = np.random.default_rng(seed)
+        rng = self.rng
+
+        # Scenario assignment
+        if scenarios is None:
+            mix = scenario_mix or {name: 1.0 for name in SCENARIOS}
+            names = list(mix)
+            weights = np.array([mix[name] for name in names], dtype=float)
+            scenarios = rng.choice(names, size=n, p=weights / weights.sum())
+        if len(scenarios) != n:
+            raise ValueError("One scenario per loop is required")
+        for name in scenarios:
+            if name not in SCENARIO_LABELS:
+                raise ValueError(f"Unknown scenario: {name!r}")
+        self.scenarios = np.asarray(scenarios, dtype=object)
+
+        # Process: gain (PV units per % OP), time constant and dead time
+        self.gain = rng.uniform(0.5, 2.0, n)
+        self.tau = rng.uniform(20.0, 60.0, n)
+        self.delay_steps = np.maximum(1, np.round(rng.uniform(2.0, 8.0, n) / dt)).astype(int)
+        self.alpha = np.exp(-dt / self.tau)
+
+        # SIMC PI tuning with closed-loop time constant equal to the dead time
+        theta = self.delay_steps * dt
+        self.kc = self.tau / (self.gain * 2.0 * theta)
+        self.ti = np.minimum(self.tau, 8.0 * theta)
+
+        aggressive = self.scenarios == "aggressive_tuning"
+        sluggish = self.scenarios == "sluggish_tuning"
+        self.kc[aggressive] *= rng.uniform(2.0, 2.6, aggressive.sum())
+        self.ti[aggressive] *= 0.5
+        self.kc[sluggish] *= rng.uniform(0.1, 0.2, sluggish.sum())
+        self.ti[sluggish] *= 4.0
+
+        # Valve faults (% of OP span)
+        self.stiction_s = np.where(self.scenarios == "stiction", rng.uniform(2.0, 5.0, n), 0.0)
+        self.stiction_j = self.stiction_s * rng.uniform(0.2, 1.0, n)
+        self.deadband = np.where(self.scenarios == "deadband", rng.uniform(2.0, 5.0, n), 0.0)
+
+        # External oscillating disturbance (PV units)
+        is_disturbed = self.scenarios == "disturbance"
+        self.dist_amplitude = np.where(is_disturbed, rng.uniform(1.0, 3.0, n), 0.0)
+        self.dist_period = rng.uniform(60.0, 300.0, n)
+        self.dist_phase = rng.uniform(0.0, 2 * np.pi, n)
+
+        # Operating point and noise
+        self.base_pv = rng.uniform(100.0, 500.0, n)
+        self.base_op = rng.uniform(40.0, 60.0, n)
+        self.noise_std = rng.uniform(0.02, 0.1, n)
+        self.load_std = rng.uniform(0.01, 0.05, n)
+
+        # State
+        self.step_count = np.zeros(n, dtype=np.int64)
+        self.sp = self.base_pv.copy()
+        self.y = np.zeros(n)  # Process output deviation
+        self.load = np.zeros(n)  # AR(1) load disturbance
+        self.integral = np.zeros(n)
+        self.op = self.base_op.copy()
+        self.valve = self.base_op.copy()
+        self.pv = self.base_pv.copy()
+        self._delay_len = int(self.delay_steps.max()) + 1
+        self._delay_buffer = np.tile(self.base_op[:, None], (1, self._delay_len))
+
+        self._index = {loop_id: i for i, loop_id in enumerate(self.loop_ids)}
+
+        for _ in range(warmup_steps):
+            self.step()
+        self.step_count[:] = 0
+
+    def get_available_loops(self) -> List[str]:
+        """Get list of available loop IDs."""
+        return self.loop_ids.copy()
+
+    def step(self, indices: Optional[np.ndarray] = None) -> np.ndarray:
+        """
+        Advance the selected loops by one time step.
+
+        Args:
+            indices: Loop indices to advance (default: all loops)
+
+        Returns:
+            The indices that were advanced
+        """
+        idx = np.arange(len(self.loop_ids)) if indices is None else np.asarray(indices)
+        m = len(idx)
+        rng = self.rng
+
+        dt = self.dt[idx]
+
+        # Occasional set point steps (about one per hour per loop)
+        sp_change = rng.random(m) < dt / 3600.0
+        sp = self.sp[idx] + np.where(sp_change, rng.normal(0.0, 1.0, m), 0.0)
+        self.sp[idx] = sp
+
+        # PI controller with conditional integration as anti-windup
+        error = sp - self.pv[idx]
+        integral = self.integral[idx] + error * dt
+        op = self.base_op[idx] + self.kc[idx] * (error + integral / self.ti[idx])
+        saturated = (op < 0.0) | (op > 100.0)
+        integral = np.where(saturated, self.integral[idx], integral)
+        op = np.clip(op, 0.0, 100.0)
+        self.integral[idx] = integral
+        self.op[idx] = op
+
+        # Valve
+        valve = self.valve[idx]
+        gap = op - valve
+
+        stiction_s = self.stiction_s[idx]
+        slip = (stiction_s > 0) & (np.abs(gap) > stiction_s)
+        valve = np.where(slip, op - np.sign(gap) * (stiction_s - self.stiction_j[idx]), valve)
+
+        half_band = self.deadband[idx] / 2.0
+        has_band = half_band > 0
+        valve = np.where(has_band & (gap > half_band), op - half_band, valve)
+        valve = np.where(has_band & (gap < -half_band), op + half_band, valve)
+
+        healthy = (stiction_s == 0) & ~has_band
+        valve = np.where(healthy, op, valve)
+        self.valve[idx] = valve
+
+        # Dead time through a per-loop ring buffer
+        position = self.step_count[idx] % self._delay_len
+        self._delay_buffer[idx, position] = valve
+        delayed = self._delay_buffer[idx, (position - self.delay_steps[idx]) % self._delay_len]
+
+        # First-order process response
+        alpha = self.alpha[idx]
+        y = alpha * self.y[idx] + (1.0 - alpha) * self.gain[idx] * (delayed - self.base_op[idx])
+        self.y[idx] = y
+
+        load = 0.995 * self.load[idx] + rng.normal(0.0, 1.0, m) * self.load_std[idx]
+        self.load[idx] = load
+
+        t = self.step_count[idx] * dt
+        disturbance = self.dist_amplitude[idx] * np.sin(
+            2 * np.pi * t / self.dist_period[idx] + self.dist_phase[idx]
+        )
+
+        self.pv[idx] = (self.base_pv[idx] + y + load + disturbance
+                        + rng.normal(0.0, 1.0, m) * self.noise_std[idx])
+        self.step_count[idx] += 1
+        return idx
+
+    def generate_batch(self, timestamp: Union[datetime, int] = None,
+                       loop_ids: List[str] = None) -> SampleBatch:
+        """
+        Advance the given loops one step and return their samples.
+
+        This matches ``ControlLoopDataGenerator.generate_batch`` so the
+        simulator can feed the streaming pipeline directly.
+
+        Args:
+            timestamp: Timestamp as a naive UTC datetime or epoch nanoseconds
+                (default: current time)
+            loop_ids: Loops to advance (default: all loops)
+
+        Returns:
+            SampleBatch with one sample per loop
+        """
+        if timestamp is None:
+            timestamp = datetime.utcnow()
+        if isinstance(timestamp, datetime):
+            timestamp = (timestamp - _EPOCH) // timedelta(microseconds=1) * 1000
+        if loop_ids is None:
+            loop_ids = self.loop_ids
+
+        idx = self.step(np.array([self._index[loop_id] for loop_id in loop_ids], dtype=int))
+        batch = SampleBatch.for_tick(timestamp, loop_ids)
+        batch.pv[:] = self.pv[idx]
+        batch.op[:] = self.op[idx]
+        batch.sp[:] = self.sp[idx]
+        return batch
+
+    def simulate(self, n_steps: int, start_ns: Union[int, np.ndarray]) -> SampleBatch:
+        """
+        Simulate every loop for ``n_steps`` steps.
+
+        Args:
+            n_steps: Number of steps
+            start_ns: Timestamp of the first step in epoch nanoseconds, one
+                for all loops or one per loop
+
+        Returns:
+            SampleBatch ordered by time, then loop
+        """
+        n = len(self.loop_ids)
+        pv = np.empty((n_steps, n))
+        op = np.empty((n_steps, n))
+        sp = np.empty((n_steps, n))
+        for k in range(n_steps):
+            self.step()
+            pv[k], op[k], sp[k] = self.pv, self.op, self.sp
+
+        dt_ns = np.round(self.dt * 1e9).astype(np.int64)
+        ts = np.asarray(start_ns, dtype=np.int64) + np.arange(n_steps, dtype=np.int64)[:, None] * dt_ns
+        loop_ids = np.tile(np.array(self.loop_ids, dtype=object), n_steps)
+        batch = SampleBatch(ts.ravel(), loop_ids, np.full(n * n_steps, "AUT", dtype=object),
+                            pv.ravel(), op.ravel(), sp.ravel())
+        # Loops with different step sizes interleave
+        return batch.sorted_by_time()
+
+    def generate_trending_data(self, loop_id: str, start_time: datetime,
+                               duration_minutes: int = 5, interval_seconds: int = 1) -> List[Dict[str, Any]]:
+        """
+        Simulate one loop ahead and return its samples as legacy data points.
+
+        This matches ``ControlLoopDataGenerator.generate_trending_data``. The
+        loop advances at its own step size and is sampled about every
+        ``interval_seconds`` (at least once per step).
+
+        Args:
+            loop_id: Loop identifier
+            start_time: Time of the first sample
+            duration_minutes: Duration in minutes
+            interval_seconds: Interval between samples in seconds
+
+        Returns:
+            List of data points for PV, OP and SP over time
+        """
+        i = self._index[loop_id]
+        dt = float(self.dt[i])
+        stride = max(1, int(round(interval_seconds / dt)))
+        n = int(duration_minutes * 60 / (stride * dt))
+        pv, op, sp = np.empty(n), np.empty(n), np.empty(n)
+        idx = np.array([i])
+        for k in range(n):
+            for _ in range(stride):
+                self.step(idx)
+            pv[k], op[k], sp[k] = self.pv[i], self.op[i], self.sp[i]
+
+        start_ns = (start_time - _EPOCH) // timedelta(microseconds=1) * 1000
+        ts = start_ns + np.arange(n, dtype=np.int64) * int(round(stride * dt * 1e9))
+        return SampleBatch(ts, np.full(n, loop_id, dtype=object), np.full(n, "AUT", dtype=object),
+                           pv, op, sp).to_records()
+
+    def labels(self) -> List[Dict[str, Any]]:
+        """
+        Get the ground-truth label and fault parameters of every loop.
+
+        Returns:
+            One dictionary per loop
+        """
+        labels = []
+        for i, loop_id in enumerate(self.loop_ids):
+            scenario = self.scenarios[i]
+            labels.append({
+                "loop_id": loop_id,
+                "scenario": scenario,
+                "classification": SCENARIO_LABELS[scenario],
+                "process_gain": round(float(self.gain[i]), 6),
+                "time_constant_s": round(float(self.tau[i]), 6),
+                "dt_s": float(self.dt[i]),
+                "dead_time_s": round(float(self.delay_steps[i] * self.dt[i]), 6),
+                "kc": round(float(self.kc[i]), 6),
+                "ti_s": round(float(self.ti[i]), 6),
+                "stiction_s": round(float(self.stiction_s[i]), 6),
+                "stiction_j": round(float(self.stiction_j[i]), 6) if self.stiction_s[i] else 0.0,
+                "deadband": round(float(self.deadband[i]), 6),
+                "disturbance_amplitude": round(float(self.dist_amplitude[i]), 6),
+                "disturbance_period_s": round(float(self.dist_period[i]), 6) if self.dist_amplitude[i] else None,
+            })
+        return labels
+
+    def export(self, directory: str, n_steps: int, start: Optional[datetime] = None,
+               chunk_steps: int = 3600) -> Dict[str, str]:
+        """
+        Write a labeled dataset.
+
+        ``samples.csv`` uses the historian export layout read by the replay
+        source (``timestamp,tag,PV,SP,OP,Mode``) and ``labels.json`` holds the
+        ground truth. Samples are simulated and written in chunks so large
+        datasets do not have to fit in memory.
+
+        Args:
+            directory: Output directory (created if missing)
+            n_steps: Number of time steps to simulate
+            start: Time of the first sample (default: 2025-01-01 00:00 UTC)
+            chunk_steps: Steps simulated per write
+
+        Returns:
+            Paths of the written files
+        """
+        import pandas as pd
+
+        os.makedirs(directory, exist_ok=True)
+        start = start or datetime(2025, 1, 1)
+        start_ns = (start - _EPOCH) // timedelta(microseconds=1) * 1000
+        dt_ns = np.round(self.dt * 1e9).astype(np.int64)
+
+        samples_path = os.path.join(directory, "samples.csv")
+        written = 0
+        with open(samples_path, "w", encoding="utf-8", newline="") as f:
+            while written < n_steps:
+                steps = min(chunk_steps, n_steps - written)
+                batch = self.simulate(steps, start_ns + written * dt_ns)
+                frame = pd.DataFrame({
+                    "timestamp": pd.to_datetime(batch.ts, utc=True).strftime("%Y-%m-%dT%H:%M:%S.%fZ"),
+                    "tag": batch.loop_id,
+                    "PV": batch.pv.round(6),
+                    "SP": batch.sp.round(6),
+                    "OP": batch.op.round(6),
+                    "Mode": batch.mode,
+                })
+                frame.to_csv(f, header=written == 0, index=False)
+                written += steps
+
+        labels_path = os.path.join(directory, "labels.json")
+        with open(labels_path, "w", encoding="utf-8") as f:
+            json.dump({
+                "seed": self.seed,
+                # Per-loop step sizes are in the loop labels
+                "dt_s": float(self.dt[0]) if np.all(self.dt == self.dt[0]) else None,
+                "steps": n_steps,
+                "start": start.isoformat() + "Z",
+                "loops": self.labels(),
+            }, f, indent=2)
+
+        logger.info(f"Exported {n_steps} steps for {len(self.loop_ids)} loops to {directory}")
+        return {"samples": samples_path, "labels": labels_path}
+
+
+def main():
+    """Command line entry point for exporting a labeled dataset."""
+    parser = argparse.ArgumentParser(description="Export a labeled fault-injection dataset")
+    parser.add_argument("--loops", type=int, default=60, help="Number of simulated loops")
+    parser.add_argument("--steps", type=int, default=3600, help="Time steps to simulate")
+    parser.add_argument("--dt", type=float, default=1.0, help="Step size in seconds")
+    parser.add_argument("--seed", type=int, default=0, help="Random seed")
+    parser.add_argument("--mix", default="", help="Scenario weights, e.g. normal=2,stiction=1")
+    parser.add_argument("--out", default="scenario_dataset", help="Output directory")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+    simulator = FaultScenarioSimulator(
+        n_loops=args.loops, seed=args.seed, dt=args.dt,
+        scenario_mix=parse_scenario_mix(args.mix) or None
+    )
+    paths = simulator.export(args.out, args.steps)
+    print(json.dumps(paths, indent=2))
+
+
+if __name__ == "__main__":
+    main()
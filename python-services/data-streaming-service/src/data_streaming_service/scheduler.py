@@ -0,0 +1,204 @@
+"""Monotonic-deadline tick scheduler for per-loop sampling rates."""
+
+import time
+import heapq
+import asyncio
+import logging
+from datetime import datetime, timedelta
+from typing import Dict, List, NamedTuple, Tuple
+
+logger = logging.getLogger(__name__)
+
+OVERRUN_SKIP = "skip"
+OVERRUN_CATCH_UP = "catch_up"
+OVERRUN_POLICIES = (OVERRUN_SKIP, OVERRUN_CATCH_UP)
+
+_EPOCH = datetime(1970, 1, 1)
+
+
+class Tick(NamedTuple):
+    """A batch of loops that are due on the same grid point."""
+
+    timestamp: datetime  # Exact grid time (naive UTC)
+    timestamp_ns: int  # Same instant in epoch nanoseconds
+    loop_ids: List[str]
+    lag: float  # Seconds between the deadline and the actual wake-up
+    skipped: int  # Grid points dropped by the overrun policy before this tick
+
+
+def parse_loop_intervals(spec: str) -> Dict[str, float]:
+    """
+    Parse a per-loop sampling interval specification.
+
+    Args:
+        spec: Comma separated ``LOOP_ID=milliseconds`` pairs, the same unit
+            as ``loop_configs.sampling_interval``
+
+    Returns:
+        Mapping of loop ID to interval in seconds
+    """
+    intervals = {}
+    for item in spec.split(","):
+        item = item.strip()
+        if not item:
+            continue
+        loop_id, _, value = item.partition("=")
+        if not value:
+            raise ValueError(f"Invalid sampling interval entry: {item!r}")
+        intervals[loop_id.strip()] = float(value) / 1000.0
+    return intervals
+
+
+class TickScheduler:
+    """
+    Schedules loop sampling ticks on a drift-free time grid.
+
+    Loops sharing a sampling interval form one group, and each group keeps a
+    single entry in a timing heap keyed by its next grid point. Grid points
+    are integer multiples of the interval since the Unix epoch, so timestamps
+    never drift, and groups whose grid points coincide are released together
+    as one tick. Sleeping is done against ``time.monotonic_ns`` so wall-clock
+    adjustments do not stretch or compress the schedule.
+    """
+
+    def __init__(self, overrun_policy: str = OVERRUN_SKIP, max_catch_up: int = 10):
+        """
+        Initialize the scheduler.
+
+        Args:
+            overrun_policy: ``skip`` drops missed grid points and resumes on the
+                next future one; ``catch_up`` emits every missed grid point
+                back-to-back, up to ``max_catch_up`` of them
+            max_catch_up: Largest backlog replayed under ``catch_up`` before
+                falling back to skipping
+        """
+        if overrun_policy not in OVERRUN_POLICIES:
+            raise ValueError(f"Unknown overrun policy: {overrun_policy!r}")
+
+        self.overrun_policy = overrun_policy
+        self.max_catch_up = max(0, max_catch_up)
+
+        self._groups: Dict[int, List[str]] = {}  # period_ns -> loop IDs
+        self._heap: List[List[int]] = []  # [next_grid_ns, period_ns]
+
+        # Offset used to map epoch grid points onto the monotonic clock
+        self._clock_offset_ns = time.time_ns() - time.monotonic_ns()
+
+        # Statistics
+        self.ticks = 0
+        self.overruns = 0
+        self.skipped = 0
+        self.last_lag = 0.0
+        self.max_lag = 0.0
+
+    def add_loop(self, loop_id: str, interval: float):
+        """
+        Add a loop with its own sampling interval.
+
+        Args:
+            loop_id: Loop identifier
+            interval: Sampling interval in seconds
+        """
+        period_ns = int(round(interval * 1e9))
+        if period_ns <= 0:
+            raise ValueError(f"Sampling interval for {loop_id} must be positive")
+
+        self.remove_loop(loop_id)
+
+        if period_ns not in self._groups:
+            self._groups[period_ns] = []
+            now_ns = self._now_ns()
+            next_grid_ns = (now_ns // period_ns + 1) * period_ns
+            heapq.heappush(self._heap, [next_grid_ns, period_ns])
+
+        self._groups[period_ns].append(loop_id)
+
+    def remove_loop(self, loop_id: str):
+        """Remove a loop from the schedule if present."""
+        for period_ns, loop_ids in list(self._groups.items()):
+            if loop_id in loop_ids:
+                loop_ids.remove(loop_id)
+                if not loop_ids:
+                    del self._groups[period_ns]
+                    self._heap = [entry for entry in self._heap if entry[1] != period_ns]
+                    heapq.heapify(self._heap)
+
+    def get_intervals(self) -> Dict[str, float]:
+        """Get the configured interval in seconds for every scheduled loop."""
+        return {
+            loop_id: period_ns / 1e9
+            for period_ns, loop_ids in self._groups.items()
+            for loop_id in loop_ids
+        }
+
+    async def next_tick(self) -> Tick:
+        """
+        Wait for the next grid point and return every loop due on it.
+
+        Returns:
+            The next tick
+        """
+        if not self._heap:
+            raise RuntimeError("No loops scheduled")
+
+        deadline_ns = self._heap[0][0]
+        delay_ns = deadline_ns - self._now_ns()
+        if delay_ns > 0:
+            await asyncio.sleep(delay_ns / 1e9)
+
+        # Release every group due on this exact grid point
+        loop_ids: List[str] = []
+        skipped = 0
+        now_ns = self._now_ns()
+        while self._heap and self._heap[0][0] == deadline_ns:
+            entry = self._heap[0]
+            period_ns = entry[1]
+            loop_ids.extend(self._groups[period_ns])
+
+            next_grid_ns, group_skipped = self._advance(deadline_ns, period_ns, now_ns)
+            skipped = max(skipped, group_skipped)
+            heapq.heapreplace(self._heap, [next_grid_ns, period_ns])
+
+        lag = max(0.0, (now_ns - deadline_ns) / 1e9)
+        self.ticks += 1
+        self.skipped += skipped
+        self.last_lag = lag
+        self.max_lag = max(self.max_lag, lag)
+
+        return Tick(
+            timestamp=_EPOCH + timedelta(microseconds=deadline_ns // 1000),
+            timestamp_ns=deadline_ns,
+            loop_ids=loop_ids,
+            lag=lag,
+            skipped=skipped,
+        )
+
+    def _advance(self, grid_ns: int, period_ns: int, now_ns: int) -> Tuple[int, int]:
+        """Compute a group's next grid point according to the overrun policy."""
+        next_grid_ns = grid_ns + period_ns
+        if next_grid_ns > now_ns:
+            return next_grid_ns, 0
+
+        # The next grid point is already in the past: the cycle overran
+        self.overruns += 1
+        missed = (now_ns - next_grid_ns) // period_ns + 1
+
+        if self.overrun_policy == OVERRUN_CATCH_UP and missed <= self.max_catch_up:
+            return next_grid_ns, 0
+
+        resume_ns = (now_ns // period_ns + 1) * period_ns
+        return resume_ns, (resume_ns - next_grid_ns) // period_ns
+
+    def _now_ns(self) -> int:
+        """Current time on the epoch grid, driven by the monotonic clock."""
+        return time.monotonic_ns() + self._clock_offset_ns
+
+    def get_stats(self) -> Dict[str, float]:
+        """Get scheduler statistics."""
+        return {
+            "ticks": self.ticks,
+            "overruns": self.overruns,
+            "skipped": self.skipped,
+            "last_lag": self.last_lag,
+            "max_lag": self.max_lag,
+        }
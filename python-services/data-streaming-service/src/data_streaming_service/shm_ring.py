@@ -0,0 +1,217 @@
+"""Shared-memory ring buffers of recent samples for co-located readers."""
+
+import re
+import zlib
+import logging
+from multiprocessing import shared_memory
+from typing import Dict, Optional
+
+import numpy as np
+
+from .batch import SampleBatch
+
+logger = logging.getLogger(__name__)
+
+# Segment layout, shared with diagnostics_service.shm_ring:
+#   header: HEADER_WORDS little-endian uint64 words
+#     [0] magic, [1] layout version, [2] capacity (samples),
+#     [3] head: samples committed, [4] reserve: samples claimed by the writer
+#   then COLUMNS float64 arrays of ``capacity`` values each; sample k lives
+#   in slot k % capacity, ``ts`` in epoch seconds
+MAGIC = 0x474E495250534C43  # b"CLSPRING" read as little-endian uint64
+VERSION = 1
+HEADER_WORDS = 8
+HEADER_BYTES = HEADER_WORDS * 8
+H_MAGIC, H_VERSION, H_CAPACITY, H_HEAD, H_RESERVE = range(5)
+COLUMNS = ("ts", "pv", "op", "sp")
+
+
+def segment_name(prefix: str, loop_id: str) -> str:
+    """
+    Name of the shared-memory segment holding a loop's samples.
+
+    Characters outside ``[A-Za-z0-9_.-]`` are replaced and a checksum of the
+    original ID is appended, so distinct loops never share a segment.
+
+    Args:
+        prefix: Segment name prefix
+        loop_id: Loop identifier
+
+    Returns:
+        Segment name
+    """
+    safe = re.sub(r"[^A-Za-z0-9_.-]", "_", loop_id)
+    if safe != loop_id:
+        safe = f"{safe}.{zlib.crc32(loop_id.encode('utf-8')):08x}"
+    return prefix + safe
+
+
+class RingWriter:
+    """
+    Single-writer ring buffer of one loop's samples in shared memory.
+
+    Writes follow a seqlock protocol on two counters: ``reserve`` is advanced
+    before any slot is touched and ``head`` once the new samples are complete,
+    so ``reserve != head`` while a write is in progress. A reader notes
+    ``head`` (with ``reserve == head``), copies the samples it needs and keeps
+    the copy only if ``reserve`` still equals that ``head``; otherwise it
+    retries. Readers never block the writer.
+    """
+
+    def __init__(self, name: str, capacity: int):
+        """
+        Create (or replace) the segment.
+
+        Args:
+            name: Segment name
+            capacity: Samples kept; older samples are overwritten
+        """
+        self.name = name
+        self.capacity = max(2, int(capacity))
+        size = HEADER_BYTES + len(COLUMNS) * self.capacity * 8
+        try:
+            self.shm = shared_memory.SharedMemory(name=name, create=True, size=size)
+        except FileExistsError:
+            # Left behind by a previous run that did not shut down cleanly
+            stale = shared_memory.SharedMemory(name=name)
+            stale.close()
+            stale.unlink()
+            self.shm = shared_memory.SharedMemory(name=name, create=True, size=size)
+
+        self.header = np.ndarray((HEADER_WORDS,), dtype="<u8", buffer=self.shm.buf)
+        self.data = np.ndarray((len(COLUMNS), self.capacity), dtype="<f8", buffer=self.shm.buf,
+                               offset=HEADER_BYTES)
+        self.header[:] = 0
+        self.header[H_CAPACITY] = self.capacity
+        self.header[H_VERSION] = VERSION
+        # Magic last: readers ignore segments that are still being set up
+        self.header[H_MAGIC] = MAGIC
+        self.head = 0
+
+    def write(self, ts: np.ndarray, pv: np.ndarray, op: np.ndarray, sp: np.ndarray):
+        """
+        Append samples in time order.
+
+        Args:
+            ts: Timestamps in epoch seconds
+            pv: Process variable values
+            op: Controller output values
+            sp: Set point values
+        """
+        n = len(ts)
+        if n > self.capacity:
+            ts, pv, op, sp = ts[-self.capacity:], pv[-self.capacity:], op[-self.capacity:], sp[-self.capacity:]
+            self.head += n - self.capacity
+            n = self.capacity
+
+        end = self.head + n
+        self.header[H_RESERVE] = end
+        slot = self.head % self.capacity
+        first = min(n, self.capacity - slot)
+        for row, values in enumerate((ts, pv, op, sp)):
+            self.data[row, slot:slot + first] = values[:first]
+            if first < n:
+                self.data[row, :n - first] = values[first:]
+        self.header[H_HEAD] = end
+        self.head = end
+
+    def close(self, unlink: bool = True):
+        """
+        Release the segment.
+
+        Args:
+            unlink: Also remove it, so readers fall back to their other sources
+        """
+        del self.header, self.data
+        self.shm.close()
+        if unlink:
+            try:
+                self.shm.unlink()
+            except FileNotFoundError:
+                pass
+
+
+class SharedRingPublisher:
+    """
+    Publishes the most recent samples of every loop to shared memory.
+
+    Each loop gets its own ring segment, created on its first sample and
+    sized to hold ``seconds`` of data at the loop's sampling interval. Only
+    co-located processes can read them (e.g. the diagnostics service), which
+    saves reading fresh windows back out of InfluxDB.
+    """
+
+    def __init__(self, seconds: float, default_interval: float,
+                 loop_intervals: Optional[Dict[str, float]] = None, prefix: str = "clpm_ring_"):
+        """
+        Initialize the publisher.
+
+        Args:
+            seconds: History kept per loop
+            default_interval: Sampling interval of loops without an override
+            loop_intervals: Per-loop sampling intervals in seconds
+            prefix: Segment name prefix, shared with the readers
+        """
+        self.seconds = seconds
+        self.default_interval = default_interval
+        self.loop_intervals = loop_intervals or {}
+        self.prefix = prefix
+        self.rings: Dict[str, RingWriter] = {}
+        self.unavailable = set()
+        self.samples_published = 0
+        self.failed = 0
+
+    def _ring(self, loop_id: str) -> Optional[RingWriter]:
+        """Get the ring of a loop, creating it on first use."""
+        ring = self.rings.get(loop_id)
+        if ring is None and loop_id not in self.unavailable:
+            interval = self.loop_intervals.get(loop_id, self.default_interval)
+            capacity = int(np.ceil(self.seconds / max(interval, 1e-3)))
+            name = segment_name(self.prefix, loop_id)
+            try:
+                ring = self.rings[loop_id] = RingWriter(name, capacity)
+            except OSError as e:
+                # Not retried: a full /dev/shm would fail again on every tick
+                logger.error(f"Could not create shared-memory ring {name}: {e}")
+                self.unavailable.add(loop_id)
+                return None
+            logger.info(f"Publishing {loop_id} to shared memory as {name} ({ring.capacity} samples)")
+        return ring
+
+    def publish(self, batch: SampleBatch):
+        """
+        Append a batch to the rings of its loops.
+
+        Args:
+            batch: Samples in any loop order
+        """
+        if not len(batch):
+            return
+        loop_ids, inverse = np.unique(batch.loop_id, return_inverse=True)
+        ts = batch.ts / 1e9
+        if len(loop_ids) == len(batch):
+            # One sample per loop, as on every scheduler tick
+            for i, loop_id in enumerate(batch.loop_id.tolist()):
+                ring = self._ring(loop_id)
+                if ring is None:
+                    self.failed += 1
+                    continue
+                ring.write(ts[i:i + 1], batch.pv[i:i + 1], batch.op[i:i + 1], batch.sp[i:i + 1])
+                self.samples_published += 1
+            return
+
+        order = np.lexsort((ts, inverse))
+        bounds = np.flatnonzero(np.diff(inverse[order])) + 1
+        for rows in np.split(order, bounds):
+            ring = self._ring(batch.loop_id[rows[0]])
+            if ring is None:
+                self.failed += len(rows)
+                continue
+            ring.write(ts[rows], batch.pv[rows], batch.op[rows], batch.sp[rows])
+            self.samples_published += len(rows)
+
+    def close(self):
+        """Remove every segment."""
+        for ring in self.rings.values():
+            ring.close()
+        self.rings.clear()
@@ -0,0 +1,371 @@
+"""Pluggable output sinks for the data streaming service."""
+
+import os
+import logging
+from abc import ABC, abstractmethod
+from collections import deque
+from datetime import datetime
+from typing import Any, Dict, List, Optional, Union
+
+from .batch import SampleBatch, as_batch
+
+logger = logging.getLogger(__name__)
+
+
+class Sink(ABC):
+    """
+    Destination for generated samples.
+
+    Writing is split into ``serialize`` and ``write`` so the pipeline can run
+    the two halves as separate stages. ``serialize`` must return a picklable
+    payload because the spill backpressure policy may store it on disk.
+    """
+
+    name = "sink"
+
+    @abstractmethod
+    def serialize(self, batch: SampleBatch) -> Any:
+        """Convert a sample batch into this sink's write payload."""
+
+    @abstractmethod
+    def write(self, payload: Any) -> bool:
+        """
+        Write a serialized payload.
+
+        Returns:
+            bool: True if successful, False otherwise
+        """
+
+    def write_data_points(self, data_points: Union[SampleBatch, List[Dict[str, Any]]]) -> bool:
+        """Serialize and write a batch (or legacy data point list) in one call."""
+        try:
+            payload = self.serialize(as_batch(data_points))
+        except Exception as e:
+            logger.error(f"Failed to serialize data points for {self.name} sink: {e}")
+            return False
+        return self.write(payload)
+
+    def health_check(self) -> bool:
+        """Check the sink is usable without writing any data."""
+        return True
+
+    def close(self):
+        """Flush and release any resources held by the sink."""
+
+
+class InfluxSink(Sink):
+    """Writes line protocol to InfluxDB."""
+
+    name = "influx"
+
+    def __init__(self, client=None):
+        """
+        Initialize the sink.
+
+        Args:
+            client: Existing ``InfluxDBStreamingClient`` (default: create one
+                from environment variables)
+        """
+        if client is None:
+            from .influx_client import InfluxDBStreamingClient
+            client = InfluxDBStreamingClient()
+        self.client = client
+
+    def serialize(self, batch: SampleBatch) -> List[str]:
+        return self.client.serialize(batch)
+
+    def write(self, payload: List[str]) -> bool:
+        return self.client.write_records(payload)
+
+    def health_check(self) -> bool:
+        return self.client.health_check()
+
+    def close(self):
+        self.client.close()
+
+
+class LineProtocolFileSink(Sink):
+    """
+    Appends line protocol to a local file with size-based rotation.
+
+    The active file is ``<directory>/<prefix>.lp``. When it grows past
+    ``max_bytes`` it is renamed with a UTC timestamp suffix and a new file
+    is started; only the newest ``backup_count`` rotated files are kept.
+    The files can be loaded into InfluxDB later with ``influx write``.
+    """
+
+    name = "file"
+
+    def __init__(self, directory: str, measurement: str = "control_loops",
+                 max_bytes: int = 100 * 1024 * 1024, backup_count: int = 10,
+                 prefix: str = "control_loops"):
+        """
+        Initialize the sink.
+
+        Args:
+            directory: Output directory (created if missing)
+            measurement: Measurement name for the records
+            max_bytes: Size at which the active file is rotated
+            backup_count: Number of rotated files to keep (0 keeps all)
+            prefix: File name prefix
+        """
+        self.directory = directory
+        self.measurement = measurement
+        self.max_bytes = max_bytes
+        self.backup_count = backup_count
+        self.prefix = prefix
+        os.makedirs(directory, exist_ok=True)
+
+        self.path = os.path.join(directory, f"{prefix}.lp")
+        self._file = open(self.path, "a", encoding="utf-8")
+
+    def serialize(self, batch: SampleBatch) -> List[str]:
+        return batch.to_line_protocol(self.measurement)
+
+    def write(self, payload: List[str]) -> bool:
+        try:
+            if payload:
+                self._file.write("\n".join(payload))
+                self._file.write("\n")
+                self._file.flush()
+            if self._file.tell() >= self.max_bytes:
+                self._rotate()
+            return True
+        except Exception as e:
+            logger.error(f"Failed to write line protocol file {self.path}: {e}")
+            return False
+
+    def _rotate(self):
+        """Move the active file aside and start a new one."""
+        self._file.close()
+        suffix = datetime.utcnow().strftime("%Y%m%dT%H%M%S%f")
+        os.replace(self.path, os.path.join(self.directory, f"{self.prefix}.{suffix}.lp"))
+        self._file = open(self.path, "a", encoding="utf-8")
+
+        if self.backup_count > 0:
+            rotated = sorted(
+                f for f in os.listdir(self.directory)
+                if f.startswith(f"{self.prefix}.") and f.endswith(".lp") and f != f"{self.prefix}.lp"
+            )
+            for old in rotated[:-self.backup_count]:
+                os.remove(os.path.join(self.directory, old))
+
+    def health_check(self) -> bool:
+        return os.access(self.directory, os.W_OK)
+
+    def close(self):
+        self._file.close()
+
+
+class ParquetSink(Sink):
+    """
+    Buffers rows and writes them as Parquet files.
+
+    Each file holds at least ``rows_per_file`` rows in wide form (one row
+    per sample with pv/op/sp columns). Requires ``pyarrow``.
+    """
+
+    name = "parquet"
+
+    def __init__(self, directory: str, rows_per_file: int = 100_000):
+        """
+        Initialize the sink.
+
+        Args:
+            directory: Output directory (created if missing)
+            rows_per_file: Rows buffered before a file is written
+        """
+        try:
+            import pyarrow  # noqa: F401
+        except ImportError as e:
+            raise ImportError("The parquet sink requires pyarrow (pip install pyarrow)") from e
+
+        self.directory = directory
+        self.rows_per_file = rows_per_file
+        os.makedirs(directory, exist_ok=True)
+
+        self._batches: List[SampleBatch] = []
+        self._rows = 0
+
+    def serialize(self, batch: SampleBatch) -> SampleBatch:
+        return batch
+
+    def write(self, payload: SampleBatch) -> bool:
+        try:
+            self._batches.append(payload)
+            self._rows += len(payload)
+            if self._rows >= self.rows_per_file:
+                self._flush()
+            return True
+        except Exception as e:
+            logger.error(f"Failed to write parquet file: {e}")
+            return False
+
+    def _flush(self):
+        """Write buffered rows to a new Parquet file."""
+        if not self._rows:
+            return
+        import pandas as pd
+
+        frame = pd.DataFrame(SampleBatch.concat(self._batches).to_columns())
+        suffix = datetime.utcnow().strftime("%Y%m%dT%H%M%S%f")
+        frame.to_parquet(os.path.join(self.directory, f"control_loops.{suffix}.parquet"), index=False)
+        self._batches = []
+        self._rows = 0
+
+    def health_check(self) -> bool:
+        return os.access(self.directory, os.W_OK)
+
+    def close(self):
+        try:
+            self._flush()
+        except Exception as e:
+            logger.error(f"Failed to flush parquet sink: {e}")
+
+
+class NullSink(Sink):
+    """Discards everything; used to measure generator throughput."""
+
+    name = "null"
+
+    def __init__(self):
+        """Initialize the sample counter."""
+        self.samples_written = 0
+
+    def serialize(self, batch: SampleBatch) -> int:
+        return len(batch)
+
+    def write(self, payload: int) -> bool:
+        self.samples_written += payload
+        return True
+
+
+class MemorySink(Sink):
+    """Keeps written batches in memory, optionally bounded."""
+
+    name = "memory"
+
+    def __init__(self, max_samples: Optional[int] = None):
+        """
+        Initialize the sink.
+
+        Args:
+            max_samples: Keep only about the most recent samples, dropping
+                whole batches (default: unbounded)
+        """
+        self.max_samples = max_samples
+        self.batches: deque = deque()
+        self.samples = 0
+
+    def serialize(self, batch: SampleBatch) -> SampleBatch:
+        return batch
+
+    def write(self, payload: SampleBatch) -> bool:
+        self.batches.append(payload)
+        self.samples += len(payload)
+        if self.max_samples is not None:
+            while len(self.batches) > 1 and self.samples - len(self.batches[0]) >= self.max_samples:
+                self.samples -= len(self.batches.popleft())
+        return True
+
+    def to_batch(self) -> SampleBatch:
+        """Get everything held as one batch."""
+        return SampleBatch.concat(list(self.batches))
+
+
+class TeeSink(Sink):
+    """
+    Fans every batch out to several sinks, e.g. to dual-write during migrations.
+
+    The payload holds one part per sink. Parts that were written are
+    cleared from it, so retrying (or spooling) a failed payload repeats
+    only the sinks that failed instead of writing the others twice.
+    Failures are counted per sink, by position.
+    """
+
+    name = "tee"
+
+    def __init__(self, sinks: List[Sink]):
+        """
+        Initialize the sink.
+
+        Args:
+            sinks: Sinks to write to, in order
+        """
+        if not sinks:
+            raise ValueError("TeeSink needs at least one sink")
+        self.sinks = sinks
+        self.failures = [0] * len(sinks)
+
+    def serialize(self, batch: SampleBatch) -> List[Any]:
+        return [sink.serialize(batch) for sink in self.sinks]
+
+    def write(self, payload: List[Any]) -> bool:
+        # Write to every sink even if an earlier one fails
+        for i, (sink, part) in enumerate(zip(self.sinks, payload)):
+            if part is None:
+                continue
+            if sink.write(part):
+                payload[i] = None
+            else:
+                self.failures[i] += 1
+        return all(part is None for part in payload)
+
+    def health_check(self) -> bool:
+        results = [sink.health_check() for sink in self.sinks]
+        for i, (sink, healthy) in enumerate(zip(self.sinks, results)):
+            if not healthy:
+                logger.error(f"Sink {i} ({sink.name}) failed its health check")
+        return all(results)
+
+    def close(self):
+        for sink in self.sinks:
+            try:
+                sink.close()
+            except Exception as e:
+                logger.error(f"Failed to close {sink.name} sink: {e}")
+
+
+def create_sink(spec: str) -> Sink:
+    """
+    Build a sink from a comma separated list of sink names.
+
+    Supported names are ``influx``, ``file``, ``parquet``, ``null`` and
+    ``memory``; more than one name produces a ``TeeSink``. Sink options are
+    read from environment variables.
+
+    Args:
+        spec: Sink names, e.g. ``"influx,file"``
+
+    Returns:
+        The configured sink
+    """
+    names = [name.strip().lower() for name in spec.split(",") if name.strip()]
+    if not names:
+        raise ValueError("No sinks configured")
+
+    sinks = []
+    for name in names:
+        if name == "influx":
+            sinks.append(InfluxSink())
+        elif name == "file":
+            sinks.append(LineProtocolFileSink(
+                directory=os.getenv("SINK_FILE_DIR", "output"),
+                measurement=os.getenv("INFLUXDB_MEASUREMENT", "control_loops"),
+                max_bytes=int(os.getenv("SINK_FILE_MAX_BYTES", str(100 * 1024 * 1024))),
+                backup_count=int(os.getenv("SINK_FILE_BACKUPS", "10"))
+            ))
+        elif name == "parquet":
+            sinks.append(ParquetSink(
+                directory=os.getenv("SINK_PARQUET_DIR", "output"),
+                rows_per_file=int(os.getenv("SINK_PARQUET_ROWS", "100000"))
+            ))
+        elif name == "null":
+            sinks.append(NullSink())
+        elif name == "memory":
+            max_samples = os.getenv("SINK_MEMORY_MAX_SAMPLES")
+            sinks.append(MemorySink(int(max_samples) if max_samples else None))
+        else:
+            raise ValueError(f"Unknown sink: {name!r}")
+
+    return sinks[0] if len(sinks) == 1 else TeeSink(sinks)
@@ -0,0 +1,38 @@
+"""Tests for SampleBatch serialization."""
+
+import numpy as np
+
+from data_streaming_service.batch import SampleBatch
+
+TS = 1_700_000_000 * 10**9
+
+
+def make_batch(loop_ids, pv, op, sp, modes=None) -> SampleBatch:
+    n = len(loop_ids)
+    return SampleBatch(np.full(n, TS), loop_ids, modes or ["AUT"] * n, pv, op, sp)
+
+
+def test_line_protocol_fields_and_order():
+    lines = make_batch(["TIC1"], [1.5], [2.0], [3.25]).to_line_protocol("loops")
+    assert lines == [f"loops,Mode=AUT,loop_id=TIC1 op=2.0,pv=1.5,sp=3.25 {TS}"]
+
+
+def test_line_protocol_escaping():
+    batch = make_batch(["a b,c=d\\e"], [1.0], [1.0], [1.0], modes=["M AN"])
+    line, = batch.to_line_protocol("my meas,x")
+    assert line.startswith("my\\ meas\\,x,Mode=M\\ AN,loop_id=a\\ b\\,c\\=d\\\\e ")
+
+
+def test_line_protocol_omits_non_finite_fields():
+    batch = make_batch(["A", "B", "C", "D"],
+                       pv=[np.nan, 1.0, np.inf, np.nan],
+                       op=[1.0, -np.inf, 2.0, np.nan],
+                       sp=[2.0, 3.0, np.nan, -np.inf])
+    lines = batch.to_line_protocol()
+    assert [line.split(" ")[1] for line in lines] == ["op=1.0,sp=2.0", "pv=1.0,sp=3.0", "op=2.0"]
+    assert not any("inf" in line or "nan" in line for line in lines)
+
+
+def test_records_skip_non_finite_values():
+    records = make_batch(["A"], [np.inf], [np.nan], [1.0]).to_records()
+    assert [(r["_field"], r["_value"]) for r in records] == [("SP", 1.0)]
@@ -0,0 +1,132 @@
+"""Tests for the change detector: detection, hysteresis, rate limits and batching."""
+
+import numpy as np
+import pytest
+
+from data_streaming_service import change_detector as change_detector_module
+from data_streaming_service.batch import SampleBatch
+from data_streaming_service.change_detector import ChangeDetector
+
+SECOND = 1_000_000_000
+T0 = 1_700_000_000 * SECOND
+WARMUP = 1800
+CHANGE = 3800  # sample index of the injected changes
+LOOPS = ["quiet", "mean", "variance", "op"]
+
+
+def detector(**kwargs):
+    params = dict(baseline_samples=2400, fast_samples=60, warmup_samples=WARMUP, min_interval=60, context=30)
+    return ChangeDetector(**{**params, **kwargs})
+
+
+def signals(n=CHANGE + 2000, seed=0):
+    """PV/OP/SP per loop, with one kind of change injected in each but the first."""
+    rng = np.random.default_rng(seed)
+    noise = rng.standard_normal((len(LOOPS), n))
+    pv = 50 + 0.2 * noise
+    op = 40 + 0.05 * rng.standard_normal((len(LOOPS), n))
+    sp = np.full((len(LOOPS), n), 50.0)
+    pv[1, CHANGE:] -= 0.15
+    pv[2, CHANGE:] = 50 + noise[2, CHANGE:]
+    op[3, CHANGE:] = 40 + rng.standard_normal(n - CHANGE)
+    return pv, op, sp
+
+
+def feed(det, pv, op, sp, loops=LOOPS):
+    """Feed the samples tick by tick; returns (tick, event) pairs."""
+    events = []
+    for i in range(pv.shape[1]):
+        batch = SampleBatch.for_tick(T0 + i * SECOND, loops)
+        batch.pv[:], batch.op[:], batch.sp[:] = pv[:, i], op[:, i], sp[:, i]
+        events.extend((i, event) for event in det.update(batch))
+    return events
+
+
+def tick(ns):
+    return (ns - T0) // SECOND
+
+
+def test_stationary_data_raises_nothing():
+    pv, op, sp = signals()
+    det = detector()
+    assert feed(det, pv[:1].repeat(4, axis=0), op[:1].repeat(4, axis=0), sp) == []
+    assert det.get_stats()["alarmed"] == 0
+
+
+def test_one_event_per_injected_change():
+    det = detector()
+    events = {event.loop_id: (i, event) for i, event in feed(det, *signals())}
+    assert det.get_stats()["events"] == 3
+    assert sorted(events) == ["mean", "op", "variance"]
+    expected = {"mean": ("error_shift", 200), "variance": ("error_variance_up", 30), "op": ("op_movement_up", 30)}
+    for loop_id, (i, event) in events.items():
+        reason, within = expected[loop_id]
+        assert event.reason == reason
+        assert event.score >= 1.0
+        assert CHANGE <= tick(event.end_ns) == i <= CHANGE + within
+        # From the last quiet sample, less the 30 s of context
+        assert tick(event.start_ns) == tick(event.end_ns) - 1 - 30
+
+
+def test_per_loop_interval_defers_until_still_alarmed():
+    # A variance burst, then the return to normal reads as a variance drop
+    rng = np.random.default_rng(0)
+    n = CHANGE + 2000
+    pv = 50 + 0.2 * rng.standard_normal((1, n))
+    op = 40 + 0.05 * rng.standard_normal((1, n))
+    sp = np.full((1, n), 50.0)
+    pv[0, CHANGE:CHANGE + 400] = 50 + rng.standard_normal(400)
+    det = detector(min_interval=1000)
+    first, second = feed(det, pv, op, sp, loops=["loop"])
+
+    assert first[1].reason == "error_variance_up"
+    assert second[1].reason == "error_variance_down"
+    # Raised inside the interval, released once it has passed
+    assert tick(second[1].end_ns) < tick(first[1].end_ns) + 1000 == second[0]
+    assert det.get_stats()["deferred"] == 1
+
+
+def test_global_budget_releases_strongest_first(monkeypatch):
+    clock = {"now": 0.0}
+    monkeypatch.setattr(change_detector_module.time, "monotonic", lambda: clock["now"])
+    pv, op, sp = signals()
+    det = detector(max_events_per_minute=1)
+    events = feed(det, pv[:, :CHANGE + 100], op[:, :CHANGE + 100], sp[:, :CHANGE + 100])
+    assert len(events) == 1
+    assert det.get_stats()["pending"] == 2 and det.get_stats()["deferred"] == 2
+
+    # One token per minute; an empty batch is enough to release
+    released = []
+    for _ in range(2):
+        assert det.update(SampleBatch.empty()) == []
+        clock["now"] += 60
+        released += det.update(SampleBatch.empty())
+    assert sorted([events[0][1].loop_id] + [event.loop_id for event in released]) == ["mean", "op", "variance"]
+    scores = [event.score for event in released]
+    assert scores == sorted(scores, reverse=True)
+    assert det.get_stats()["pending"] == 0
+
+
+def test_batched_samples_match_tick_by_tick():
+    pv, op, sp = signals()
+    ticked = detector()
+    expected = [event for _, event in feed(ticked, pv, op, sp)]
+
+    # Every loop's samples in 500-sample batches, loops and times shuffled
+    batched = detector()
+    n = pv.shape[1]
+    rng = np.random.default_rng(1)
+    events = []
+    for lo in range(0, n, 500):
+        cols = np.arange(lo, min(n, lo + 500))
+        rows = rng.permutation(len(LOOPS) * len(cols))
+        loop, col = rows // len(cols), cols[rows % len(cols)]
+        batch = SampleBatch(T0 + col * SECOND, np.array(LOOPS, dtype=object)[loop],
+                            np.full(len(rows), "AUT", dtype=object), pv[loop, col], op[loop, col], sp[loop, col])
+        events += batched.update(batch)
+
+    assert sorted(events) == sorted(expected)
+    # Loops are registered in order of first appearance
+    order = [batched.loop_ids.index(loop_id) for loop_id in ticked.loop_ids]
+    for name in ("mu", "var", "fast_var", "cusum_pos", "cusum_neg", "move_fast", "move_slow"):
+        assert getattr(batched, name)[order] == pytest.approx(getattr(ticked, name), rel=1e-12, abs=1e-15), name
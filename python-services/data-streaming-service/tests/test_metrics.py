@@ -0,0 +1,88 @@
+"""Tests for the self-metrics: histograms, text exposition and the HTTP endpoint."""
+
+import asyncio
+
+from data_streaming_service.metrics import Histogram, MetricsServer, MetricsWriter
+
+
+def test_histogram_buckets_are_cumulative():
+    histogram = Histogram((1, 2.5, 10))
+    for value in (0.5, 1, 2, 2.5, 3, 50):
+        histogram.observe(value)
+    # A value exactly on a bound falls into that bound's bucket (le is <=)
+    assert histogram.cumulative() == [("1", 2), ("2.5", 4), ("10", 5), ("+Inf", 6)]
+    assert histogram.cumulative()[-1][1] == histogram.count
+    assert histogram.sum == 59.0
+
+
+def test_help_and_type_once_per_metric():
+    writer = MetricsWriter(prefix="clpm_")
+    writer.counter("samples_total", "Samples written", 10, {"sink": "influx"})
+    writer.gauge("queue_depth", "Items queued", 2.5)
+    writer.counter("samples_total", "Samples written", 3, {"sink": "kafka"})
+    histogram = Histogram((0.1, 1))
+    histogram.observe(0.5)
+    writer.histogram("write_seconds", "Write latency", histogram, {"sink": "influx"})
+    writer.histogram("write_seconds", "Write latency", Histogram((0.1, 1)), {"sink": "kafka"})
+
+    lines = writer.render().splitlines()
+    for name in ("clpm_samples_total", "clpm_queue_depth", "clpm_write_seconds"):
+        assert sum(line.startswith(f"# HELP {name} ") for line in lines) == 1
+        assert sum(line.startswith(f"# TYPE {name} ") for line in lines) == 1
+    # Samples of one family stay together, after its HELP and TYPE
+    assert lines[:4] == [
+        "# HELP clpm_samples_total Samples written",
+        "# TYPE clpm_samples_total counter",
+        'clpm_samples_total{sink="influx"} 10',
+        'clpm_samples_total{sink="kafka"} 3',
+    ]
+    assert 'clpm_queue_depth 2.5' in lines
+    assert 'clpm_write_seconds_bucket{sink="influx",le="0.1"} 0' in lines
+    assert 'clpm_write_seconds_bucket{sink="influx",le="+Inf"} 1' in lines
+    assert 'clpm_write_seconds_count{sink="kafka"} 0' in lines
+
+
+def test_label_values_are_escaped():
+    writer = MetricsWriter()
+    writer.gauge("up", "Up", 1, {"loop": 'a\\b "c"\nd'})
+    assert writer.render().splitlines()[-1] == 'up{loop="a\\\\b \\"c\\"\\nd"} 1'
+
+
+def test_server_routes():
+    state = {"healthy": True}
+
+    async def request(port, method, path):
+        reader, writer = await asyncio.open_connection("127.0.0.1", port)
+        writer.write(f"{method} {path} HTTP/1.1\r\nHost: localhost\r\n\r\n".encode())
+        await writer.drain()
+        response = await reader.read()
+        writer.close()
+        head, _, body = response.decode().partition("\r\n\r\n")
+        return int(head.split()[1]), body
+
+    async def run():
+        server = MetricsServer(lambda: "clpm_up 1\n", lambda: state["healthy"], host="127.0.0.1", port=0)
+        await server.start()
+        try:
+            assert server.port != 0
+            results = [
+                await request(server.port, "GET", "/metrics?x=1"),
+                await request(server.port, "GET", "/health"),
+            ]
+            state["healthy"] = False
+            results += [
+                await request(server.port, "GET", "/health"),
+                await request(server.port, "GET", "/nope"),
+                await request(server.port, "POST", "/metrics"),
+            ]
+        finally:
+            await server.stop()
+        return results
+
+    assert asyncio.run(run()) == [
+        (200, "clpm_up 1\n"),
+        (200, "ok\n"),
+        (503, "unhealthy\n"),
+        (404, "not found\n"),
+        (405, "method not allowed\n"),
+    ]
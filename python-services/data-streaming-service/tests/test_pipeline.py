@@ -0,0 +1,161 @@
+"""Tests for the bounded pipeline: backpressure policies, retries and spooling."""
+
+import time
+import asyncio
+
+from data_streaming_service.pipeline import StageQueue, StreamingPipeline
+
+
+def run(coro):
+    return asyncio.run(coro)
+
+
+def test_drop_oldest_keeps_newest_items():
+    async def scenario():
+        queue = StageQueue("q", 2, "drop_oldest")
+        for item in range(5):
+            await queue.put(item)
+        return queue.dropped, [await queue.get() for _ in range(queue.depth())]
+
+    dropped, items = run(scenario())
+    assert dropped == 3
+    assert items == [3, 4]
+
+
+def test_spill_preserves_fifo_order(tmp_path):
+    async def scenario():
+        queue = StageQueue("q", 2, "spill", str(tmp_path))
+        for item in range(6):
+            await queue.put(item)
+        stats = queue.get_stats()
+        return stats, [await queue.get() for _ in range(queue.depth())]
+
+    stats, items = run(scenario())
+    assert stats["spilled"] == 4 and stats["spool_depth"] == 4
+    assert items == list(range(6))
+    assert not list((tmp_path / "q").iterdir())
+
+
+def test_consumer_wakes_for_spilled_items(tmp_path):
+    # The consumer empties memory while the first spill is still on disk
+    # being written; it must still be woken for every spooled item
+    async def scenario():
+        queue = StageQueue("q", 1, "spill", str(tmp_path))
+        received = []
+
+        async def consume():
+            while len(received) < 10:
+                received.append(await queue.get())
+
+        await queue.put(0)
+        consumer = asyncio.create_task(consume())
+        for item in range(1, 10):
+            await queue.put(item)
+        await asyncio.wait_for(consumer, 5)
+        return received, queue.get_stats()
+
+    received, stats = run(scenario())
+    assert received == list(range(10))
+    assert stats["spool_depth"] == 0
+
+
+def test_concurrent_spills_keep_their_order(tmp_path):
+    async def scenario():
+        queue = StageQueue("q", 1, "block", str(tmp_path))
+        await asyncio.gather(*(queue.spill(item) for item in range(20)))
+        return [await queue.get() for _ in range(queue.depth())]
+
+    assert run(scenario()) == list(range(20))
+
+
+def test_spooled_items_survive_restart(tmp_path):
+    async def fill():
+        queue = StageQueue("q", 1, "spill", str(tmp_path))
+        for item in ("a", "b", "c"):
+            await queue.put(item)
+
+    async def drain():
+        queue = StageQueue("q", 1, "spill", str(tmp_path))
+        return [await queue.get() for _ in range(queue.depth())]
+
+    run(fill())
+    assert run(drain()) == ["b", "c"]
+
+
+def test_failed_write_is_retried_without_loss(tmp_path):
+    attempts = []
+
+    def writer(payload):
+        attempts.append(payload)
+        return len(attempts) > 2
+
+    async def scenario():
+        pipeline = StreamingPipeline(lambda batch: batch, writer, spool_dir=str(tmp_path),
+                                     write_retries=3, retry_delay=0.001)
+        await pipeline.start()
+        await pipeline.put([1, 2, 3])
+        await pipeline.stop()
+        return pipeline.get_stats()
+
+    stats = run(scenario())
+    assert len(attempts) == 3
+    assert stats["samples"] == {**stats["samples"], "written": 3, "failed": 0, "lost": 0}
+    assert stats["stages"]["write"]["failed"] == 2
+
+
+def test_exhausted_retries_spool_the_batch(tmp_path):
+    healthy = {"up": False}
+    written = []
+
+    def writer(payload):
+        if healthy["up"]:
+            written.append(payload)
+        return healthy["up"]
+
+    async def outage():
+        pipeline = StreamingPipeline(lambda batch: batch, writer, spool_dir=str(tmp_path),
+                                     write_retries=1, retry_delay=0.001)
+        await pipeline.start()
+        await pipeline.put(["x"])
+        await asyncio.sleep(0.05)
+        await pipeline.stop(timeout=0.1)
+        return pipeline.get_stats()
+
+    async def recovery():
+        healthy["up"] = True
+        pipeline = StreamingPipeline(lambda batch: batch, writer, spool_dir=str(tmp_path))
+        await pipeline.start()
+        await pipeline.stop()
+        return pipeline.get_stats()
+
+    stats = run(outage())
+    assert stats["samples"]["failed"] == 1 and stats["samples"]["lost"] == 0
+    assert run(recovery())["samples"]["written"] == 1
+    assert written == [["x"]]
+
+
+def test_stop_spools_unfinished_batches(tmp_path):
+    def slow_writer(payload):
+        time.sleep(0.05)
+        return True
+
+    async def shutdown():
+        pipeline = StreamingPipeline(lambda batch: batch, slow_writer, queue_size=10, spool_dir=str(tmp_path))
+        await pipeline.start()
+        for i in range(6):
+            await pipeline.put([i])
+        await pipeline.stop(timeout=0.01)
+        return pipeline.samples_written
+
+    written_first = run(shutdown())
+    collected = []
+
+    async def restart():
+        pipeline = StreamingPipeline(lambda batch: batch, lambda p: collected.append(p) or True,
+                                     spool_dir=str(tmp_path))
+        await pipeline.start()
+        await pipeline.stop()
+        return pipeline.samples_written
+
+    assert written_first + run(restart()) >= 6
+    assert [p[0] for p in collected] == sorted(p[0] for p in collected)
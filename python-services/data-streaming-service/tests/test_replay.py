@@ -0,0 +1,93 @@
+"""Tests for historian replay: watermark merging, column handling and pacing."""
+
+import time
+import asyncio
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from data_streaming_service.batch import SampleBatch
+from data_streaming_service.replay import HistorianReplaySource, parse_mapping
+
+T0 = 1_700_000_000
+
+
+def export(path, tag, seconds, with_sp=True):
+    frame = pd.DataFrame({
+        "timestamp": pd.to_datetime(np.asarray(seconds) + T0, unit="s"),
+        "tag": tag,
+        "PV": np.arange(len(seconds), dtype=float),
+        "OP": 50.0,
+        "Mode": ["MAN" if i % 10 == 0 else None for i in range(len(seconds))],
+    })
+    if with_sp:
+        frame["SP"] = 1.0
+    frame.to_csv(path, index=False)
+    return str(path)
+
+
+def collect(source):
+    async def run():
+        return [batch async for batch in source.stream(min_interval=0.001)]
+    return SampleBatch.concat(asyncio.run(run()))
+
+
+def test_files_merge_in_time_order(tmp_path):
+    # Interleaved timestamps, uneven file lengths and a chunk size that
+    # leaves every chunk boundary somewhere different
+    a = export(tmp_path / "a.csv", "TAG_A", np.arange(0, 100, 2.0))
+    b = export(tmp_path / "b.csv", "TAG_B", np.arange(1, 75, 2.0), with_sp=False)
+    source = HistorianReplaySource([a, b], speed=0, tag_map={"TAG_A": "FIC-101"}, chunk_rows=7)
+    chunks = list(source.iter_chunks())
+    merged = SampleBatch.concat(chunks)
+
+    assert len(chunks) > 2
+    assert len(merged) == source.rows_read == 50 + 37
+    assert np.all(np.diff(merged.ts) >= 0)
+    # Nothing emitted in a chunk is earlier than anything already emitted
+    assert all(prev.ts[-1] <= chunk.ts[0] for prev, chunk in zip(chunks, chunks[1:]))
+
+    a_rows = merged.loop_id == "FIC-101"
+    assert a_rows.sum() == 50 and (merged.loop_id[~a_rows] == "TAG_B").all()
+    assert np.array_equal(merged.pv[a_rows], np.arange(50.0))
+    assert np.isnan(merged.sp[~a_rows]).all() and (merged.sp[a_rows] == 1.0).all()
+    assert set(merged.mode) == {"AUT", "MAN"}
+
+
+def test_parquet_with_epoch_seconds(tmp_path):
+    pytest.importorskip("pyarrow")
+    path = str(tmp_path / "loops.parquet")
+    pd.DataFrame({"time": T0 + np.arange(10.0), "name": "FIC-101", "PV": 1.0, "OP": 2.0, "SP": 3.0}) \
+        .to_parquet(path)
+    source = HistorianReplaySource([path], speed=0, columns={"time": "time", "tag": "name"}, chunk_rows=4)
+    merged = SampleBatch.concat(list(source.iter_chunks()))
+    assert merged.ts.tolist() == [(T0 + i) * 10 ** 9 for i in range(10)]
+    assert (merged.mode == "AUT").all()
+
+
+def test_unthrottled_stream_shifted_to_now(tmp_path):
+    path = export(tmp_path / "a.csv", "FIC-101", np.arange(0, 500, 1.0))
+    before = time.time_ns()
+    merged = collect(HistorianReplaySource([path], speed=0, shift_to_now=True, chunk_rows=64))
+    assert len(merged) == 500
+    assert before <= merged.ts[0] <= time.time_ns()
+    assert np.all(np.diff(merged.ts) == 10 ** 9)
+
+
+def test_accelerated_stream_is_paced(tmp_path):
+    # 2 s of data at 20x takes at least 0.1 s
+    path = export(tmp_path / "a.csv", "FIC-101", np.arange(0, 2, 0.1))
+    started = time.monotonic()
+    merged = collect(HistorianReplaySource([path], speed=20))
+    assert time.monotonic() - started >= 0.09
+    assert len(merged) == 20
+
+
+def test_parse_mapping_from_file(tmp_path):
+    path = tmp_path / "tags.txt"
+    path.write_text("# historian tag = loop id\nFIC101.PV=FIC-101\n\nTIC201.PV = TIC-201\n")
+    assert parse_mapping(str(path)) == {"FIC101.PV": "FIC-101", "TIC201.PV": "TIC-201"}
+    assert parse_mapping("A=B,") == {"A": "B"}
+    with pytest.raises(ValueError):
+        parse_mapping("A")
@@ -0,0 +1,36 @@
+"""Tests for the fault scenario simulator."""
+
+from datetime import datetime
+
+import numpy as np
+
+from data_streaming_service.scenarios import FaultScenarioSimulator
+
+
+def test_same_seed_gives_same_data():
+    a = FaultScenarioSimulator(n_loops=4, seed=11).simulate(200, 0)
+    b = FaultScenarioSimulator(n_loops=4, seed=11).simulate(200, 0)
+    assert np.array_equal(a.pv, b.pv) and np.array_equal(a.op, b.op)
+
+
+def test_loop_dt_sets_each_loops_step_size():
+    sim = FaultScenarioSimulator(n_loops=2, seed=1, dt=1.0, loop_dt={"SIM0001": 0.2})
+    assert sim.dt.tolist() == [1.0, 0.2]
+    assert [label["dt_s"] for label in sim.labels()] == [1.0, 0.2]
+    # The dead time in seconds is drawn independently of the step size
+    assert sim.delay_steps[1] > sim.delay_steps[0]
+
+    batch = sim.simulate(10, 0)
+    assert np.all(np.diff(batch.ts) >= 0)
+    fast = batch.ts[batch.loop_id == "SIM0001"]
+    assert np.all(np.diff(fast) == 200_000_000)
+
+
+def test_trending_data_records():
+    sim = FaultScenarioSimulator(n_loops=2, seed=0, loop_dt={"SIM0000": 0.5})
+    start = datetime(2025, 1, 1)
+    records = sim.generate_trending_data("SIM0000", start, duration_minutes=1, interval_seconds=1)
+    assert len(records) == 60 * 3
+    assert {r["_field"] for r in records} == {"PV", "OP", "SP"}
+    assert records[0]["_time"] == start
+    assert (records[-1]["_time"] - start).total_seconds() == 59
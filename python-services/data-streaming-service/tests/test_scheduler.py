@@ -0,0 +1,93 @@
+"""Tests for the tick scheduler: grid alignment, drift and overrun policies."""
+
+import asyncio
+
+import pytest
+
+from data_streaming_service import scheduler as scheduler_module
+from data_streaming_service.scheduler import TickScheduler, parse_loop_intervals
+
+SECOND = 1_000_000_000
+START = 1_700_000_000 * SECOND + SECOND // 4
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    """A fake epoch clock; every sleep overshoots it by ``late`` nanoseconds."""
+    state = {"now": START, "late": 0, "sleeps": 0}
+
+    async def sleep(seconds):
+        state["now"] += int(seconds * 1e9) + state["late"]
+        state["sleeps"] += 1
+
+    monkeypatch.setattr(scheduler_module.asyncio, "sleep", sleep)
+    return state
+
+
+def make(clock, policy="skip", max_catch_up=10, **loops):
+    scheduler = TickScheduler(policy, max_catch_up)
+    scheduler._now_ns = lambda: clock["now"]
+    for loop_id, interval in loops.items():
+        scheduler.add_loop(loop_id, interval)
+    return scheduler
+
+
+def ticks(scheduler, count):
+    async def collect():
+        return [await scheduler.next_tick() for _ in range(count)]
+    return asyncio.run(collect())
+
+
+def test_groups_share_grid_points(clock):
+    scheduler = make(clock, fast=1.0, slow=2.0, also_fast=1.0)
+    result = ticks(scheduler, 4)
+    assert [t.timestamp_ns for t in result] == [START - SECOND // 4 + i * SECOND for i in range(1, 5)]
+    # The 2 s group joins the 1 s group on even seconds
+    assert [sorted(t.loop_ids) for t in result] == [["also_fast", "fast"], ["also_fast", "fast", "slow"]] * 2
+
+
+def test_late_wake_ups_do_not_drift(clock):
+    clock["late"] = 30_000_000  # every sleep returns 30 ms late
+    scheduler = make(clock, loop=0.5)
+    result = ticks(scheduler, 200)
+    assert all(t.timestamp_ns % (SECOND // 2) == 0 for t in result)
+    assert [b.timestamp_ns - a.timestamp_ns for a, b in zip(result, result[1:])] == [SECOND // 2] * 199
+    assert max(t.lag for t in result) == pytest.approx(0.03)
+    assert scheduler.skipped == 0
+
+
+def test_skip_policy_resumes_on_the_next_grid_point(clock):
+    scheduler = make(clock, loop=1.0)
+    first = ticks(scheduler, 1)[0]
+    clock["now"] += int(3.5 * SECOND)  # the cycle overran
+    second, third = ticks(scheduler, 2)
+    # The overdue grid point still fires, the two after it are dropped
+    assert second.timestamp_ns == first.timestamp_ns + SECOND
+    assert second.lag == pytest.approx(2.5)
+    assert second.skipped == 2
+    assert third.timestamp_ns == first.timestamp_ns + 4 * SECOND
+    assert scheduler.get_stats()["overruns"] == 1
+
+
+def test_catch_up_policy_replays_missed_grid_points(clock):
+    scheduler = make(clock, "catch_up", max_catch_up=5, loop=1.0)
+    first = ticks(scheduler, 1)[0]
+    clock["now"] += int(3.5 * SECOND)
+    sleeps = clock["sleeps"]
+    result = ticks(scheduler, 3)
+    assert [t.timestamp_ns - first.timestamp_ns for t in result] == [SECOND, 2 * SECOND, 3 * SECOND]
+    assert [t.lag for t in result] == pytest.approx([2.5, 1.5, 0.5])
+    assert clock["sleeps"] == sleeps  # back-to-back
+    assert scheduler.skipped == 0
+
+    # A backlog beyond max_catch_up is skipped instead
+    clock["now"] += 20 * SECOND
+    result = ticks(scheduler, 2)
+    assert result[0].skipped > 0
+    assert result[1].timestamp_ns > clock["now"] - SECOND
+
+
+def test_parse_loop_intervals():
+    assert parse_loop_intervals("FIC-101=1000, TIC-201=250,") == {"FIC-101": 1.0, "TIC-201": 0.25}
+    with pytest.raises(ValueError):
+        parse_loop_intervals("FIC-101")
@@ -0,0 +1,51 @@
+"""Tests for the sink fan-out."""
+
+import numpy as np
+
+from data_streaming_service.batch import SampleBatch
+from data_streaming_service.sinks import MemorySink, Sink, TeeSink
+
+
+class FlakySink(MemorySink):
+    """Memory sink that fails a given number of writes first."""
+
+    name = "flaky"
+
+    def __init__(self, failures: int):
+        super().__init__()
+        self.remaining_failures = failures
+
+    def write(self, payload):
+        if self.remaining_failures:
+            self.remaining_failures -= 1
+            return False
+        return super().write(payload)
+
+
+class UnhealthySink(MemorySink):
+    def health_check(self) -> bool:
+        return False
+
+
+def make_batch(n: int = 3) -> SampleBatch:
+    values = np.arange(n, dtype=float)
+    return SampleBatch(np.full(n, 1_700_000_000 * 10**9), [f"L{i}" for i in range(n)],
+                       ["AUT"] * n, values, values, values)
+
+
+def test_tee_retry_only_repeats_failed_sinks():
+    healthy, flaky = MemorySink(), FlakySink(failures=1)
+    tee = TeeSink([healthy, flaky])
+    payload = tee.serialize(make_batch())
+
+    assert not tee.write(payload)
+    assert tee.write(payload)
+    assert healthy.samples == 3 and flaky.samples == 3
+    assert tee.failures == [0, 1]
+
+
+def test_tee_health_check_keys_by_position():
+    tee = TeeSink([MemorySink(), UnhealthySink()])
+    assert isinstance(tee, Sink)
+    assert not tee.health_check()
+    assert TeeSink([MemorySink(), MemorySink()]).health_check()
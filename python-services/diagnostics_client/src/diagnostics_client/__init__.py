@@ -0,0 +1,3 @@
+"""CLPM Diagnostics Client - Fleet-wide diagnostics sweeps"""
+
+__version__ = "0.1.0"
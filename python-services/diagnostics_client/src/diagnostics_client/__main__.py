@@ -0,0 +1,5 @@
+"""Allow ``python -m diagnostics_client``."""
+
+from .sweep import main
+
+main()
@@ -0,0 +1,252 @@
+"""HTTP client for the CLPM diagnostics service."""
+
+import os
+import logging
+from typing import Any, Dict, List, Optional, Sequence, Set, Tuple
+
+import numpy as np
+import requests
+from requests.adapters import HTTPAdapter
+
+from .influx import LoopSeries
+
+logger = logging.getLogger(__name__)
+
+MODE_AUTO = "auto"
+MODE_JSON = "json"
+MODE_BATCH = "batch"
+MODE_BINARY = "binary"
+PAYLOAD_MODES = (MODE_AUTO, MODE_JSON, MODE_BATCH, MODE_BINARY)
+
+RUN_PATH = "/diagnostics/run"
+BATCH_PATH = "/diagnostics/run/batch"
+BINARY_PATH = "/diagnostics/run/binary"
+RECENT_PATH = "/diagnostics/run/recent"
+
+
+def finite_samples(series: LoopSeries) -> LoopSeries:
+    """
+    Drop samples whose timestamp, PV or OP is NaN or infinite.
+
+    The three columns are filtered together so they stay aligned, rather than
+    sending made-up values (NaN/inf are not valid JSON, and zeros would read
+    as real measurements). Set point gaps hold the last recorded set point.
+
+    Args:
+        series: Loop samples
+
+    Returns:
+        The finite samples (``series`` itself when all are finite)
+    """
+    keep = np.isfinite(series.ts) & np.isfinite(series.pv) & np.isfinite(series.op)
+    sp = series.sp
+    recorded = np.isfinite(sp)
+    if recorded.any() and not recorded.all():
+        # Index of the last recorded set point at or before each sample
+        last = np.maximum.accumulate(np.where(recorded, np.arange(len(sp)), -1))
+        sp = sp[np.where(last >= 0, last, np.argmax(recorded))]
+    if keep.all():
+        return series if sp is series.sp else series._replace(sp=sp)
+    dropped = int((~keep).sum())
+    logger.debug(f"Dropping {dropped} non-finite samples of {len(series)}")
+    return LoopSeries(series.ts[keep], series.pv[keep], series.op[keep], sp[keep])
+
+
+def series_payload(loop_id: str, series: LoopSeries) -> Dict[str, Any]:
+    """
+    Build the JSON body of ``/diagnostics/run``.
+
+    Args:
+        loop_id: Loop identifier
+        series: Loop samples (non-finite samples are dropped)
+
+    Returns:
+        Request body
+    """
+    series = finite_samples(series)
+    sample_rate_hz = None
+    if len(series) > 1:
+        total_time = float(series.ts[-1] - series.ts[0])
+        sample_rate_hz = len(series) / total_time if total_time > 0 else None
+
+    has_sp = np.isfinite(series.sp).any()
+    return {
+        "loop_id": loop_id,
+        "series": {
+            "ts": series.ts.tolist(),
+            "pv": series.pv.tolist(),
+            "op": series.op.tolist(),
+            "sp": series.sp.tolist() if has_sp else None,
+        },
+        "sample_rate_hz": sample_rate_hz,
+    }
+
+
+class DiagnosticsClient:
+    """
+    Pooled client for the diagnostics service.
+
+    One ``requests.Session`` with a sized connection pool is shared by all
+    calls, so sweeps reuse keep-alive connections instead of opening one per
+    loop. Depending on what the server offers, loops are sent one JSON
+    request each, many per ``/diagnostics/run/batch`` request, or as raw
+    float64 columns to ``/diagnostics/run/binary``.
+    """
+
+    def __init__(self, base_url: Optional[str] = None, mode: str = MODE_AUTO,
+                 pool_size: int = 16, timeout: float = 60.0):
+        """
+        Initialize the client.
+
+        Args:
+            base_url: Diagnostics service URL (default: ``DIAG_SERVICE_URL``)
+            mode: Payload mode: ``auto`` (best the server supports), ``json``,
+                ``batch`` or ``binary``
+            pool_size: Maximum pooled connections
+            timeout: Request timeout in seconds
+        """
+        if mode not in PAYLOAD_MODES:
+            raise ValueError(f"Unknown payload mode: {mode!r}")
+
+        self.base_url = (base_url or os.getenv("DIAG_SERVICE_URL", "http://localhost:8050")).rstrip("/")
+        self.timeout = timeout
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size)
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+
+        self._capabilities: Optional[Set[str]] = None
+        self._requested_mode = mode
+
+    def capabilities(self) -> Set[str]:
+        """
+        Get the payload modes the server supports, read once from its OpenAPI schema.
+
+        Returns:
+            Subset of ``{"json", "batch", "binary"}``
+        """
+        if self._capabilities is None:
+            paths: Dict[str, Any] = {}
+            try:
+                response = self.session.get(f"{self.base_url}/openapi.json", timeout=self.timeout)
+                response.raise_for_status()
+                paths = response.json().get("paths", {})
+            except Exception as e:
+                logger.warning(f"Could not read diagnostics OpenAPI schema, using JSON mode: {e}")
+
+            self._capabilities = {MODE_JSON}
+            if BATCH_PATH in paths:
+                self._capabilities.add(MODE_BATCH)
+            if BINARY_PATH in paths:
+                self._capabilities.add(MODE_BINARY)
+        return self._capabilities
+
+    @property
+    def mode(self) -> str:
+        """Payload mode in use after resolving ``auto``."""
+        if self._requested_mode != MODE_AUTO:
+            return self._requested_mode
+        capabilities = self.capabilities()
+        for mode in (MODE_BATCH, MODE_BINARY):
+            if mode in capabilities:
+                return mode
+        return MODE_JSON
+
+    def run(self, loop_id: str, series: LoopSeries) -> Dict[str, Any]:
+        """
+        Diagnose one loop with a JSON request.
+
+        Args:
+            loop_id: Loop identifier
+            series: Loop samples
+
+        Returns:
+            Diagnostics result
+        """
+        response = self.session.post(f"{self.base_url}{RUN_PATH}",
+                                     json=series_payload(loop_id, series), timeout=self.timeout)
+        response.raise_for_status()
+        return response.json()
+
+    def run_binary(self, loop_id: str, series: LoopSeries) -> Dict[str, Any]:
+        """
+        Diagnose one loop, sending the samples as little-endian float64 columns.
+
+        Args:
+            loop_id: Loop identifier
+            series: Loop samples (non-finite samples are dropped)
+
+        Returns:
+            Diagnostics result
+        """
+        series = finite_samples(series)
+        body = np.concatenate([series.ts, series.pv, series.op]).astype("<f8").tobytes()
+        response = self.session.post(
+            f"{self.base_url}{BINARY_PATH}",
+            params={"loop_id": loop_id, "fields": "ts,pv,op"},
+            data=body,
+            headers={"Content-Type": "application/octet-stream"},
+            timeout=self.timeout,
+        )
+        response.raise_for_status()
+        return response.json()
+
+    def run_recent(self, loop_id: str, window_s: float) -> Optional[Dict[str, Any]]:
+        """
+        Diagnose a loop's latest samples from the service's shared memory.
+
+        Only a diagnostics service on the same host as the data streaming
+        service (with ``SHM_RING_HOURS`` set) has them.
+
+        Args:
+            loop_id: Loop identifier
+            window_s: Seconds of samples, ending at the newest one
+
+        Returns:
+            Diagnostics result, or None when the service does not hold the
+            loop's recent samples (read them from InfluxDB instead)
+        """
+        response = self.session.post(f"{self.base_url}{RECENT_PATH}",
+                                     json={"loop_id": loop_id, "window_s": window_s}, timeout=self.timeout)
+        if response.status_code == 404:
+            return None
+        response.raise_for_status()
+        return response.json()
+
+    def run_batch(self, items: Sequence[Tuple[str, LoopSeries]]) -> List[Dict[str, Any]]:
+        """
+        Diagnose several loops with one request.
+
+        Args:
+            items: ``(loop_id, series)`` pairs
+
+        Returns:
+            Diagnostics results in the order of ``items``
+        """
+        response = self.session.post(
+            f"{self.base_url}{BATCH_PATH}",
+            json={"items": [series_payload(loop_id, series) for loop_id, series in items]},
+            timeout=self.timeout,
+        )
+        response.raise_for_status()
+        return response.json()["results"]
+
+    def run_many(self, items: Sequence[Tuple[str, LoopSeries]]) -> List[Dict[str, Any]]:
+        """
+        Diagnose several loops using the configured payload mode.
+
+        Args:
+            items: ``(loop_id, series)`` pairs
+
+        Returns:
+            Diagnostics results in the order of ``items``
+        """
+        mode = self.mode
+        if mode == MODE_BATCH:
+            return self.run_batch(items)
+        call = self.run_binary if mode == MODE_BINARY else self.run
+        return [call(loop_id, series) for loop_id, series in items]
+
+    def close(self):
+        """Close the pooled connections."""
+        self.session.close()
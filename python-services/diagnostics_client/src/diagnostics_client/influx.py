@@ -0,0 +1,212 @@
+"""Columnar InfluxDB reads for diagnostics sweeps."""
+
+import io
+import os
+import logging
+from datetime import datetime
+from typing import Dict, List, NamedTuple, Optional, Sequence
+
+import numpy as np
+import pandas as pd
+import requests
+from requests.adapters import HTTPAdapter
+
+logger = logging.getLogger(__name__)
+
+
+class LoopSeries(NamedTuple):
+    """Time-ordered samples of one loop as NumPy arrays."""
+
+    ts: np.ndarray  # Epoch seconds
+    pv: np.ndarray
+    op: np.ndarray
+    sp: np.ndarray  # NaN where no set point was recorded
+
+    def __len__(self) -> int:
+        return len(self.ts)
+
+
+def _flux_string(value: str) -> str:
+    """Quote a value as a Flux string literal."""
+    return '"' + value.replace("\\", "\\\\").replace('"', '\\"') + '"'
+
+
+def _flux_time(value: datetime) -> str:
+    """Format a naive UTC or aware datetime as a Flux time literal."""
+    if value.tzinfo is not None:
+        value = (value - value.utcoffset()).replace(tzinfo=None)
+    return value.isoformat() + "Z"
+
+
+class InfluxSeriesReader:
+    """
+    Reads loop series from InfluxDB's HTTP query API as columns.
+
+    Queries go straight to ``/api/v2/query`` on a pooled ``requests.Session``
+    and ask for CSV without annotations. The whole response is parsed once by
+    pandas into arrays and split per loop, instead of building a
+    ``FluxRecord`` and a dictionary for every row. Several loops are read
+    with one query.
+    """
+
+    def __init__(self, url: Optional[str] = None, token: Optional[str] = None,
+                 org: Optional[str] = None, bucket: Optional[str] = None,
+                 measurement: Optional[str] = None, pool_size: int = 16,
+                 timeout: float = 60.0):
+        """
+        Initialize the reader.
+
+        Args:
+            url: InfluxDB URL (default: ``INFLUXDB_URL``)
+            token: API token (default: ``INFLUXDB_TOKEN``)
+            org: Organization (default: ``INFLUXDB_ORG``)
+            bucket: Bucket (default: ``INFLUXDB_BUCKET``)
+            measurement: Measurement (default: ``INFLUXDB_MEASUREMENT``)
+            pool_size: Maximum pooled connections, i.e. concurrent queries
+            timeout: Request timeout in seconds
+        """
+        self.url = (url or os.getenv("INFLUXDB_URL", "http://localhost:8086")).rstrip("/")
+        self.token = token or os.getenv("INFLUXDB_TOKEN")
+        self.org = org or os.getenv("INFLUXDB_ORG", "clpm")
+        self.bucket = bucket or os.getenv("INFLUXDB_BUCKET", "clpm_data")
+        self.measurement = measurement or os.getenv("INFLUXDB_MEASUREMENT", "control_loops")
+        self.timeout = timeout
+
+        if not self.token:
+            raise ValueError("INFLUXDB_TOKEN environment variable is required")
+
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size)
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+        self.session.headers.update({
+            "Authorization": f"Token {self.token}",
+            "Content-Type": "application/json",
+            "Accept": "application/csv",
+            "Accept-Encoding": "gzip",
+        })
+
+    def query_csv(self, flux: str) -> bytes:
+        """
+        Run a Flux query and return the raw CSV response.
+
+        Args:
+            flux: Flux query
+
+        Returns:
+            CSV body without annotation rows
+        """
+        response = self.session.post(
+            f"{self.url}/api/v2/query",
+            params={"org": self.org},
+            json={"query": flux, "type": "flux", "dialect": {"header": True, "annotations": []}},
+            timeout=self.timeout,
+        )
+        response.raise_for_status()
+        return response.content
+
+    def build_query(self, loop_ids: Sequence[str], start: datetime, stop: datetime) -> str:
+        """Build the Flux query returning pivoted PV/OP/SP rows for the given loops."""
+        loop_filter = " or ".join(f"r.loop_id == {_flux_string(loop_id)}" for loop_id in loop_ids)
+        return f'''
+from(bucket: {_flux_string(self.bucket)})
+  |> range(start: {_flux_time(start)}, stop: {_flux_time(stop)})
+  |> filter(fn: (r) => r._measurement == {_flux_string(self.measurement)})
+  |> filter(fn: (r) => {loop_filter})
+  |> filter(fn: (r) => r._field == "pv" or r._field == "op" or r._field == "sp")
+  |> drop(columns: ["Mode"])
+  |> pivot(rowKey: ["_time"], columnKey: ["_field"], valueColumn: "_value")
+  |> filter(fn: (r) => exists r.pv and exists r.op)
+  |> keep(columns: ["_time", "loop_id", "pv", "op", "sp"])
+'''
+
+    def fetch(self, loop_ids: Sequence[str], start: datetime, stop: datetime) -> Dict[str, LoopSeries]:
+        """
+        Read several loops with a single query.
+
+        Args:
+            loop_ids: Loops to read
+            start: Range start (naive UTC or aware datetime)
+            stop: Range stop
+
+        Returns:
+            Series per loop; loops without data are omitted
+        """
+        if not loop_ids:
+            return {}
+        return parse_series_csv(self.query_csv(self.build_query(loop_ids, start, stop)))
+
+    def list_loops(self, start: datetime, stop: datetime) -> List[str]:
+        """
+        List loops with data in the time range.
+
+        Args:
+            start: Range start
+            stop: Range stop
+
+        Returns:
+            Sorted loop IDs
+        """
+        flux = f'''
+import "influxdata/influxdb/schema"
+schema.tagValues(
+  bucket: {_flux_string(self.bucket)},
+  tag: "loop_id",
+  predicate: (r) => r._measurement == {_flux_string(self.measurement)},
+  start: {_flux_time(start)},
+  stop: {_flux_time(stop)}
+)
+'''
+        frame = _read_csv(self.query_csv(flux), usecols=["_value"])
+        return sorted(frame["_value"].dropna().astype(str).unique()) if len(frame) else []
+
+    def close(self):
+        """Close the pooled connections."""
+        self.session.close()
+
+
+def _read_csv(body: bytes, usecols: List[str]) -> pd.DataFrame:
+    """Parse an unannotated Flux CSV response, dropping the header rows repeated between tables."""
+    if not body.strip():
+        return pd.DataFrame(columns=usecols)
+    frame = pd.read_csv(io.BytesIO(body), usecols=lambda name: name in usecols, dtype=str,
+                        skip_blank_lines=True)
+    if len(frame) and usecols[0] in frame:
+        frame = frame[frame[usecols[0]] != usecols[0]]
+    return frame
+
+
+def parse_series_csv(body: bytes) -> Dict[str, LoopSeries]:
+    """
+    Parse a pivoted query response into per-loop series.
+
+    Args:
+        body: CSV with ``_time``, ``loop_id``, ``pv``, ``op`` and optionally
+            ``sp`` columns
+
+    Returns:
+        Time-ordered series per loop
+    """
+    frame = _read_csv(body, ["_time", "loop_id", "pv", "op", "sp"])
+    if not len(frame):
+        return {}
+
+    ts = pd.to_datetime(frame["_time"], utc=True, format="ISO8601").to_numpy(dtype="datetime64[ns]")
+    ts = ts.view(np.int64) / 1e9
+    loop_ids = frame["loop_id"].to_numpy(dtype=object)
+    pv = pd.to_numeric(frame["pv"], errors="coerce").to_numpy(dtype=float)
+    op = pd.to_numeric(frame["op"], errors="coerce").to_numpy(dtype=float)
+    sp = (pd.to_numeric(frame["sp"], errors="coerce").to_numpy(dtype=float)
+          if "sp" in frame else np.full(len(frame), np.nan))
+
+    # Group rows by loop, ordered by time within each loop
+    order = np.lexsort((ts, loop_ids.astype(str)))
+    loop_ids, ts, pv, op, sp = loop_ids[order], ts[order], pv[order], op[order], sp[order]
+    names, starts = np.unique(loop_ids.astype(str), return_index=True)
+    bounds = list(starts) + [len(loop_ids)]
+
+    return {
+        name: LoopSeries(ts[bounds[i]:bounds[i + 1]], pv[bounds[i]:bounds[i + 1]],
+                         op[bounds[i]:bounds[i + 1]], sp[bounds[i]:bounds[i + 1]])
+        for i, name in enumerate(names)
+    }
@@ -0,0 +1,190 @@
+"""Fleet-wide diagnostics sweeps with bounded concurrency."""
+
+import os
+import sys
+import json
+import time
+import asyncio
+import logging
+import argparse
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+from dotenv import load_dotenv
+
+from .client import PAYLOAD_MODES, DiagnosticsClient
+from .influx import InfluxSeriesReader
+
+logger = logging.getLogger(__name__)
+
+
+class DiagnosticsSweep:
+    """
+    Runs diagnostics over many loops.
+
+    Loops are processed in groups of ``group_size``: each group is read from
+    InfluxDB with one query and sent to the diagnostics service (one batch
+    request when the server supports it). At most ``concurrency`` groups are
+    in flight at once. The HTTP calls block, so they run in a thread pool
+    sized to match while an ``asyncio.Semaphore`` bounds the fan-out.
+
+    With ``recent`` set, each loop is first diagnosed from the samples the
+    service holds in shared memory; only loops it does not hold are read
+    from InfluxDB.
+    """
+
+    def __init__(self, reader: InfluxSeriesReader, client: DiagnosticsClient,
+                 concurrency: int = 8, group_size: int = 25, min_samples: int = 16,
+                 recent: bool = False):
+        """
+        Initialize the sweep.
+
+        Args:
+            reader: InfluxDB series reader
+            client: Diagnostics service client
+            concurrency: Maximum groups processed at the same time
+            group_size: Loops per InfluxDB query and diagnostics batch
+            min_samples: Loops with fewer samples are reported as skipped
+            recent: Try the service's shared-memory samples first; only
+                meaningful for windows ending now
+        """
+        self.reader = reader
+        self.client = client
+        self.concurrency = max(1, concurrency)
+        self.group_size = max(1, group_size)
+        self.min_samples = min_samples
+        self.recent = recent
+
+    def _process_group(self, loop_ids: Sequence[str], start: datetime, stop: datetime) -> List[Dict[str, Any]]:
+        """Read and diagnose one group of loops (runs in a worker thread)."""
+        results = []
+        if self.recent:
+            results, loop_ids = self._process_recent(loop_ids, (stop - start).total_seconds())
+            if not loop_ids:
+                return results
+
+        try:
+            series = self.reader.fetch(loop_ids, start, stop)
+        except Exception as e:
+            logger.error(f"Failed to read {len(loop_ids)} loops from InfluxDB: {e}")
+            return results + [{"loop_id": loop_id, "error": f"query failed: {e}"} for loop_id in loop_ids]
+
+        items = []
+        for loop_id in loop_ids:
+            loop_series = series.get(loop_id)
+            if loop_series is None or len(loop_series) < self.min_samples:
+                samples = 0 if loop_series is None else len(loop_series)
+                results.append({"loop_id": loop_id, "error": f"insufficient data ({samples} samples)"})
+            else:
+                items.append((loop_id, loop_series))
+
+        if items:
+            try:
+                results.extend(self.client.run_many(items))
+            except Exception as e:
+                logger.error(f"Diagnostics failed for {len(items)} loops: {e}")
+                results.extend({"loop_id": loop_id, "error": f"diagnostics failed: {e}"} for loop_id, _ in items)
+        return results
+
+    def _process_recent(self, loop_ids: Sequence[str], window_s: float) -> Tuple[List[Dict[str, Any]], List[str]]:
+        """Diagnose loops from shared memory; returns the results and the loops left for InfluxDB."""
+        results, missing = [], []
+        for loop_id in loop_ids:
+            try:
+                result = self.client.run_recent(loop_id, window_s)
+            except Exception as e:
+                logger.warning(f"Recent diagnostics failed for {loop_id}, reading InfluxDB: {e}")
+                result = None
+            if result is None:
+                missing.append(loop_id)
+            else:
+                results.append(result)
+        return results, missing
+
+    async def run(self, loop_ids: Sequence[str], start: datetime, stop: datetime) -> List[Dict[str, Any]]:
+        """
+        Diagnose every loop.
+
+        Args:
+            loop_ids: Loops to diagnose
+            start: Window start (naive UTC or aware datetime)
+            stop: Window stop
+
+        Returns:
+            One result per loop, in the order of ``loop_ids``; failed loops
+            carry an ``error`` key instead of diagnostics
+        """
+        loop = asyncio.get_running_loop()
+        semaphore = asyncio.Semaphore(self.concurrency)
+        groups = [loop_ids[i:i + self.group_size] for i in range(0, len(loop_ids), self.group_size)]
+
+        with ThreadPoolExecutor(max_workers=self.concurrency, thread_name_prefix="sweep") as executor:
+            async def process(group):
+                async with semaphore:
+                    return await loop.run_in_executor(executor, self._process_group, group, start, stop)
+
+            group_results = await asyncio.gather(*(process(group) for group in groups))
+
+        by_loop = {result["loop_id"]: result for results in group_results for result in results}
+        return [by_loop[loop_id] for loop_id in loop_ids]
+
+
+def main():
+    """Command line entry point for a diagnostics sweep."""
+    parser = argparse.ArgumentParser(description="Run diagnostics over many control loops")
+    parser.add_argument("--loops", default="", help="Comma separated loop IDs (default: all loops with data)")
+    parser.add_argument("--loops-file", help="File with one loop ID per line")
+    parser.add_argument("--minutes", type=float, default=15.0, help="Window length ending now")
+    parser.add_argument("--concurrency", type=int, default=8, help="Groups processed concurrently")
+    parser.add_argument("--group-size", type=int, default=25, help="Loops per query and batch")
+    parser.add_argument("--mode", choices=PAYLOAD_MODES, default="auto", help="Diagnostics payload mode")
+    parser.add_argument("--recent", action="store_true",
+                        help="Use the service's shared-memory samples when it has them")
+    parser.add_argument("--out", help="Write results as JSON to this file (default: stdout)")
+    args = parser.parse_args()
+
+    load_dotenv()
+    logging.basicConfig(level=os.getenv("LOG_LEVEL", "INFO").upper(),
+                        format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+
+    stop = datetime.utcnow()
+    start = stop - timedelta(minutes=args.minutes)
+    pool_size = max(args.concurrency, 1)
+    reader = InfluxSeriesReader(pool_size=pool_size)
+    client = DiagnosticsClient(mode=args.mode, pool_size=pool_size)
+
+    try:
+        loop_ids: List[str] = [loop_id.strip() for loop_id in args.loops.split(",") if loop_id.strip()]
+        if args.loops_file:
+            with open(args.loops_file, encoding="utf-8") as f:
+                loop_ids.extend(line.strip() for line in f if line.strip())
+        if not loop_ids:
+            loop_ids = reader.list_loops(start, stop)
+        if not loop_ids:
+            logger.error("No loops to diagnose")
+            sys.exit(1)
+
+        logger.info(f"Diagnosing {len(loop_ids)} loops over the last {args.minutes:g} minutes "
+                    f"(mode {client.mode}, concurrency {args.concurrency})")
+        sweep = DiagnosticsSweep(reader, client, args.concurrency, args.group_size, recent=args.recent)
+        started = time.perf_counter()
+        results = asyncio.run(sweep.run(loop_ids, start, stop))
+        elapsed = time.perf_counter() - started
+
+        failed = sum(1 for result in results if "error" in result)
+        logger.info(f"Sweep finished in {elapsed:.2f}s: {len(results) - failed} diagnosed, {failed} failed")
+
+        output = json.dumps(results, indent=2)
+        if args.out:
+            with open(args.out, "w", encoding="utf-8") as f:
+                f.write(output)
+        else:
+            print(output)
+    finally:
+        reader.close()
+        client.close()
+
+
+if __name__ == "__main__":
+    main()
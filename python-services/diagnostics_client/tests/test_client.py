@@ -0,0 +1,40 @@
+"""Tests for building diagnostics request payloads."""
+
+import json
+
+import numpy as np
+
+from diagnostics_client.client import finite_samples, series_payload
+from diagnostics_client.influx import LoopSeries
+
+
+def make_series(pv, op, sp=None) -> LoopSeries:
+    n = len(pv)
+    sp = np.full(n, np.nan) if sp is None else np.asarray(sp, dtype=float)
+    return LoopSeries(np.arange(n, dtype=float), np.asarray(pv, dtype=float), np.asarray(op, dtype=float), sp)
+
+
+def test_non_finite_samples_are_dropped_together():
+    series = make_series([1.0, np.nan, 3.0, 4.0, np.inf], [10.0, 20.0, -np.inf, 40.0, 50.0])
+    kept = finite_samples(series)
+    assert kept.ts.tolist() == [0.0, 3.0]
+    assert kept.pv.tolist() == [1.0, 4.0]
+    assert kept.op.tolist() == [10.0, 40.0]
+
+
+def test_finite_series_is_returned_unchanged():
+    series = make_series([1.0, 2.0], [3.0, 4.0])
+    assert finite_samples(series) is series
+
+
+def test_set_point_gaps_hold_the_last_value():
+    series = make_series([1, 2, 3, 4], [1, 2, 3, 4], sp=[np.nan, 5.0, np.nan, 6.0])
+    assert finite_samples(series).sp.tolist() == [5.0, 5.0, 5.0, 6.0]
+
+
+def test_payload_is_valid_json_without_made_up_values():
+    series = make_series([1.0, np.nan, 3.0], [1.0, 2.0, 3.0], sp=[2.0, 2.0, np.nan])
+    payload = series_payload("L1", series)
+    body = json.loads(json.dumps(payload, allow_nan=False))
+    assert body["series"] == {"ts": [0.0, 2.0], "pv": [1.0, 3.0], "op": [1.0, 3.0], "sp": [2.0, 2.0]}
+    assert series_payload("L2", make_series([1.0, 2.0], [1.0, 2.0]))["series"]["sp"] is None
@@ -0,0 +1,172 @@
+#!/usr/bin/env python3
+"""Benchmark /kpi/compute against the kpi-worker's JavaScript calculateKPIs.
+
+Generates a synthetic loop window (24 h at 1 Hz by default), runs the JS
+implementation through backend/kpi-worker/bench-kpi.js under Node.js and the
+NumPy implementation in-process, then compares timings and every KPI value. The
+incremental path (cached bucket aggregates merged with the newest bucket) is
+timed too and must agree with the full recompute exactly.
+"""
+
+import os
+import sys
+import json
+import time
+import argparse
+import tempfile
+import subprocess
+
+import numpy as np
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+JS_RUNNER = os.path.join(HERE, "..", "..", "backend", "kpi-worker", "bench-kpi.js")
+
+# Add the src directory to the Python path
+sys.path.insert(0, os.path.join(HERE, "src"))
+
+from diagnostics_service.app import KpiRequest, _kpis
+from diagnostics_service.kpi import KPI_FIELDS, compute_kpis
+from diagnostics_service.kpi_aggregates import bucket_aggregates, merge_aggregates
+
+
+def make_series(hours: float, rate_hz: float, seed: int) -> dict:
+    rng = np.random.default_rng(seed)
+    n = int(hours * 3600 * rate_hz)
+    t = np.arange(n) / rate_hz
+    ts = 1_736_500_000 + t
+
+    sp = 405.0 + np.repeat(rng.normal(0, 2, n // 3600 + 1), 3600)[:n]
+    pv = sp + 0.8 * np.sin(2 * np.pi * t / 240) + rng.normal(0, 0.3, n)
+    op = np.clip(55 + 20 * np.sin(2 * np.pi * t / 240 + 1) + rng.normal(0, 1, n), 0, 100)
+    op = np.round(op, 1)  # quantized output so stuck periods and deadband show up
+    mode = rng.choice(["AUT", "MAN", "CAS"], size=n, p=[0.85, 0.1, 0.05])
+    mode = np.where(np.repeat(rng.random(n // 600 + 1) < 0.9, 600)[:n], "AUT", mode)
+    valve = np.where(rng.random(n) < 0.02, np.nan, op + rng.normal(0, 0.2, n))
+    quality = np.where(rng.random(n) < 0.01, 0, 192)
+
+    # A few missing values, as pivot gaps produce
+    pv[rng.random(n) < 0.001] = np.nan
+
+    def column(values):
+        return [None if v != v else v for v in values.tolist()]
+
+    return {
+        "ts": ts.tolist(),
+        "pv": column(pv),
+        "op": column(op),
+        "sp": column(sp),
+        "mode": mode.tolist(),
+        "valve_position": column(valve),
+        "quality_code": quality.tolist(),
+    }
+
+
+def run_js(series: dict, iterations: int, node: str) -> dict:
+    with tempfile.NamedTemporaryFile("w", suffix=".json", delete=False) as f:
+        json.dump(series, f)
+        path = f.name
+    try:
+        out = subprocess.run([node, JS_RUNNER, path, str(iterations)],
+                             capture_output=True, text=True, check=True)
+        return json.loads(out.stdout)
+    finally:
+        os.remove(path)
+
+
+def time_python(series: dict, iterations: int):
+    compute_ms, endpoint_ms = [], []
+    body = json.dumps({"loop_id": "BENCH", "series": series})
+    kpis = None
+    for _ in range(iterations):
+        t0 = time.perf_counter()
+        kpis = compute_kpis(series["ts"], series["pv"], series["op"], series["sp"],
+                            series["mode"], series["valve_position"], series["quality_code"])
+        compute_ms.append((time.perf_counter() - t0) * 1000)
+
+        # Request validation plus computation, as the endpoint does
+        t0 = time.perf_counter()
+        _kpis(KpiRequest.model_validate_json(body))
+        endpoint_ms.append((time.perf_counter() - t0) * 1000)
+    return kpis, compute_ms, endpoint_ms
+
+
+def time_incremental(series: dict, iterations: int, bucket_s: int):
+    columns = [series[name] for name in ("ts", "pv", "op", "sp", "mode", "valve_position", "quality_code")]
+    buckets = bucket_aggregates(bucket_s, *columns)
+    newest = max(buckets)
+    first = np.searchsorted(series["ts"], newest)
+
+    merge_ms, kpis = [], None
+    for _ in range(iterations):
+        # Only the newest bucket is recomputed; the rest come from the cache
+        t0 = time.perf_counter()
+        fresh = bucket_aggregates(bucket_s, *(None if c is None else c[first:] for c in columns))
+        parts = {**buckets, **fresh}
+        kpis = merge_aggregates(parts[b] for b in sorted(parts)).kpis()
+        merge_ms.append((time.perf_counter() - t0) * 1000)
+    return kpis, merge_ms, len(buckets)
+
+
+def compare(js: dict, py: dict, tolerance: float):
+    mismatches = []
+    for name in KPI_FIELDS:
+        a, b = js.get(name), py.get(name)
+        if a is None or b is None:
+            if a is not b:
+                mismatches.append((name, a, b))
+        elif abs(a - b) > tolerance * max(1.0, abs(a)):
+            mismatches.append((name, a, b))
+    return mismatches
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark NumPy KPIs against the JS kpi-worker")
+    parser.add_argument("--hours", type=float, default=24.0, help="Window length")
+    parser.add_argument("--rate-hz", type=float, default=1.0, help="Sample rate")
+    parser.add_argument("--iterations", type=int, default=5, help="Timed runs per implementation")
+    parser.add_argument("--seed", type=int, default=0, help="Random seed")
+    parser.add_argument("--node", default="node", help="Node.js executable")
+    parser.add_argument("--bucket-s", type=int, default=900, help="Aggregate bucket length for the incremental path")
+    parser.add_argument("--tolerance", type=float, default=2e-6, help="Allowed relative difference")
+    args = parser.parse_args()
+
+    series = make_series(args.hours, args.rate_hz, args.seed)
+    print(f"Window: {args.hours:g} h at {args.rate_hz:g} Hz = {len(series['ts'])} samples\n")
+
+    js = run_js(series, args.iterations, args.node)
+    py_kpis, compute_ms, endpoint_ms = time_python(series, args.iterations)
+    merged_kpis, merge_ms, n_buckets = time_incremental(series, args.iterations, args.bucket_s)
+
+    print(f"{'implementation':<32} {'median ms':>10} {'min ms':>10}")
+    rows = [
+        ("JS calculateKPIs", js["timings_ms"]),
+        ("NumPy compute_kpis", compute_ms),
+        ("NumPy /kpi/compute (validate+run)", endpoint_ms),
+        (f"Incremental ({n_buckets} buckets)", merge_ms),
+    ]
+    for name, timings in rows:
+        print(f"{name:<32} {np.median(timings):>10.2f} {np.min(timings):>10.2f}")
+    print(f"{'(JS row construction)':<32} {js['build_rows_ms']:>10.2f}")
+    print(f"\nSpeed-up (compute): {np.median(js['timings_ms']) / np.median(compute_ms):.1f}x")
+
+    if js.get("error"):
+        print(f"\nJS calculateKPIs failed and returned empty KPIs: {js['error']}")
+        sys.exit(1)
+
+    mismatches = compare(js["kpis"], py_kpis, args.tolerance)
+    if mismatches:
+        print(f"\n{len(mismatches)} KPI(s) differ:")
+        for name, a, b in mismatches:
+            print(f"  {name}: js={a} numpy={b}")
+        sys.exit(1)
+    print(f"\nAll {len(KPI_FIELDS)} KPIs match the JS implementation")
+
+    differing = [name for name in KPI_FIELDS if merged_kpis[name] != py_kpis[name]]
+    if differing:
+        print(f"Merged bucket aggregates differ from the full recompute: {', '.join(differing)}")
+        sys.exit(1)
+    print("Merged bucket aggregates match the full recompute")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,213 @@
+#!/usr/bin/env python3
+"""Measure diagnostics service cold start: import time and time to the first fast request.
+
+Imports are timed in fresh interpreters (NumPy, then FastAPI, then the app).
+Each startup mode is then launched as a subprocess on a free port:
+
+* ``uvicorn``: plain ``uvicorn diagnostics_service.app:app`` with the warm-up
+  disabled, i.e. what the service did before warm-up existed
+* ``warmup``: the same with the background warm-up; requests start once
+  ``/ready`` answers 200, as a load balancer's readiness probe would
+* ``serve``: ``python -m diagnostics_service.serve`` with pre-forked workers
+
+From spawn, it records when ``/health`` first answers, when ``/ready`` does,
+the latency of the first ``/diagnostics/run`` request and the time until a
+request completes within ``--fast-factor`` of the steady-state median. For
+``serve``, the proportional set size of master plus workers shows how much of
+the warmed interpreter they share.
+"""
+
+import os
+import sys
+import json
+import time
+import socket
+import argparse
+import statistics
+import subprocess
+import http.client
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+SRC = os.path.join(HERE, "src")
+
+# Add the src directory to the Python path
+sys.path.insert(0, SRC)
+
+from diagnostics_service.warmup import synthetic_series
+
+MODES = ("uvicorn", "warmup", "serve")
+IMPORT_SNIPPET = """
+import time
+t0 = time.perf_counter()
+import numpy
+t1 = time.perf_counter()
+import fastapi, pydantic
+t2 = time.perf_counter()
+import diagnostics_service.app
+t3 = time.perf_counter()
+print(t1 - t0, t2 - t1, t3 - t2, t3 - t0)
+"""
+
+
+def free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def child_env(**extra) -> dict:
+    env = dict(os.environ, PYTHONPATH=SRC + os.pathsep + os.environ.get("PYTHONPATH", ""))
+    env.update({k: str(v) for k, v in extra.items()})
+    return env
+
+
+def time_imports(repeats: int) -> dict:
+    runs = []
+    for _ in range(repeats):
+        out = subprocess.run([sys.executable, "-c", IMPORT_SNIPPET], env=child_env(), check=True,
+                             capture_output=True, text=True).stdout
+        runs.append([float(v) for v in out.split()])
+    medians = [statistics.median(column) for column in zip(*runs)]
+    return dict(zip(("numpy", "fastapi", "app", "total"), medians))
+
+
+def command(mode: str, port: int, workers: int) -> list:
+    if mode == "serve":
+        return [sys.executable, "-m", "diagnostics_service.serve", "--host", "127.0.0.1", "--port", str(port),
+                "--workers", str(workers), "--log-level", "warning"]
+    return [sys.executable, "-m", "uvicorn", "diagnostics_service.app:app", "--host", "127.0.0.1",
+            "--port", str(port), "--log-level", "warning"]
+
+
+def get_status(port: int, path: str) -> int:
+    try:
+        conn = http.client.HTTPConnection("127.0.0.1", port, timeout=1)
+        conn.request("GET", path)
+        status = conn.getresponse().status
+        conn.close()
+        return status
+    except OSError:
+        return 0
+
+
+def pss_mb(pids) -> tuple:
+    # (PSS, RSS) in MiB summed over the processes; PSS splits shared pages
+    pss = rss = 0
+    for pid in pids:
+        try:
+            with open(f"/proc/{pid}/smaps_rollup") as f:
+                for line in f:
+                    if line.startswith("Pss:"):
+                        pss += int(line.split()[1])
+                    elif line.startswith("Rss:"):
+                        rss += int(line.split()[1])
+        except OSError:
+            return None, None
+    return pss / 1024, rss / 1024
+
+
+def measure(mode: str, body: bytes, requests: int, workers: int, fast_factor: float, timeout: float) -> dict:
+    port = free_port()
+    env = child_env(DIAG_WARMUP=0 if mode == "uvicorn" else 1, DIAG_WORKERS=workers)
+    spawned = time.perf_counter()
+    proc = subprocess.Popen(command(mode, port, workers), env=env, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE)
+    try:
+        listening = ready = None
+        while time.perf_counter() - spawned < timeout:
+            if proc.poll() is not None:
+                raise RuntimeError(f"{mode} exited: {proc.stderr.read().decode()[-2000:]}")
+            if listening is None and get_status(port, "/health") == 200:
+                listening = time.perf_counter() - spawned
+            if listening is not None and get_status(port, "/ready") == 200:
+                ready = time.perf_counter() - spawned
+                break
+            time.sleep(0.005)
+        if ready is None:
+            raise RuntimeError(f"{mode} not ready after {timeout}s")
+
+        conn = http.client.HTTPConnection("127.0.0.1", port, timeout=60)
+        latencies, finished = [], []
+        for _ in range(requests):
+            started = time.perf_counter()
+            conn.request("POST", "/diagnostics/run", body, {"Content-Type": "application/json"})
+            response = conn.getresponse()
+            response.read()
+            if response.status != 200:
+                raise RuntimeError(f"{mode}: /diagnostics/run answered {response.status}")
+            now = time.perf_counter()
+            latencies.append(now - started)
+            finished.append(now - spawned)
+        conn.close()
+
+        steady = statistics.median(latencies[len(latencies) // 2:])
+        first_fast = next(t for lat, t in zip(latencies, finished) if lat <= fast_factor * steady)
+        result = {
+            "mode": mode,
+            "listening_s": listening,
+            "ready_s": ready,
+            "first_ms": latencies[0] * 1e3,
+            "steady_ms": steady * 1e3,
+            "first_fast_s": first_fast,
+        }
+        if mode == "serve":
+            children = subprocess.run(["pgrep", "-P", str(proc.pid)], capture_output=True, text=True).stdout.split()
+            result["pss_mb"], result["rss_mb"] = pss_mb([proc.pid] + children)
+        return result
+    finally:
+        proc.terminate()
+        try:
+            proc.wait(10)
+        except subprocess.TimeoutExpired:
+            proc.kill()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Measure import time and time to the first fast request")
+    parser.add_argument("--modes", default=",".join(MODES), help=f"Comma separated subset of {MODES}")
+    parser.add_argument("--samples", type=int, default=3600, help="Samples per /diagnostics/run request")
+    parser.add_argument("--requests", type=int, default=40, help="Sequential requests per startup")
+    parser.add_argument("--repeats", type=int, default=3, help="Startups per mode (medians are reported)")
+    parser.add_argument("--workers", type=int, default=2, help="Workers for the serve mode")
+    parser.add_argument("--fast-factor", type=float, default=1.5,
+                        help="A request is fast within this factor of the steady-state median")
+    parser.add_argument("--timeout", type=float, default=60.0, help="Seconds to wait for readiness")
+    parser.add_argument("--json", metavar="PATH", help="Also write the raw results to this file")
+    args = parser.parse_args()
+
+    modes = [m.strip() for m in args.modes.split(",") if m.strip()]
+    unknown = set(modes) - set(MODES)
+    if unknown:
+        parser.error(f"unknown modes: {', '.join(sorted(unknown))}")
+
+    imports = time_imports(args.repeats)
+    print("Import time (median of {} fresh interpreters): numpy {numpy:.3f}s, fastapi+pydantic {fastapi:.3f}s, "
+          "app {app:.3f}s, total {total:.3f}s\n".format(args.repeats, **imports))
+
+    s = synthetic_series(args.samples)
+    body = json.dumps({"loop_id": "startup", "series": {k: s[k].tolist() for k in ("ts", "pv", "op")}}).encode()
+    header = (f"{'mode':<8} {'health s':>8} {'ready s':>8} {'first ms':>9} {'steady ms':>9} "
+              f"{'1st fast s':>10} {'PSS MB':>7} {'RSS MB':>7}")
+    print(header)
+    print("-" * len(header))
+
+    results = []
+    for mode in modes:
+        runs = [measure(mode, body, args.requests, args.workers, args.fast_factor, args.timeout)
+                for _ in range(args.repeats)]
+        keys = [k for k in runs[0] if k != "mode" and runs[0][k] is not None]
+        summary = {"mode": mode, **{k: statistics.median(r[k] for r in runs) for k in keys}}
+        results.append({"summary": summary, "runs": runs})
+        memory = (f"{summary['pss_mb']:>7.0f} {summary['rss_mb']:>7.0f}" if "pss_mb" in summary
+                  else f"{'':>7} {'':>7}")
+        print(f"{mode:<8} {summary['listening_s']:>8.2f} {summary['ready_s']:>8.2f} {summary['first_ms']:>9.1f} "
+              f"{summary['steady_ms']:>9.1f} {summary['first_fast_s']:>10.2f} {memory}", flush=True)
+
+    print(f"\nTimes in seconds are from process spawn; first fast = first request within "
+          f"{args.fast_factor}x of the steady median ({args.samples} samples per request).")
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump({"imports": imports, "modes": results}, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,36 +1,199 @@
-from fastapi import FastAPI
-from pydantic import BaseModel, Field
-from typing import List, Optional, Literal
+from fastapi import FastAPI, HTTPException, Query, Request
+from contextlib import asynccontextmanager
+from functools import lru_cache
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import JSONResponse
+from pydantic import BaseModel, Field, ValidationError
+from typing import Dict, List, Optional, Literal
+import os
+import time
+import threading
 import numpy as np
 from .stiction import cross_corr_index
 from .oscillation import dominant_period_fft, oscillation_index_acf
+from .kpi import GOOD_QUALITY, auto_mask, compute_kpis, empty_kpis
+from .quality import (
+    CHECKS, FLATLINE_MIN_SAMPLES, KPI_CHECKS, MIN_QUALITY, MIN_VALID_SAMPLES, SPIKE_Z,
+    flag_counts, interpolate, screen, usable, valid_stretch,
+)
+from .timeline import classify, timeline
+from .jobs import JobScheduler, JobStore, QueueFullError
 
-app = FastAPI(title="CLPM Diagnostics Service", version="0.2.0")
+# Set by warm_up_app; /ready answers 503 until then
+warmup_state = {"ready": False, "warmup_s": None, "warmup_error": None}
+WARMUP_SIZES = [int(v) for v in os.getenv("DIAG_WARMUP_SIZES", "900,3600").split(",") if v.strip()]
+
+def warm_up_app():
+    # Idempotent: run by the lifespan in the background, or by serve.py before
+    # it forks its workers
+    if warmup_state["ready"]:
+        return
+    from .warmup import warm_up
+    started = time.perf_counter()
+    try:
+        warm_up(app, WARMUP_SIZES, int(os.getenv("DIAG_WARMUP_ROUNDS", "2")))
+    except Exception as e:
+        warmup_state["warmup_error"] = str(e) or type(e).__name__
+    warmup_state.update(ready=True, warmup_s=time.perf_counter() - started)
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    job_scheduler.start()
+    if os.getenv("DIAG_WARMUP", "1") == "1":
+        threading.Thread(target=warm_up_app, name="diag-warmup", daemon=True).start()
+    else:
+        warmup_state["ready"] = True
+    yield
+    job_scheduler.stop()
+
+app = FastAPI(title="CLPM Diagnostics Service", version="0.2.0", lifespan=lifespan)
+
+# Stores and readers below are built on first use, so replicas that never
+# serve those endpoints skip their imports, and pre-forked workers each open
+# their own files
+
+@lru_cache(maxsize=None)
+def _kpi_aggregator():
+    from .kpi_aggregates import BucketStore, KpiAggregator
+    return KpiAggregator(
+        BucketStore(os.getenv("KPI_BUCKET_DIR", "kpi_buckets")),
+        bucket_s=int(os.getenv("KPI_BUCKET_SECONDS", "900")),
+        retention_s=int(os.getenv("KPI_BUCKET_RETENTION_HOURS", "48")) * 3600,
+    )
+
+# Per-block partials behind /diagnostics/run/window
+@lru_cache(maxsize=None)
+def _partials_aggregator():
+    from .partials import ACF_MAX_LAG, WELCH_SEGMENT, PartialsAggregator
+    return PartialsAggregator(
+        os.getenv("DIAG_PARTIALS_DB", "diagnostics_partials.db"),
+        block_s=int(os.getenv("DIAG_PARTIALS_BLOCK_SECONDS", "3600")),
+        retention_s=int(os.getenv("DIAG_PARTIALS_RETENTION_HOURS", "192")) * 3600,
+        settle_s=float(os.getenv("DIAG_PARTIALS_SETTLE_SECONDS", "120")),
+        acf_lag=int(os.getenv("DIAG_PARTIALS_ACF_MAX_LAG", str(ACF_MAX_LAG))),
+        segment=int(os.getenv("DIAG_PARTIALS_WELCH_SEGMENT", str(WELCH_SEGMENT))),
+    )
+
+# Recent samples published by a co-located data streaming service
+@lru_cache(maxsize=None)
+def _ring_reader():
+    from .shm_ring import RingReader
+    return RingReader(
+        prefix=os.getenv("SHM_RING_PREFIX", "clpm_ring_"),
+        max_age_s=float(os.getenv("SHM_RING_MAX_AGE", "120")),
+    )
+
+class Readiness(BaseModel):
+    ready: bool
+    warmup_s: Optional[float]
+    warmup_error: Optional[str]
+
+@app.get("/health")
+def health():
+    # Liveness: the process is up and serving
+    return {"status": "ok"}
+
+@app.get("/ready", response_model=Readiness, responses={503: {"model": Readiness}})
+def ready():
+    # Readiness: the warm-up pass has finished
+    if not warmup_state["ready"]:
+        return JSONResponse(status_code=503, content=warmup_state)
+    return warmup_state
+
+# Data-quality screening ahead of the kernels (see quality.py)
+QUALITY_MIN_SCORE = float(os.getenv("DIAG_QUALITY_MIN_SCORE", str(MIN_QUALITY)))
+QUALITY_MIN_SAMPLES = int(os.getenv("DIAG_QUALITY_MIN_SAMPLES", str(MIN_VALID_SAMPLES)))
+QUALITY_FLATLINE_SAMPLES = int(os.getenv("DIAG_QUALITY_FLATLINE_SAMPLES", str(FLATLINE_MIN_SAMPLES)))
+QUALITY_SPIKE_Z = float(os.getenv("DIAG_QUALITY_SPIKE_Z", str(SPIKE_Z)))
 
 class Series(BaseModel):
     ts: List[float] = Field(..., description="Unix epoch seconds for samples")
     pv: List[float]
     op: List[float]
     sp: Optional[List[float]] = None
+    mode: Optional[List[Optional[str]]] = Field(None, description="Samples outside AUT/CAS are screened out")
+    quality_code: Optional[List[int]] = Field(None, description="Samples other than 192 (good) are screened out")
+
+class QualityLimits(BaseModel):
+    pv_min: Optional[float] = None
+    pv_max: Optional[float] = None
+    op_min: Optional[float] = None
+    op_max: Optional[float] = None
+    pv_max_rate: Optional[float] = Field(None, description="PV units per second")
+    op_max_rate: Optional[float] = Field(None, description="OP percent per second")
 
 class RunRequest(BaseModel):
     loop_id: str
     series: Series
     sample_rate_hz: Optional[float] = None
+    screen: bool = Field(False, description="Screen out bad samples first; unusable windows are not analysed")
+    limits: Optional[QualityLimits] = None
 
 class RunResponse(BaseModel):
     loop_id: str
     stiction_xcorr: float
     osc_period_s: Optional[float]
     osc_index: float
-    classification: Literal["normal","stiction","tuning","deadband","oscillating"]
+    classification: Literal["normal","stiction","tuning","deadband","oscillating","bad_data"]
+    quality_score: Optional[float] = Field(None, description="Fraction of samples that passed screening")
+    valid_samples: Optional[int] = None
+    quality_flags: Optional[Dict[str, int]] = Field(None, description="Samples flagged by each check")
+    analysed_samples: Optional[int] = Field(None, description="Length of the longest valid stretch, which was analysed")
 
-@app.post("/diagnostics/run", response_model=RunResponse)
-def run(req: RunRequest):
-    pv = np.asarray(req.series.pv, dtype=float)
-    op = np.asarray(req.series.op, dtype=float)
-    ts = np.asarray(req.series.ts, dtype=float)
+class BatchRunRequest(BaseModel):
+    items: List[RunRequest]
+
+class BatchRunResponse(BaseModel):
+    results: List[RunResponse]
+
+BINARY_FIELDS = ("ts", "pv", "op", "sp")
+
+def _screen(columns: List[dict], limits: List[Optional[QualityLimits]], checks=CHECKS) -> List[dict]:
+    # Series of the same length are screened together, one stacked pass each
+    results = [None] * len(columns)
+    groups = {}
+    for i, c in enumerate(columns):
+        groups.setdefault(len(c["ts"]), []).append(i)
+    for idx in groups.values():
+        def stack(name):
+            rows = [columns[i].get(name) for i in idx]
+            if all(row is None for row in rows):
+                return None
+            # Only masks are optional; a missing one passes every sample
+            return np.stack([np.ones(len(columns[i]["ts"]), dtype=bool) if row is None else row
+                             for i, row in zip(idx, rows)])
+        bounds = [limits[i] or QualityLimits() for i in idx]
+        result = screen(
+            stack("ts"), stack("pv"), stack("op"), auto=stack("auto"), quality_ok=stack("quality_ok"),
+            **{name: np.array([np.nan if getattr(b, name) is None else getattr(b, name) for b in bounds])
+               for name in QualityLimits.model_fields},
+            flatline_samples=QUALITY_FLATLINE_SAMPLES, spike_z=QUALITY_SPIKE_Z, checks=checks,
+        )
+        ok = usable(result, QUALITY_MIN_SCORE, QUALITY_MIN_SAMPLES)
+        for row, i in enumerate(idx):
+            results[i] = {
+                "valid": result["valid"][row],
+                "usable": bool(ok[row]),
+                "quality_score": float(result["score"][row]),
+                "valid_samples": int(result["valid_samples"][row]),
+                "quality_flags": flag_counts(result, row),
+            }
+    return results
 
+def _diagnose(loop_id: str, ts: np.ndarray, pv: np.ndarray, op: np.ndarray,
+              quality: Optional[dict] = None) -> RunResponse:
+    report = {}
+    if quality is not None:
+        report = {name: quality[name] for name in ("quality_score", "valid_samples", "quality_flags")}
+        # The longest stretch of valid samples, short gaps interpolated over
+        stretch = valid_stretch(quality["valid"])
+        report["analysed_samples"] = stretch.stop - stretch.start
+        if not quality["usable"] or report["analysed_samples"] < QUALITY_MIN_SAMPLES:
+            # Too little good data to say anything: skip the kernels
+            return RunResponse(loop_id=loop_id, stiction_xcorr=0.0, osc_period_s=None, osc_index=0.0,
+                               classification="bad_data", **report)
+        valid = quality["valid"][stretch]
+        ts, pv, op = (interpolate(x[stretch], valid) for x in (ts, pv, op))
     n = min(len(pv), len(op))
     pv, op, ts = pv[:n], op[:n], ts[:n]
     pv = pv - np.nanmean(pv)
@@ -40,16 +203,418 @@ def run(req: RunRequest):
     period = dominant_period_fft(pv, ts)
     oi = float(oscillation_index_acf(pv))
 
-    classification = "normal"
-    if oi > 0.4 and period is not None:
-        classification = "oscillating"
-    if xcorr > 0.35 and oi > 0.2:
-        classification = "stiction"
-
     return RunResponse(
-        loop_id=req.loop_id,
+        loop_id=loop_id,
         stiction_xcorr=float(xcorr),
         osc_period_s=float(period) if period is not None else None,
         osc_index=float(oi),
-        classification=classification
+        classification=classify(xcorr, period, oi),
+        **report,
     )
+
+def _binary_columns(fields: str, body: bytes) -> dict:
+    # Body: little-endian float64 columns, one after another, each the same length
+    names = [f.strip() for f in fields.split(",") if f.strip()]
+    if not {"ts", "pv", "op"} <= set(names) or not set(names) <= set(BINARY_FIELDS):
+        raise HTTPException(status_code=422, detail=f"fields must include ts, pv, op and only use {BINARY_FIELDS}")
+    if len(body) % (8 * len(names)):
+        raise HTTPException(status_code=422, detail="body length is not a multiple of the column count")
+    columns = dict(zip(names, np.frombuffer(body, dtype="<f8").reshape(len(names), -1)))
+    # Another dtype or byte order decodes to garbage times, so this catches those too
+    ts = columns["ts"]
+    if not np.isfinite(ts).all() or (np.diff(ts) < 0).any():
+        raise HTTPException(status_code=422,
+                            detail="ts must be finite and in time order; is the body little-endian float64?")
+    return columns
+
+def _run_columns(req: RunRequest) -> dict:
+    s = req.series
+    n = len(s.ts)
+    if not req.screen:
+        # Unscreened series are truncated to the shortest, as they always were
+        return {"ts": np.asarray(s.ts, dtype=float), "pv": np.asarray(s.pv, dtype=float),
+                "op": np.asarray(s.op, dtype=float)}
+    for name in ("pv", "op", "mode", "quality_code"):
+        values = getattr(s, name)
+        if values is not None and len(values) != n:
+            raise HTTPException(status_code=422, detail=f"{req.loop_id}: {name} must have the same length as ts")
+    return {
+        "ts": np.asarray(s.ts, dtype=float),
+        "pv": np.asarray(s.pv, dtype=float),
+        "op": np.asarray(s.op, dtype=float),
+        "auto": None if s.mode is None else auto_mask(s.mode, n),
+        "quality_ok": None if s.quality_code is None else np.asarray(s.quality_code) == GOOD_QUALITY,
+    }
+
+def _diagnose_requests(reqs: List[RunRequest]) -> List[RunResponse]:
+    columns = [_run_columns(req) for req in reqs]
+    screened = [i for i, req in enumerate(reqs) if req.screen]
+    quality = [None] * len(reqs)
+    for i, result in zip(screened, _screen([columns[i] for i in screened], [reqs[i].limits for i in screened])):
+        quality[i] = result
+    return [_diagnose(req.loop_id, c["ts"], c["pv"], c["op"], q) for req, c, q in zip(reqs, columns, quality)]
+
+@app.post("/diagnostics/run", response_model=RunResponse)
+def run(req: RunRequest):
+    return _diagnose_requests([req])[0]
+
+@app.post("/diagnostics/run/batch", response_model=BatchRunResponse)
+def run_batch(req: BatchRunRequest):
+    return BatchRunResponse(results=_diagnose_requests(req.items))
+
+def _diagnose_columns(loop_id: str, ts: np.ndarray, pv: np.ndarray, op: np.ndarray, screen_data: bool) -> RunResponse:
+    quality = _screen([{"ts": ts, "pv": pv, "op": op}], [None])[0] if screen_data else None
+    return _diagnose(loop_id, ts, pv, op, quality)
+
+@app.post("/diagnostics/run/binary", response_model=RunResponse)
+async def run_binary(
+    request: Request,
+    loop_id: str = Query(...),
+    fields: str = Query("ts,pv,op", description="Comma separated column order of the body"),
+    screen: bool = Query(False, description="Screen out bad samples first"),
+):
+    columns = _binary_columns(fields, await request.body())
+    ts, pv, op = columns["ts"], columns["pv"], columns["op"]
+    if not screen:
+        # Screening flags NaN samples as missing; unscreened they are dropped
+        keep = np.isfinite(pv) & np.isfinite(op)
+        ts, pv, op = ts[keep], pv[keep], op[keep]
+    if len(ts) < 2:
+        raise HTTPException(status_code=422, detail=f"{loop_id}: at least 2 samples are needed")
+    return await run_in_threadpool(_diagnose_columns, loop_id, ts, pv, op, screen)
+
+class RecentRunRequest(BaseModel):
+    loop_id: str
+    window_s: float = Field(900, gt=0, description="Seconds of the most recent samples to diagnose")
+    screen: bool = False
+
+@app.post("/diagnostics/run/recent", response_model=RunResponse)
+def run_recent(req: RecentRunRequest):
+    # 404 when the loop is not in shared memory (other host, streaming stopped):
+    # the caller then reads the window from InfluxDB and uses /diagnostics/run
+    window = _ring_reader().window(req.loop_id, req.window_s)
+    if window is None:
+        raise HTTPException(status_code=404, detail=f"no recent samples for {req.loop_id} in shared memory")
+    ts, pv, op, _ = window
+    keep = np.isfinite(pv) & np.isfinite(op)
+    if keep.sum() < 2:
+        raise HTTPException(status_code=404, detail=f"no recent samples for {req.loop_id} in shared memory")
+    return _diagnose_columns(req.loop_id, ts[keep], pv[keep], op[keep], req.screen)
+
+class TimelineRequest(BaseModel):
+    loop_id: str
+    series: Series
+    window_s: float = Field(..., gt=0, description="Window length, converted to samples with the median sample interval")
+    step_s: float = Field(..., gt=0, description="Offset between consecutive window starts")
+
+class TimelineWindow(BaseModel):
+    start: float
+    end: float
+    stiction_xcorr: float
+    osc_period_s: Optional[float]
+    osc_index: float
+    classification: Literal["normal","stiction","tuning","deadband","oscillating"]
+
+class TimelineResponse(BaseModel):
+    loop_id: str
+    window_samples: int
+    step_samples: int
+    windows: List[TimelineWindow]
+
+def _timeline(loop_id: str, ts: np.ndarray, pv: np.ndarray, op: np.ndarray,
+              window_s: float, step_s: float) -> TimelineResponse:
+    n = min(len(ts), len(pv), len(op))
+    dt = float(np.median(np.diff(ts[:n]))) if n > 1 else 0.0
+    if not dt > 0:
+        raise HTTPException(status_code=422, detail="series needs at least two samples with increasing ts")
+    window = int(round(window_s / dt))
+    step = max(1, int(round(step_s / dt)))
+    try:
+        result = timeline(ts, pv, op, window, step)
+    except ValueError as e:
+        raise HTTPException(status_code=422, detail=str(e))
+    windows = [
+        TimelineWindow(start=start, end=end, stiction_xcorr=xcorr, osc_index=oi,
+                       osc_period_s=None if period != period else period, classification=c)
+        for start, end, xcorr, oi, period, c in zip(
+            result["start"].tolist(), result["end"].tolist(), result["stiction_xcorr"].tolist(),
+            result["osc_index"].tolist(), result["osc_period_s"].tolist(), result["classification"].tolist())
+    ]
+    return TimelineResponse(loop_id=loop_id, window_samples=window, step_samples=step, windows=windows)
+
+@app.post("/diagnostics/timeline", response_model=TimelineResponse)
+def diagnostics_timeline(req: TimelineRequest):
+    # Per-window run results in one pass, for locating when a loop's behaviour changed
+    s = req.series
+    return _timeline(req.loop_id, np.asarray(s.ts, dtype=float), np.asarray(s.pv, dtype=float),
+                     np.asarray(s.op, dtype=float), req.window_s, req.step_s)
+
+@app.post("/diagnostics/timeline/binary", response_model=TimelineResponse)
+async def diagnostics_timeline_binary(
+    request: Request,
+    loop_id: str = Query(...),
+    window_s: float = Query(..., gt=0),
+    step_s: float = Query(..., gt=0),
+    fields: str = Query("ts,pv,op", description="Comma separated column order of the body"),
+):
+    # Same body layout as /diagnostics/run/binary
+    columns = _binary_columns(fields, await request.body())
+    return await run_in_threadpool(_timeline, loop_id, columns["ts"], columns["pv"], columns["op"], window_s, step_s)
+
+class WindowRunRequest(BaseModel):
+    loop_id: str
+    series: Series = Field(..., description="Samples from cached_until of the previous call onwards (or the whole window)")
+    end: Optional[float] = Field(None, description="Window end in Unix epoch seconds, defaults to now")
+    window_s: float = Field(7 * 86400.0, gt=0)
+
+class WindowRunResponse(RunResponse):
+    samples: int
+    window_start: float
+    window_end: float
+    blocks_cached: int
+    blocks_computed: int
+    blocks_missing: int = Field(..., description="Blocks in the window with neither stored partials nor posted samples")
+    cached_until: Optional[float] = Field(None, description="End of the newest block in the store")
+
+class PartialsInvalidation(BaseModel):
+    loop_id: str
+    removed: int
+
+@app.post("/diagnostics/run/window", response_model=WindowRunResponse)
+def run_window(req: WindowRunRequest):
+    # Run diagnostics over [end - window_s, end) rounded down to a block
+    # boundary, assembled from stored per-block partials plus blocks computed
+    # from the posted samples. stiction_xcorr is exact, osc_index caps its lags
+    # at DIAG_PARTIALS_ACF_MAX_LAG and osc_period_s is a Welch estimate (an
+    # FFT over all samples for loops too sparse for a Welch segment per block).
+    # Samples covering a whole stored block replace it, so late data is resent
+    # for its whole block; samples covering part of one are a 409 (or the
+    # block is invalidated below first).
+    s = req.series
+    if not (len(s.pv) == len(s.op) == len(s.ts)):
+        raise HTTPException(status_code=422, detail=f"{req.loop_id}: ts, pv and op must have the same length")
+    end = req.end if req.end is not None else time.time()
+    from .partials import PartialBlockError
+    try:
+        result, info = _partials_aggregator().window(req.loop_id, end, req.window_s, s.ts, s.pv, s.op)
+    except PartialBlockError as e:
+        raise HTTPException(status_code=409, detail=str(e))
+    return WindowRunResponse(loop_id=req.loop_id, **result, **info)
+
+@app.delete("/diagnostics/partials/{loop_id}", response_model=PartialsInvalidation)
+def invalidate_partials(loop_id: str, start: float = Query(...), end: float = Query(...)):
+    # Drops the stored blocks overlapping [start, end), e.g. after a backfill;
+    # the next window call reports them in blocks_missing until resent
+    return PartialsInvalidation(loop_id=loop_id, removed=_partials_aggregator().invalidate(loop_id, start, end))
+
+class KpiSeries(BaseModel):
+    ts: List[float] = Field(..., description="Unix epoch seconds for samples")
+    pv: List[Optional[float]]
+    op: List[Optional[float]]
+    sp: List[Optional[float]]
+    mode: Optional[List[Optional[str]]] = None
+    valve_position: Optional[List[Optional[float]]] = None
+    quality_code: Optional[List[int]] = Field(None, description="Defaults to 192 (good) for every sample")
+
+class KpiRequest(BaseModel):
+    loop_id: str
+    series: KpiSeries
+    screen: bool = Field(False, description="Screen out flatlined, spiking and out-of-range samples first")
+    limits: Optional[QualityLimits] = None
+
+class KpiResponse(BaseModel):
+    loop_id: str
+    service_factor: Optional[float]
+    effective_sf: Optional[float]
+    sat_percent: Optional[float]
+    saturation: Optional[float]
+    output_travel: Optional[float]
+    valve_travel: Optional[float]
+    valve_reversals: Optional[int]
+    pi: Optional[float]
+    rpi: Optional[float]
+    osc_index: Optional[float]
+    stiction: Optional[float]
+    deadband: Optional[float]
+    settling_time: Optional[float]
+    overshoot: Optional[float]
+    rise_time: Optional[float]
+    peak_error: Optional[float]
+    integral_error: Optional[float]
+    derivative_error: Optional[float]
+    control_error: Optional[float]
+    noise_level: Optional[float]
+    process_gain: Optional[float]
+    time_constant: Optional[float]
+    dead_time: Optional[float]
+    setpoint_changes: Optional[int]
+    mode_changes: Optional[int]
+    quality_score: Optional[float] = None
+    valid_samples: Optional[int] = None
+    quality_flags: Optional[Dict[str, int]] = None
+
+class KpiBatchRequest(BaseModel):
+    items: List[KpiRequest]
+
+class KpiBatchResponse(BaseModel):
+    results: List[KpiResponse]
+
+class KpiWindowRequest(BaseModel):
+    loop_id: str
+    series: KpiSeries = Field(..., description="Samples from cached_until of the previous call onwards (or the whole window)")
+    end: Optional[float] = Field(None, description="Window end in Unix epoch seconds, defaults to now")
+    window_s: float = Field(86400.0, gt=0)
+
+class KpiWindowResponse(KpiResponse):
+    window_start: float
+    window_end: float
+    buckets_cached: int
+    buckets_computed: int
+    cached_until: Optional[float] = Field(None, description="End of the newest complete bucket in the store")
+
+def _check_series(loop_id: str, s: KpiSeries):
+    n = len(s.ts)
+    if not (len(s.pv) == len(s.op) == len(s.sp) == n):
+        raise HTTPException(status_code=422, detail=f"{loop_id}: ts, pv, op and sp must have the same length")
+    for name in ("mode", "valve_position", "quality_code"):
+        values = getattr(s, name)
+        if values is not None and len(values) != n:
+            raise HTTPException(status_code=422, detail=f"{loop_id}: {name} must have the same length as ts")
+
+def _kpi_quality(req: KpiRequest) -> dict:
+    # Screened in time order; MAN samples and a parked OP stay (KPI_CHECKS)
+    s = req.series
+    n = len(s.ts)
+    ts = np.asarray(s.ts, dtype=float)
+    order = np.argsort(ts, kind="stable")
+    columns = {
+        "ts": ts[order],
+        "pv": np.asarray(s.pv, dtype=float)[order],
+        "op": np.asarray(s.op, dtype=float)[order],
+        "auto": None if s.mode is None else auto_mask(s.mode, n)[order],
+        "quality_ok": None if s.quality_code is None else (np.asarray(s.quality_code) == GOOD_QUALITY)[order],
+    }
+    quality = _screen([columns], [req.limits], KPI_CHECKS)[0]
+    keep = np.empty(n, dtype=bool)
+    keep[order] = quality["valid"]
+    quality["valid"] = keep
+    return quality
+
+def _kpis(req: KpiRequest) -> KpiResponse:
+    s = req.series
+    _check_series(req.loop_id, s)
+    report, keep = {}, None
+    if req.screen:
+        quality = _kpi_quality(req)
+        report = {name: quality[name] for name in ("quality_score", "valid_samples", "quality_flags")}
+        if not quality["usable"]:
+            return KpiResponse(loop_id=req.loop_id, **empty_kpis(), **report)
+        keep = quality["valid"]
+    kpis = compute_kpis(s.ts, s.pv, s.op, s.sp, s.mode, s.valve_position, s.quality_code, keep)
+    return KpiResponse(loop_id=req.loop_id, **kpis, **report)
+
+@app.post("/kpi/compute", response_model=KpiResponse)
+def kpi_compute(req: KpiRequest):
+    return _kpis(req)
+
+@app.post("/kpi/compute/batch", response_model=KpiBatchResponse)
+def kpi_compute_batch(req: KpiBatchRequest):
+    return KpiBatchResponse(results=[_kpis(item) for item in req.items])
+
+@app.post("/kpi/window", response_model=KpiWindowResponse)
+def kpi_window(req: KpiWindowRequest):
+    # KPIs over [end - window_s, end) rounded down to a bucket boundary, merged
+    # from stored complete buckets plus buckets computed from the posted samples
+    s = req.series
+    _check_series(req.loop_id, s)
+    end = req.end if req.end is not None else time.time()
+    kpis, info = _kpi_aggregator().window(req.loop_id, end, req.window_s, s.ts, s.pv, s.op, s.sp,
+                                       s.mode, s.valve_position, s.quality_code)
+    return KpiWindowResponse(loop_id=req.loop_id, **kpis, **info)
+
+# Long runs as jobs: submitted, then polled (or long-polled) for the result
+JOB_KINDS = {
+    "run": (RunRequest, run),
+    "run_batch": (BatchRunRequest, run_batch),
+    "timeline": (TimelineRequest, diagnostics_timeline),
+    "run_window": (WindowRunRequest, run_window),
+    "kpi": (KpiRequest, kpi_compute),
+    "kpi_batch": (KpiBatchRequest, kpi_compute_batch),
+    "kpi_window": (KpiWindowRequest, kpi_window),
+}
+JOB_MAX_WAIT_S = float(os.getenv("DIAG_JOB_MAX_WAIT", "60"))
+
+def _job_handler(model, endpoint):
+    return lambda payload: endpoint(model.model_validate(payload)).model_dump()
+
+job_scheduler = JobScheduler(
+    {kind: _job_handler(model, endpoint) for kind, (model, endpoint) in JOB_KINDS.items()},
+    workers=int(os.getenv("DIAG_JOB_WORKERS", "2")),
+    reserved_interactive=int(os.getenv("DIAG_JOB_RESERVED_INTERACTIVE", "1")),
+    interactive_weight=int(os.getenv("DIAG_JOB_INTERACTIVE_WEIGHT", "4")),
+    retention_s=float(os.getenv("DIAG_JOB_RETENTION_S", "3600")),
+    max_queued=int(os.getenv("DIAG_JOB_MAX_QUEUED", "1000")),
+    store=JobStore(os.environ["DIAG_JOB_DB"]) if os.getenv("DIAG_JOB_DB") else None,
+)
+
+class JobRequest(BaseModel):
+    kind: Literal["run", "run_batch", "timeline", "run_window", "kpi", "kpi_batch", "kpi_window"]
+    payload: dict = Field(..., description="Request body of the matching endpoint")
+    priority: Literal["interactive", "batch"] = "batch"
+    requester: Optional[str] = Field(None, description="Fair-sharing key, defaults to the client address")
+
+class JobStatus(BaseModel):
+    id: str
+    kind: str
+    priority: str
+    requester: str
+    state: Literal["queued", "running", "done", "failed", "cancelled"]
+    submitted: float
+    started: Optional[float]
+    finished: Optional[float]
+    result: Optional[dict]
+    error: Optional[str]
+
+class JobStats(BaseModel):
+    queued: dict
+    running: dict
+    completed: dict
+    retained: int
+    workers: int
+
+def _job(job_id: str):
+    job = job_scheduler.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail=f"unknown or expired job {job_id}")
+    return job
+
+@app.post("/diagnostics/jobs", response_model=JobStatus, status_code=202)
+def submit_job(req: JobRequest, request: Request):
+    model, _ = JOB_KINDS[req.kind]
+    try:
+        model.model_validate(req.payload)
+    except ValidationError as e:
+        raise HTTPException(status_code=422, detail=e.errors(include_url=False))
+    requester = req.requester or (request.client.host if request.client else "anonymous")
+    job_scheduler.start()
+    try:
+        job = job_scheduler.submit(req.kind, req.payload, req.priority, requester)
+    except QueueFullError as e:
+        raise HTTPException(status_code=429, detail=str(e))
+    return job.to_dict()
+
+@app.get("/diagnostics/jobs/stats", response_model=JobStats)
+def job_stats():
+    return job_scheduler.stats()
+
+@app.get("/diagnostics/jobs/{job_id}", response_model=JobStatus)
+async def get_job(job_id: str, wait: float = Query(0, ge=0, description="Seconds to wait for the job to finish")):
+    job = await job_scheduler.wait(_job(job_id), min(wait, JOB_MAX_WAIT_S))
+    return job.to_dict()
+
+@app.delete("/diagnostics/jobs/{job_id}", response_model=JobStatus)
+def cancel_job(job_id: str):
+    job = _job(job_id)
+    if job.state in ("done", "failed"):
+        raise HTTPException(status_code=409, detail=f"job {job_id} already {job.state}")
+    return job_scheduler.cancel(job_id).to_dict()
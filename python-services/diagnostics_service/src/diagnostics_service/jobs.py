@@ -0,0 +1,386 @@
+import os
+import json
+import time
+import uuid
+import sqlite3
+import asyncio
+import threading
+from collections import OrderedDict, deque
+from typing import Callable, Dict, List, Optional
+
+PRIORITIES = ("interactive", "batch")
+QUEUED, RUNNING, DONE, FAILED, CANCELLED = "queued", "running", "done", "failed", "cancelled"
+FINISHED = (DONE, FAILED, CANCELLED)
+PURGE_INTERVAL_S = 30.0
+POLL_INTERVAL_S = 0.5
+
+
+class QueueFullError(Exception):
+    pass
+
+
+class Job:
+    __slots__ = ("id", "kind", "priority", "requester", "payload", "state", "submitted", "started",
+                 "finished", "result", "error", "waiters")
+
+    def __init__(self, kind: str, priority: str, requester: str, payload: dict, job_id: Optional[str] = None,
+                 state: str = QUEUED, submitted: Optional[float] = None, started: Optional[float] = None,
+                 finished: Optional[float] = None, result: Optional[dict] = None, error: Optional[str] = None):
+        self.id = job_id or uuid.uuid4().hex
+        self.kind = kind
+        self.priority = priority
+        self.requester = requester
+        self.payload = payload
+        self.state = state
+        self.submitted = submitted if submitted is not None else time.time()
+        self.started = started
+        self.finished = finished
+        self.result = result
+        self.error = error
+        self.waiters = []
+
+    def to_dict(self) -> dict:
+        return {name: getattr(self, name) for name in (
+            "id", "kind", "priority", "requester", "state", "submitted", "started", "finished", "result", "error")}
+
+
+class JobStore:
+    # SQLite copy of every job, so queued jobs and retained results survive a
+    # restart. Workers of one service share the file: state changes are
+    # conditional on the stored state, so a job is claimed by one worker only
+    # and a cancel through any worker sticks
+
+    COLUMNS = ("id", "kind", "priority", "requester", "payload", "state", "submitted", "started",
+               "finished", "result", "error")
+
+    def __init__(self, path: str):
+        self.path = path
+        self._conn = None
+        self._pid = None
+
+    @property
+    def conn(self) -> sqlite3.Connection:
+        # Opened on first use in each process: a connection must not cross a fork
+        if self._conn is None or self._pid != os.getpid():
+            self._conn = sqlite3.connect(self.path, check_same_thread=False, isolation_level=None)
+            self._pid = os.getpid()
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute("PRAGMA synchronous=NORMAL")
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS jobs (id TEXT PRIMARY KEY, kind TEXT, priority TEXT, requester TEXT,"
+                " payload TEXT, state TEXT, submitted REAL, started REAL, finished REAL, result TEXT, error TEXT)"
+            )
+        return self._conn
+
+    def save(self, job: Job, expect: Optional[str] = None) -> bool:
+        # With expect, only if the stored job is still in that state
+        row = [getattr(job, name) for name in self.COLUMNS]
+        row[4] = None if job.payload is None else json.dumps(job.payload)
+        row[9] = None if job.result is None else json.dumps(job.result)
+        if expect is None:
+            self.conn.execute(f"INSERT OR REPLACE INTO jobs VALUES ({', '.join('?' * len(row))})", row)
+            return True
+        cursor = self.conn.execute(
+            f"UPDATE jobs SET {', '.join(f'{name} = ?' for name in self.COLUMNS[1:])} WHERE id = ? AND state = ?",
+            row[1:] + [job.id, expect],
+        )
+        return cursor.rowcount == 1
+
+    def delete(self, job_ids: List[str]):
+        self.conn.executemany("DELETE FROM jobs WHERE id = ?", [(job_id,) for job_id in job_ids])
+
+    def load(self) -> List[Job]:
+        return [self._job(row) for row in
+                self.conn.execute(f"SELECT {', '.join(self.COLUMNS)} FROM jobs ORDER BY submitted")]
+
+    def get(self, job_id: str) -> Optional[Job]:
+        row = self.conn.execute(f"SELECT {', '.join(self.COLUMNS)} FROM jobs WHERE id = ?", (job_id,)).fetchone()
+        return None if row is None else self._job(row)
+
+    def requeue_running(self):
+        # Jobs interrupted by a restart run again
+        self.conn.execute("UPDATE jobs SET state = ?, started = NULL WHERE state = ?", (QUEUED, RUNNING))
+
+    def counts(self) -> Dict[str, Dict[str, int]]:
+        # {state: {priority: jobs}}
+        counts = {}
+        for state, priority, count in self.conn.execute(
+                "SELECT state, priority, COUNT(*) FROM jobs GROUP BY state, priority"):
+            counts.setdefault(state, {})[priority] = count
+        return counts
+
+    def _job(self, row) -> Job:
+        values = dict(zip(self.COLUMNS, row))
+        return Job(
+            values["kind"], values["priority"], values["requester"],
+            None if values["payload"] is None else json.loads(values["payload"]),
+            job_id=values["id"], state=values["state"], submitted=values["submitted"],
+            started=values["started"], finished=values["finished"],
+            result=None if values["result"] is None else json.loads(values["result"]),
+            error=values["error"],
+        )
+
+    def close(self):
+        if self._conn is not None and self._pid == os.getpid():
+            self._conn.close()
+        self._conn = None
+
+
+class JobScheduler:
+    # Worker threads running submitted jobs. Interactive jobs go first and
+    # reserved workers never take batch jobs, but batch jobs still get one
+    # pick in every interactive_weight + 1 while both classes wait. Within a
+    # class, requesters take turns (round robin over per-requester FIFOs), so
+    # one sweep cannot hold back everyone else's jobs.
+    #
+    # With a store shared by several service workers, lookups, cancels, long
+    # polls and stats fall back to the store for jobs held by another worker.
+    # Only one of them may requeue interrupted jobs (recover), or it would
+    # restart jobs still running in the others.
+
+    def __init__(self, handlers: Dict[str, Callable[[dict], dict]], workers: int = 2,
+                 reserved_interactive: int = 1, interactive_weight: int = 4, retention_s: float = 3600.0,
+                 max_queued: int = 1000, store: Optional[JobStore] = None):
+        self.handlers = handlers
+        self.workers = max(1, workers)
+        self.reserved_interactive = min(max(0, reserved_interactive), self.workers - 1)
+        self.interactive_weight = max(1, interactive_weight)
+        self.retention_s = retention_s
+        self.max_queued = max_queued
+        self.store = store
+        self.recover = True
+
+        self.jobs: Dict[str, Job] = {}
+        self.queues = {priority: OrderedDict() for priority in PRIORITIES}
+        self.queued = 0
+        self.running = {priority: 0 for priority in PRIORITIES}
+        self.completed = {state: 0 for state in FINISHED}
+        self.cond = threading.Condition()
+        self.threads: List[threading.Thread] = []
+        self.stopping = False
+        self._credit = 0
+        self._last_purge = 0.0
+
+    def start(self):
+        with self.cond:
+            if self.threads:
+                return
+            if self.store is not None:
+                if self.recover:
+                    self.store.requeue_running()
+                for job in self.store.load():
+                    if job.state == RUNNING:
+                        # Running in another worker
+                        continue
+                    self.jobs[job.id] = job
+                    if job.state == QUEUED:
+                        self._enqueue(job)
+            self.stopping = False
+            self.threads = [threading.Thread(target=self._work, name=f"diag-job-{i}", daemon=True)
+                            for i in range(self.workers)]
+        for thread in self.threads:
+            thread.start()
+
+    def stop(self, timeout: float = 5.0):
+        with self.cond:
+            self.stopping = True
+            self.cond.notify_all()
+        for thread in self.threads:
+            thread.join(timeout)
+        self.threads = []
+        if self.store is not None:
+            self.store.close()
+
+    def submit(self, kind: str, payload: dict, priority: str = "batch", requester: str = "anonymous") -> Job:
+        if kind not in self.handlers:
+            raise ValueError(f"unknown job kind {kind!r}")
+        if priority not in PRIORITIES:
+            raise ValueError(f"priority must be one of {PRIORITIES}")
+        job = Job(kind, priority, requester, payload)
+        with self.cond:
+            if self.queued >= self.max_queued:
+                raise QueueFullError(f"{self.queued} jobs already queued")
+            self.jobs[job.id] = job
+            self._enqueue(job)
+            self._save(job)
+            self.cond.notify()
+        return job
+
+    def get(self, job_id: str) -> Optional[Job]:
+        with self.cond:
+            job = self.jobs.get(job_id)
+            if job is None and self.store is not None:
+                job = self.store.get(job_id)
+            return job
+
+    def cancel(self, job_id: str) -> Optional[Job]:
+        # Queued jobs never run; a running job finishes in the background but
+        # its result is discarded
+        with self.cond:
+            job = self.jobs.get(job_id)
+            if job is None and self.store is not None:
+                job = self.store.get(job_id)
+                if job is not None and job.state not in FINISHED:
+                    expect = job.state
+                    job.state, job.finished, job.payload = CANCELLED, time.time(), None
+                    if not self.store.save(job, expect):
+                        job = self.store.get(job_id)
+                return job
+            if job is None or job.state in FINISHED:
+                return job
+            if job.state == QUEUED:
+                jobs = self.queues[job.priority][job.requester]
+                jobs.remove(job)
+                if not jobs:
+                    del self.queues[job.priority][job.requester]
+                self.queued -= 1
+            self._finish(job, CANCELLED)
+            return self.get(job_id)
+
+    async def wait(self, job: Job, timeout: float) -> Job:
+        # Long poll: resolves as soon as the job finishes, without holding a
+        # thread; jobs held by another worker are polled in the store
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + timeout
+        future = loop.create_future()
+        with self.cond:
+            waiting = self.jobs.get(job.id) is job and job.state not in FINISHED and timeout > 0
+            if waiting:
+                job.waiters.append((loop, future))
+        if waiting:
+            try:
+                await asyncio.wait_for(future, timeout)
+            except asyncio.TimeoutError:
+                pass
+            finally:
+                with self.cond:
+                    if (loop, future) in job.waiters:
+                        job.waiters.remove((loop, future))
+            job = self.get(job.id) or job
+        while job.state not in FINISHED and self.store is not None and loop.time() < deadline:
+            await asyncio.sleep(min(POLL_INTERVAL_S, deadline - loop.time()))
+            job = self.get(job.id) or job
+        return job
+
+    def stats(self) -> dict:
+        with self.cond:
+            if self.store is not None:
+                # Every worker sharing the store; completed counts retained jobs
+                counts = self.store.counts()
+                return {
+                    "queued": {priority: counts.get(QUEUED, {}).get(priority, 0) for priority in PRIORITIES},
+                    "running": {priority: counts.get(RUNNING, {}).get(priority, 0) for priority in PRIORITIES},
+                    "completed": {state: sum(counts.get(state, {}).values()) for state in FINISHED},
+                    "retained": sum(sum(by_priority.values()) for by_priority in counts.values()),
+                    "workers": self.workers,
+                }
+            return {
+                "queued": {priority: sum(map(len, queue.values())) for priority, queue in self.queues.items()},
+                "running": dict(self.running),
+                "completed": dict(self.completed),
+                "retained": len(self.jobs),
+                "workers": self.workers,
+            }
+
+    def _enqueue(self, job: Job):
+        queue = self.queues[job.priority]
+        queue.setdefault(job.requester, deque()).append(job)
+        self.queued += 1
+
+    def _pop(self) -> Optional[Job]:
+        interactive, batch = self.queues["interactive"], self.queues["batch"]
+        batch_allowed = batch and self.running["batch"] < self.workers - self.reserved_interactive
+        if interactive and batch_allowed:
+            self._credit += 1
+            queue = batch if self._credit > self.interactive_weight else interactive
+        else:
+            queue = interactive or (batch if batch_allowed else None)
+        if not queue:
+            return None
+        if queue is batch:
+            self._credit = 0
+
+        requester, jobs = next(iter(queue.items()))
+        job = jobs.popleft()
+        if jobs:
+            queue.move_to_end(requester)
+        else:
+            del queue[requester]
+        self.queued -= 1
+        return job
+
+    def _work(self):
+        while True:
+            with self.cond:
+                job = None
+                while not self.stopping:
+                    self._purge()
+                    job = self._pop()
+                    if job is not None:
+                        break
+                    self.cond.wait(PURGE_INTERVAL_S)
+                if job is None:
+                    return
+                job.state, job.started = RUNNING, time.time()
+                if not self._save(job, QUEUED):
+                    # Claimed or cancelled through another worker
+                    self._adopt(job)
+                    continue
+                self.running[job.priority] += 1
+
+            try:
+                result, error = self.handlers[job.kind](job.payload), None
+            except Exception as e:
+                result, error = None, str(getattr(e, "detail", None) or e) or type(e).__name__
+
+            with self.cond:
+                self.running[job.priority] -= 1
+                if job.state == RUNNING:
+                    job.result = result
+                    self._finish(job, DONE if error is None else FAILED, error)
+                # A batch slot may have freed up for a waiting batch job
+                self.cond.notify()
+
+    def _finish(self, job: Job, state: str, error: Optional[str] = None):
+        expect = job.state
+        job.state, job.finished, job.error = state, time.time(), error
+        job.payload = None
+        if not self._save(job, expect):
+            self._adopt(job)
+            return
+        self.completed[state] += 1
+        self._wake(job)
+
+    def _adopt(self, job: Job):
+        # Take the stored state of a job another worker changed
+        stored = self.store.get(job.id)
+        if stored is not None and stored.state in FINISHED:
+            self.jobs[job.id] = stored
+        else:
+            self.jobs.pop(job.id, None)
+        self._wake(job)
+
+    def _wake(self, job: Job):
+        for loop, future in job.waiters:
+            loop.call_soon_threadsafe(_resolve, future)
+        job.waiters = []
+
+    def _purge(self):
+        now = time.time()
+        if now - self._last_purge < PURGE_INTERVAL_S:
+            return
+        self._last_purge = now
+        expired = [job_id for job_id, job in self.jobs.items()
+                   if job.state in FINISHED and job.finished < now - self.retention_s]
+        for job_id in expired:
+            del self.jobs[job_id]
+        if expired and self.store is not None:
+            self.store.delete(expired)
+
+    def _save(self, job: Job, expect: Optional[str] = None) -> bool:
+        return self.store is None or self.store.save(job, expect)
+
+
+def _resolve(future: asyncio.Future):
+    if not future.done():
+        future.set_result(None)
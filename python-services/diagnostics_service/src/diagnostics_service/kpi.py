@@ -0,0 +1,168 @@
+import numpy as np
+
+# Mirrors calculateKPIs in backend/kpi-worker/src/index.js
+GOOD_QUALITY = 192
+SATURATION_THRESHOLD = 5.0
+SP_CHANGE_THRESHOLD = 0.5
+MAX_STICTION_LAG = 10
+
+KPI_FIELDS = (
+    "service_factor", "effective_sf", "sat_percent", "saturation", "output_travel",
+    "valve_travel", "valve_reversals", "pi", "rpi", "osc_index", "stiction", "deadband",
+    "settling_time", "overshoot", "rise_time", "peak_error", "integral_error",
+    "derivative_error", "control_error", "noise_level", "process_gain", "time_constant",
+    "dead_time", "setpoint_changes", "mode_changes",
+)
+
+KPI_DECIMALS = {
+    "output_travel": 3, "valve_travel": 6, "osc_index": 6, "stiction": 6, "deadband": 6,
+    "peak_error": 3, "integral_error": 3, "derivative_error": 3, "control_error": 3,
+    "noise_level": 6,
+}
+
+
+def empty_kpis() -> dict:
+    return {name: None for name in KPI_FIELDS}
+
+
+def round_js(value: float, decimals: int) -> float:
+    # Math.round rounds halves up, Python's round() rounds them to even
+    m = 10.0 ** decimals
+    return float(np.floor(value * m + 0.5) / m)
+
+
+def _values(values, n: int) -> np.ndarray:
+    # None becomes NaN, matching the JS null checks
+    return np.full(n, np.nan) if values is None else np.asarray(values, dtype=float)
+
+
+def _mode_codes(modes, n: int):
+    # Integer code per distinct mode (None included), the mode of each code,
+    # and whether each code counts as auto
+    if modes is None:
+        return np.zeros(n, dtype=np.int64), [None], np.zeros(1, dtype=bool)
+    lookup = {}
+    codes = np.fromiter((lookup.setdefault(m, len(lookup)) for m in modes), dtype=np.int64, count=n)
+    values = list(lookup) or [None]
+    auto = np.array([bool(m) and ("AUT" in str(m).upper() or "CAS" in str(m).upper()) for m in values])
+    return codes, values, auto
+
+
+def auto_mask(modes, n: int) -> np.ndarray:
+    # True where the mode counts as auto (AUT/CAS) for the service factor
+    codes, _, auto = _mode_codes(modes, n)
+    return auto[codes]
+
+
+def stiction_severity(op: np.ndarray, pv: np.ndarray, pv_mean: float) -> float:
+    n = len(op)
+    if n < 2:
+        return 0.0
+    a_all = op - op.mean()
+    b_all = pv - pv_mean
+    best = 0.0
+    for lag in range(1, min(MAX_STICTION_LAG, n // 2) + 1):
+        a, b = a_all[lag:], b_all[:-lag]
+        op_denom = np.dot(a, a)
+        pv_denom = np.dot(b, b)
+        if op_denom > 0 and pv_denom > 0:
+            best = max(best, abs(np.dot(a, b) / np.sqrt(op_denom * pv_denom)))
+    return float(best)
+
+
+def finish_kpis(service_factor, saturation, pi, **values) -> dict:
+    # Derived KPIs plus the worker's rounding; values missing here stay None
+    kpis = empty_kpis()
+    kpis.update(
+        service_factor=round_js(service_factor, 6),
+        effective_sf=round_js(service_factor * (1 - saturation), 6),
+        sat_percent=round_js(saturation, 6),
+        saturation=round_js(saturation, 6),
+        pi=round_js(pi, 6),
+        rpi=round_js(pi * service_factor, 6),
+    )
+    for name, value in values.items():
+        if value is not None and name in KPI_DECIMALS:
+            value = round_js(value, KPI_DECIMALS[name])
+        kpis[name] = value
+    return kpis
+
+
+def valid_sorted(ts, pv, op, sp, mode=None, valve_position=None, quality_code=None, keep=None):
+    # Samples kept by the worker's filter (and by keep, if given), in time order.
+    # Modes come back as integer codes into mode_values, with auto_codes[code]
+    # telling AUT/CAS apart.
+    n = len(ts)
+    ts = np.asarray(ts, dtype=float)
+    pv, op, sp = _values(pv, n), _values(op, n), _values(sp, n)
+    modes, mode_values, auto_codes = _mode_codes(mode, n)
+    valve = _values(valve_position, n)
+    quality = np.full(n, GOOD_QUALITY) if quality_code is None else np.asarray(quality_code)
+
+    valid = ~np.isnan(pv) & ~np.isnan(op) & ~np.isnan(sp) & (quality == GOOD_QUALITY)
+    if keep is not None:
+        valid &= keep
+    order = np.flatnonzero(valid)
+    order = order[np.argsort(ts[order], kind="stable")]
+    return ts[order], pv[order], op[order], sp[order], modes[order], mode_values, auto_codes, valve[order]
+
+
+def compute_kpis(ts, pv, op, sp, mode=None, valve_position=None, quality_code=None, keep=None) -> dict:
+    ts, pv, op, sp, modes, _, auto_codes, valve = valid_sorted(ts, pv, op, sp, mode, valve_position, quality_code,
+                                                               keep)
+    n = len(ts)
+    if not n:
+        return empty_kpis()
+
+    service_factor = auto_codes[modes].sum() / n
+    saturation = ((op <= SATURATION_THRESHOLD) | (op >= 100 - SATURATION_THRESHOLD)).sum() / n
+
+    dop = np.diff(op)
+    output_travel = np.abs(dop).sum()
+
+    valve = valve[~np.isnan(valve)]
+    valve_travel = np.abs(np.diff(valve)).sum() if len(valve) > 1 else None
+
+    prev, curr = dop[:-1], dop[1:]
+    valve_reversals = int((((prev > 0) & (curr < 0)) | ((prev < 0) & (curr > 0))).sum()) if n > 2 else 0
+
+    pv_mean = pv.mean()
+    pv_dev = pv - pv_mean
+    pv_variance = np.dot(pv_dev, pv_dev) / n
+    error = sp - pv
+    error_variance = np.dot(error, error) / n
+    pi = min(1.0, max(0.0, 1 - error_variance / pv_variance)) if pv_variance > 0 else 0.0
+
+    osc_index = 0.0
+    if n > 1:
+        denom = np.dot(pv_dev[1:], pv_dev[1:])
+        osc_index = abs(np.dot(pv_dev[1:], pv_dev[:-1]) / denom) if denom > 0 else 0.0
+
+    stiction = stiction_severity(op, pv, pv_mean)
+
+    changes = np.abs(dop)
+    changes = changes[changes > 0]
+    deadband = changes.min() if len(changes) else None
+
+    abs_error = np.abs(error)
+    derivative_error = np.abs(np.diff(error)).mean() if n > 1 else None
+    noise_level = np.abs(pv[2:] - 2 * pv[1:-1] + pv[:-2]).mean() if n > 2 else 0.0
+
+    return finish_kpis(
+        service_factor=service_factor,
+        saturation=saturation,
+        output_travel=output_travel,
+        valve_travel=valve_travel,
+        valve_reversals=valve_reversals,
+        pi=pi,
+        osc_index=osc_index,
+        stiction=stiction,
+        deadband=deadband,
+        peak_error=abs_error.max(),
+        integral_error=abs_error.mean(),
+        derivative_error=derivative_error,
+        control_error=np.sqrt(error_variance),
+        noise_level=noise_level,
+        setpoint_changes=int((np.abs(np.diff(sp)) > SP_CHANGE_THRESHOLD).sum()),
+        mode_changes=int((modes[1:] != modes[:-1]).sum()),
+    )
@@ -0,0 +1,383 @@
+import os
+import json
+import math
+from urllib.parse import quote
+import numpy as np
+from .kpi import (
+    MAX_STICTION_LAG, SATURATION_THRESHOLD, SP_CHANGE_THRESHOLD,
+    empty_kpis, finish_kpis, valid_sorted,
+)
+
+# Mergeable per-bucket partials for the KPIs of kpi.compute_kpis.
+#
+# Every KPI is a sum over samples, pairs or triples of consecutive samples, or a
+# lagged product centred on the window mean. A bucket keeps those sums plus its
+# first and last EDGE samples; merging two adjacent buckets adds the terms that
+# straddle the boundary from those edge samples, so merging cached buckets in
+# time order gives the same KPIs as recomputing the whole window.
+#
+# Lagged products are kept relative to a per-bucket shift (its first PV and OP)
+# and re-centred on the merged means at the end, which keeps the sums small
+# instead of cancelling large raw products.
+
+EDGE = MAX_STICTION_LAG
+EDGE_FIELDS = ("pv", "op", "sp", "mode")
+SCALAR_FIELDS = (
+    "n", "auto", "sat", "pv_mean", "pv_m2", "op_mean", "e2", "e_abs", "e_max",
+    "travel", "deadband", "reversals", "de_abs", "noise", "sp_changes", "mode_changes",
+    "pv_shift", "op_shift", "lag1_n", "lag1_x", "lag1_y", "lag1_xy",
+    "valve_n", "valve_first", "valve_last", "valve_travel",
+)
+LAG_FIELDS = ("st_n", "st_a", "st_b", "st_ab", "st_aa", "st_bb")
+
+
+def _reversal(a: float, b: float, c: float) -> bool:
+    prev, curr = b - a, c - b
+    return (prev > 0 and curr < 0) or (prev < 0 and curr > 0)
+
+
+class BucketAggregate:
+    __slots__ = SCALAR_FIELDS + LAG_FIELDS + ("head", "tail")
+
+    def __init__(self):
+        for name in SCALAR_FIELDS:
+            setattr(self, name, 0)
+        for name in ("deadband", "valve_first", "valve_last"):
+            setattr(self, name, None)
+        for name in LAG_FIELDS:
+            setattr(self, name, [0.0] * MAX_STICTION_LAG)
+        self.head = {name: [] for name in EDGE_FIELDS}
+        self.tail = {name: [] for name in EDGE_FIELDS}
+
+    @classmethod
+    def from_samples(cls, pv, op, sp, modes, mode_values, auto_codes, valve) -> "BucketAggregate":
+        # Time-ordered valid samples of one bucket, as returned by kpi.valid_sorted
+        agg = cls()
+        n = agg.n = len(pv)
+        if not n:
+            return agg
+        agg.auto = int(auto_codes[modes].sum())
+        agg.sat = int(((op <= SATURATION_THRESHOLD) | (op >= 100 - SATURATION_THRESHOLD)).sum())
+
+        agg.pv_mean = float(pv.mean())
+        pv_dev = pv - agg.pv_mean
+        agg.pv_m2 = float(np.dot(pv_dev, pv_dev))
+        agg.op_mean = float(op.mean())
+
+        error = sp - pv
+        abs_error = np.abs(error)
+        agg.e2 = float(np.dot(error, error))
+        agg.e_abs = float(abs_error.sum())
+        agg.e_max = float(abs_error.max())
+        agg.de_abs = float(np.abs(np.diff(error)).sum())
+
+        dop = np.diff(op)
+        changes = np.abs(dop)
+        agg.travel = float(changes.sum())
+        changes = changes[changes > 0]
+        agg.deadband = float(changes.min()) if len(changes) else None
+        prev, curr = dop[:-1], dop[1:]
+        agg.reversals = int((((prev > 0) & (curr < 0)) | ((prev < 0) & (curr > 0))).sum())
+        agg.noise = float(np.abs(pv[2:] - 2 * pv[1:-1] + pv[:-2]).sum())
+        agg.sp_changes = int((np.abs(np.diff(sp)) > SP_CHANGE_THRESHOLD).sum())
+        agg.mode_changes = int((modes[1:] != modes[:-1]).sum())
+
+        agg.pv_shift, agg.op_shift = float(pv[0]), float(op[0])
+        x, y = pv - agg.pv_shift, op - agg.op_shift
+        agg.lag1_n = n - 1
+        agg.lag1_x, agg.lag1_y = float(x[1:].sum()), float(x[:-1].sum())
+        agg.lag1_xy = float(np.dot(x[1:], x[:-1]))
+        for k, lag in enumerate(range(1, min(MAX_STICTION_LAG, n - 1) + 1)):
+            a, b = y[lag:], x[:-lag]
+            agg.st_n[k] = float(n - lag)
+            agg.st_a[k], agg.st_b[k] = float(a.sum()), float(b.sum())
+            agg.st_ab[k], agg.st_aa[k], agg.st_bb[k] = float(np.dot(a, b)), float(np.dot(a, a)), float(np.dot(b, b))
+
+        valve = valve[~np.isnan(valve)]
+        if len(valve):
+            agg.valve_n = len(valve)
+            agg.valve_first, agg.valve_last = float(valve[0]), float(valve[-1])
+            agg.valve_travel = float(np.abs(np.diff(valve)).sum())
+
+        edge_modes = [mode_values[c] for c in modes[:EDGE].tolist()], [mode_values[c] for c in modes[-EDGE:].tolist()]
+        agg.head = {"pv": pv[:EDGE].tolist(), "op": op[:EDGE].tolist(), "sp": sp[:EDGE].tolist(), "mode": edge_modes[0]}
+        agg.tail = {"pv": pv[-EDGE:].tolist(), "op": op[-EDGE:].tolist(), "sp": sp[-EDGE:].tolist(), "mode": edge_modes[1]}
+        return agg
+
+    def copy(self) -> "BucketAggregate":
+        return BucketAggregate.from_dict(self.to_dict())
+
+    def to_dict(self) -> dict:
+        data = {name: getattr(self, name) for name in SCALAR_FIELDS}
+        data.update({name: list(getattr(self, name)) for name in LAG_FIELDS})
+        data["head"] = {name: list(values) for name, values in self.head.items()}
+        data["tail"] = {name: list(values) for name, values in self.tail.items()}
+        return data
+
+    @classmethod
+    def from_dict(cls, data: dict) -> "BucketAggregate":
+        agg = cls()
+        for name in SCALAR_FIELDS + LAG_FIELDS + ("head", "tail"):
+            setattr(agg, name, data[name])
+        return agg
+
+    def merge(self, other: "BucketAggregate") -> "BucketAggregate":
+        # Append a bucket that follows this one in time; mutates and returns self
+        if not other.n:
+            return self
+        if not self.n:
+            return self._take(other)
+
+        # Edge samples either side of the boundary; terms straddling it have
+        # their first sample before index t and their last one at or after it
+        t = len(self.tail["pv"])
+        pv = self.tail["pv"] + other.head["pv"]
+        op = self.tail["op"] + other.head["op"]
+        sp = self.tail["sp"] + other.head["sp"]
+        mode = self.tail["mode"] + other.head["mode"]
+        m = len(pv)
+
+        step = abs(op[t] - op[t - 1])
+        self.travel += step + other.travel
+        deadbands = [d for d in (self.deadband, other.deadband, step if step > 0 else None) if d is not None]
+        self.deadband = min(deadbands) if deadbands else None
+        self.de_abs += abs((sp[t] - pv[t]) - (sp[t - 1] - pv[t - 1])) + other.de_abs
+        self.sp_changes += int(abs(sp[t] - sp[t - 1]) > SP_CHANGE_THRESHOLD) + other.sp_changes
+        self.mode_changes += int(mode[t] != mode[t - 1]) + other.mode_changes
+        self.reversals += other.reversals
+        self.noise += other.noise
+        for i in range(max(t, 2), min(t + 2, m)):
+            self.reversals += int(_reversal(op[i - 2], op[i - 1], op[i]))
+            self.noise += abs(pv[i] - 2 * pv[i - 1] + pv[i - 2])
+
+        # Re-express the other bucket's shifted sums against this bucket's shift
+        dp, do = other.pv_shift - self.pv_shift, other.op_shift - self.op_shift
+        k = other.lag1_n
+        self.lag1_xy += other.lag1_xy + dp * (other.lag1_x + other.lag1_y) + k * dp * dp
+        self.lag1_x += other.lag1_x + k * dp
+        self.lag1_y += other.lag1_y + k * dp
+        x0, x1 = pv[t - 1] - self.pv_shift, pv[t] - self.pv_shift
+        self.lag1_n += k + 1
+        self.lag1_x += x1
+        self.lag1_y += x0
+        self.lag1_xy += x1 * x0
+
+        for j in range(MAX_STICTION_LAG):
+            c, a, b = other.st_n[j], other.st_a[j], other.st_b[j]
+            self.st_ab[j] += other.st_ab[j] + dp * a + do * b + c * do * dp
+            self.st_aa[j] += other.st_aa[j] + 2 * do * a + c * do * do
+            self.st_bb[j] += other.st_bb[j] + 2 * dp * b + c * dp * dp
+            self.st_a[j] += a + c * do
+            self.st_b[j] += b + c * dp
+            self.st_n[j] += c
+            lag = j + 1
+            for i in range(max(t, lag), min(t + lag, m)):
+                ya, xb = op[i] - self.op_shift, pv[i - lag] - self.pv_shift
+                self.st_n[j] += 1
+                self.st_a[j] += ya
+                self.st_b[j] += xb
+                self.st_ab[j] += ya * xb
+                self.st_aa[j] += ya * ya
+                self.st_bb[j] += xb * xb
+
+        if self.valve_n and other.valve_n:
+            self.valve_travel += abs(other.valve_first - self.valve_last) + other.valve_travel
+            self.valve_last = other.valve_last
+        elif other.valve_n:
+            self.valve_first, self.valve_last, self.valve_travel = other.valve_first, other.valve_last, other.valve_travel
+        self.valve_n += other.valve_n
+
+        n = self.n + other.n
+        delta = other.pv_mean - self.pv_mean
+        self.pv_m2 += other.pv_m2 + delta * delta * self.n * other.n / n
+        self.pv_mean += delta * other.n / n
+        self.op_mean = (self.op_mean * self.n + other.op_mean * other.n) / n
+        self.auto += other.auto
+        self.sat += other.sat
+        self.e2 += other.e2
+        self.e_abs += other.e_abs
+        self.e_max = max(self.e_max, other.e_max)
+        self.n = n
+
+        for name in EDGE_FIELDS:
+            if len(self.head[name]) < EDGE:
+                self.head[name] = (self.head[name] + other.head[name])[:EDGE]
+            self.tail[name] = (self.tail[name] + other.tail[name])[-EDGE:]
+        return self
+
+    def _take(self, other: "BucketAggregate") -> "BucketAggregate":
+        data = other.to_dict()
+        for name in SCALAR_FIELDS + LAG_FIELDS + ("head", "tail"):
+            setattr(self, name, data[name])
+        return self
+
+    def kpis(self) -> dict:
+        n = self.n
+        if not n:
+            return empty_kpis()
+        service_factor = self.auto / n
+        pv_variance = self.pv_m2 / n
+        error_variance = self.e2 / n
+        pi = min(1.0, max(0.0, 1 - error_variance / pv_variance)) if pv_variance > 0 else 0.0
+
+        osc_index = 0.0
+        if n > 1:
+            d = self.pv_shift - self.pv_mean
+            num = self.lag1_xy + d * (self.lag1_x + self.lag1_y) + self.lag1_n * d * d
+            denom = self.pv_m2 - (self.head["pv"][0] - self.pv_mean) ** 2
+            osc_index = abs(num / denom) if denom > 0 else 0.0
+
+        stiction = 0.0
+        dp, do = self.pv_shift - self.pv_mean, self.op_shift - self.op_mean
+        for j in range(min(MAX_STICTION_LAG, n // 2)):
+            c, a, b = self.st_n[j], self.st_a[j], self.st_b[j]
+            op_denom = self.st_aa[j] + 2 * do * a + c * do * do
+            pv_denom = self.st_bb[j] + 2 * dp * b + c * dp * dp
+            if op_denom > 0 and pv_denom > 0:
+                cross = self.st_ab[j] + dp * a + do * b + c * do * dp
+                stiction = max(stiction, abs(cross / math.sqrt(op_denom * pv_denom)))
+
+        return finish_kpis(
+            service_factor=service_factor,
+            saturation=self.sat / n,
+            output_travel=self.travel,
+            valve_travel=self.valve_travel if self.valve_n > 1 else None,
+            valve_reversals=self.reversals if n > 2 else 0,
+            pi=pi,
+            osc_index=osc_index,
+            stiction=stiction,
+            deadband=self.deadband,
+            peak_error=self.e_max,
+            integral_error=self.e_abs / n,
+            derivative_error=self.de_abs / (n - 1) if n > 1 else None,
+            control_error=math.sqrt(error_variance),
+            noise_level=self.noise / (n - 2) if n > 2 else 0.0,
+            setpoint_changes=self.sp_changes,
+            mode_changes=self.mode_changes,
+        )
+
+
+def merge_aggregates(aggregates) -> BucketAggregate:
+    # Aggregates must be in time order
+    merged = BucketAggregate()
+    for agg in aggregates:
+        merged.merge(agg)
+    return merged
+
+
+def bucket_aggregates(bucket_s: int, ts, pv, op, sp, mode=None, valve_position=None, quality_code=None) -> dict:
+    # {bucket start (epoch s): BucketAggregate} for the valid samples
+    ts, pv, op, sp, modes, mode_values, auto_codes, valve = valid_sorted(
+        ts, pv, op, sp, mode, valve_position, quality_code)
+    starts = (np.floor(ts / bucket_s) * bucket_s).astype(np.int64)
+    bounds = np.concatenate(([0], np.flatnonzero(np.diff(starts)) + 1, [len(ts)]))
+    return {
+        int(starts[lo]): BucketAggregate.from_samples(
+            pv[lo:hi], op[lo:hi], sp[lo:hi], modes[lo:hi], mode_values, auto_codes, valve[lo:hi])
+        for lo, hi in zip(bounds[:-1].tolist(), bounds[1:].tolist()) if hi > lo
+    }
+
+
+class BucketStore:
+    # One JSON file per loop per bucket: <directory>/<loop_id>/<bucket start>.json.
+    # Parsed buckets are kept in memory until the file's mtime changes, so
+    # several worker processes can share the directory.
+    def __init__(self, directory: str):
+        self.directory = directory
+        self._memory = {}
+
+    def _loop_dir(self, loop_id: str) -> str:
+        return os.path.join(self.directory, quote(loop_id, safe=""))
+
+    def _starts(self, loop_id: str):
+        try:
+            names = os.listdir(self._loop_dir(loop_id))
+        except FileNotFoundError:
+            return []
+        return sorted(int(name[:-5]) for name in names if name.endswith(".json") and name[:-5].lstrip("-").isdigit())
+
+    def save(self, loop_id: str, start: int, agg: BucketAggregate):
+        loop_dir = self._loop_dir(loop_id)
+        os.makedirs(loop_dir, exist_ok=True)
+        path = os.path.join(loop_dir, f"{start}.json")
+        tmp = f"{path}.{os.getpid()}.tmp"
+        with open(tmp, "w") as f:
+            json.dump(agg.to_dict(), f, separators=(",", ":"))
+        os.replace(tmp, path)
+        self._memory[(loop_id, start)] = (os.stat(path).st_mtime_ns, agg)
+
+    def load(self, loop_id: str, start: int, end: int) -> dict:
+        # Buckets whose start lies in [start, end)
+        loaded = {}
+        for bucket in self._starts(loop_id):
+            if not start <= bucket < end:
+                continue
+            path = os.path.join(self._loop_dir(loop_id), f"{bucket}.json")
+            try:
+                mtime = os.stat(path).st_mtime_ns
+                cached = self._memory.get((loop_id, bucket))
+                if cached is None or cached[0] != mtime:
+                    with open(path) as f:
+                        cached = self._memory[(loop_id, bucket)] = (mtime, BucketAggregate.from_dict(json.load(f)))
+                loaded[bucket] = cached[1]
+            except (OSError, ValueError, KeyError):
+                continue  # unreadable bucket; the caller treats it as missing
+        return loaded
+
+    def prune(self, loop_id: str, before: int) -> int:
+        removed = 0
+        for bucket in self._starts(loop_id):
+            if bucket < before:
+                self._memory.pop((loop_id, bucket), None)
+                try:
+                    os.remove(os.path.join(self._loop_dir(loop_id), f"{bucket}.json"))
+                    removed += 1
+                except FileNotFoundError:
+                    pass
+        return removed
+
+
+class KpiAggregator:
+    # Window KPIs from cached complete buckets plus freshly computed ones.
+    # Windows start on a bucket boundary: [floor((end - window_s) / bucket_s) * bucket_s, end)
+    def __init__(self, store: BucketStore, bucket_s: int = 900, retention_s: int = 2 * 86400):
+        self.store = store
+        self.bucket_s = int(bucket_s)
+        self.retention_s = retention_s
+
+    def window(self, loop_id: str, end: float, window_s: float, ts, pv, op, sp,
+               mode=None, valve_position=None, quality_code=None):
+        # The samples only need to cover buckets that are not cached yet, i.e.
+        # from the returned cached_until onwards; buckets they touch are recomputed
+        start = int(math.floor((end - window_s) / self.bucket_s) * self.bucket_s)
+        ts = np.asarray(ts, dtype=float)
+        inside = (ts >= start) & (ts < end)
+        if not inside.all():
+            keep = np.flatnonzero(inside).tolist()
+            ts, pv, op, sp, mode, valve_position, quality_code = (
+                None if values is None else [values[i] for i in keep]
+                for values in (ts, pv, op, sp, mode, valve_position, quality_code))
+        fresh = bucket_aggregates(self.bucket_s, ts, pv, op, sp, mode, valve_position, quality_code)
+
+        cached_until = None
+        for bucket, agg in fresh.items():
+            if bucket + self.bucket_s <= end:
+                self.store.save(loop_id, bucket, agg)
+                cached_until = max(cached_until or 0, bucket + self.bucket_s)
+        cached = {b: agg for b, agg in self.store.load(loop_id, start, int(math.ceil(end))).items()
+                  if b not in fresh}
+        for bucket in cached:
+            if bucket + self.bucket_s <= end:
+                cached_until = max(cached_until or 0, bucket + self.bucket_s)
+        self.store.prune(loop_id, int(end - self.retention_s))
+
+        parts = {**cached, **fresh}
+        merged = merge_aggregates(parts[b] for b in sorted(parts))
+        info = {
+            "window_start": float(start),
+            "window_end": float(end),
+            "buckets_cached": len(cached),
+            "buckets_computed": len(fresh),
+            "cached_until": float(cached_until) if cached_until is not None else None,
+        }
+        return merged.kpis(), info
@@ -0,0 +1,402 @@
+import os
+import math
+import sqlite3
+import threading
+import numpy as np
+from numpy.lib.stride_tricks import sliding_window_view
+from .oscillation import dominant_period_fft
+from .timeline import XCORR_MAX_LAG, classify
+
+# Per-block partial statistics for long-window diagnostics.
+#
+# A block holds the finite (pv, op) samples whose ts falls in
+# [start, start + block_s). It keeps its sample count and sums, lagged product
+# sums within the block (pv autocorrelation up to acf_lag, op/pv cross
+# products up to XCORR_MAX_LAG either way), its first and last acf_lag raw
+# samples, and the summed periodograms of its Welch segments. Sums are taken
+# relative to a per-block shift (its first pv and op) and re-centred on the
+# window means at assembly; pairs that straddle block boundaries are added
+# from the stored edges. Assembling blocks in time order therefore gives the
+# same stiction_xcorr as cross_corr_index over all the samples, and the same
+# osc_index as oscillation_index_acf whenever its lag range (a quarter of the
+# window) is within acf_lag; beyond that the index is the maximum over lags up
+# to acf_lag. The period is the Welch estimate: the strongest non-DC bin of
+# the averaged Hann-windowed segment spectra, refined between bins. Blocks
+# with fewer samples than a segment (loops sampled slower than about
+# block_s / segment) keep their raw ts and pv instead, and when no block in
+# the window has a segment the period is dominant_period_fft over those, as
+# for a full recompute.
+
+ACF_MAX_LAG = 1800
+WELCH_SEGMENT = 2048
+LAYOUT_VERSION = 2
+
+SCALARS = ("n", "pv_shift", "op_shift", "pv_sum", "op_sum", "pv_sq", "op_sq", "segments", "dt", "first_ts", "last_ts")
+ARRAYS = ("acf", "xc_op_pv", "xc_pv_op", "head_pv", "tail_pv", "head_op", "tail_op", "psd", "raw_ts", "raw_pv")
+
+
+class PartialBlockError(ValueError):
+    # Posted samples cover only part of a stored block
+    def __init__(self, loop_id: str, blocks):
+        self.blocks = sorted(blocks)
+        super().__init__(
+            f"{loop_id}: samples for stored block(s) {', '.join(map(str, self.blocks))} do not cover them; "
+            "re-send each block's samples in full, or invalidate the blocks first")
+
+
+def _lag_sums(a: np.ndarray, b: np.ndarray, max_lag: int) -> np.ndarray:
+    # [sum(a[i] * b[i + l]) for l in 0..max_lag], zero where l >= len
+    out = np.zeros(max_lag + 1)
+    n = len(a)
+    for lag in range(min(max_lag, n - 1) + 1):
+        out[lag] = np.dot(a[:n - lag], b[lag:])
+    return out
+
+
+def _auto_sums(y: np.ndarray, max_lag: int) -> np.ndarray:
+    # _lag_sums(y, y, max_lag) through one zero-padded FFT
+    n = len(y)
+    out = np.zeros(max_lag + 1)
+    if not n:
+        return out
+    n_fft = 1 << int(np.ceil(np.log2(n + max_lag + 1)))
+    spectrum = np.fft.rfft(y, n_fft)
+    ac = np.fft.irfft(spectrum * spectrum.conj(), n_fft)
+    m = min(max_lag, n - 1) + 1
+    out[:m] = ac[:m]
+    return out
+
+
+def _straddle_sums(before: np.ndarray, after: np.ndarray, max_lag: int) -> np.ndarray:
+    # Pairs with before[i] earlier than after[j]: lag l gets
+    # sum(before[-t] * after[l - t] for t >= 1)
+    out = np.zeros(max_lag + 1)
+    if not len(before) or not len(after):
+        return out
+    r = before[::-1]
+    size = len(r) + len(after) - 1
+    if len(r) * len(after) <= 4096:
+        conv = np.convolve(r, after)
+    else:
+        n_fft = 1 << int(np.ceil(np.log2(size)))
+        conv = np.fft.irfft(np.fft.rfft(r, n_fft) * np.fft.rfft(after, n_fft), n_fft)[:size]
+    m = min(max_lag, size)
+    out[1:m + 1] = conv[:m]
+    return out
+
+
+class BlockPartials:
+    __slots__ = SCALARS + ARRAYS
+
+    @classmethod
+    def from_samples(cls, ts: np.ndarray, pv: np.ndarray, op: np.ndarray,
+                     acf_lag: int = ACF_MAX_LAG, segment: int = WELCH_SEGMENT) -> "BlockPartials":
+        # Time-ordered finite samples of one block
+        p = cls()
+        n = p.n = len(pv)
+        p.pv_shift = float(pv[0]) if n else 0.0
+        p.op_shift = float(op[0]) if n else 0.0
+        y, z = pv - p.pv_shift, op - p.op_shift
+        p.pv_sum, p.op_sum = float(y.sum()), float(z.sum())
+        p.pv_sq, p.op_sq = float(np.dot(y, y)), float(np.dot(z, z))
+        p.acf = _auto_sums(y, acf_lag)
+        p.xc_op_pv = _lag_sums(z, y, XCORR_MAX_LAG)
+        p.xc_pv_op = _lag_sums(y, z, XCORR_MAX_LAG)
+        p.head_pv, p.tail_pv = pv[:acf_lag].copy(), pv[max(0, n - acf_lag):].copy()
+        p.head_op, p.tail_op = op[:XCORR_MAX_LAG].copy(), op[max(0, n - XCORR_MAX_LAG):].copy()
+
+        p.psd = np.zeros(segment // 2 + 1)
+        p.segments = 0
+        p.raw_ts, p.raw_pv = np.empty(0), np.empty(0)
+        if n >= segment:
+            views = sliding_window_view(pv, segment)[::segment // 2]
+            x = (views - views.mean(axis=1, keepdims=True)) * np.hanning(segment)
+            p.psd = (np.abs(np.fft.rfft(x, axis=1)) ** 2).sum(axis=0)
+            p.segments = len(views)
+        else:
+            p.raw_ts, p.raw_pv = ts.copy(), pv.copy()
+        p.dt = float(np.median(np.diff(ts))) if n > 1 else 0.0
+        p.first_ts = float(ts[0]) if n else 0.0
+        p.last_ts = float(ts[-1]) if n else 0.0
+        return p
+
+    def covers(self, other: "BlockPartials") -> bool:
+        # Whether these samples could be a full re-send of other's
+        return self.first_ts <= other.first_ts and self.last_ts >= other.last_ts and self.n >= other.n
+
+    def to_row(self):
+        arrays = [np.asarray(getattr(self, name), dtype="<f8") for name in ARRAYS]
+        lengths = ",".join(str(len(a)) for a in arrays)
+        return [getattr(self, name) for name in SCALARS] + [lengths, np.concatenate(arrays).tobytes()]
+
+    @classmethod
+    def from_row(cls, row) -> "BlockPartials":
+        p = cls()
+        for name, value in zip(SCALARS, row):
+            setattr(p, name, value)
+        lengths, blob = row[len(SCALARS)], row[len(SCALARS) + 1]
+        values = np.frombuffer(blob, dtype="<f8")
+        offset = 0
+        for name, length in zip(ARRAYS, map(int, lengths.split(","))):
+            setattr(p, name, values[offset:offset + length])
+            offset += length
+        return p
+
+    def centred_sums(self, mu_pv: float, mu_op: float):
+        # Within-block lag sums re-centred on the window means:
+        # sum((a_i - mu_a)(b_{i+l} - mu_b)) = W[l] + d_b * sum(y_a[:n-l]) + d_a * sum(y_b[l:]) + (n - l) d_a d_b
+        n = self.n
+        d_pv, d_op = self.pv_shift - mu_pv, self.op_shift - mu_op
+
+        def centred(w, tail_a, shift_a, sum_a, d_a, head_b, shift_b, sum_b, d_b):
+            lags = np.arange(len(w))
+            tail_sums = np.concatenate(([0.0], np.cumsum((tail_a - shift_a)[::-1])))
+            head_sums = np.concatenate(([0.0], np.cumsum(head_b - shift_b)))
+            valid = lags < n
+            l = np.minimum(lags, len(tail_sums) - 1)
+            first_a = sum_a - tail_sums[l]
+            last_b = sum_b - head_sums[np.minimum(lags, len(head_sums) - 1)]
+            return np.where(valid, w + d_b * first_a + d_a * last_b + (n - lags) * d_a * d_b, 0.0)
+
+        acf = centred(self.acf, self.tail_pv, self.pv_shift, self.pv_sum, d_pv,
+                      self.head_pv, self.pv_shift, self.pv_sum, d_pv)
+        op_pv = centred(self.xc_op_pv, self.tail_op, self.op_shift, self.op_sum, d_op,
+                        self.head_pv, self.pv_shift, self.pv_sum, d_pv)
+        pv_op = centred(self.xc_pv_op, self.tail_pv, self.pv_shift, self.pv_sum, d_pv,
+                        self.head_op, self.op_shift, self.op_sum, d_op)
+        return acf, op_pv, pv_op
+
+
+def assemble(blocks, acf_lag: int = ACF_MAX_LAG, segment: int = WELCH_SEGMENT) -> dict:
+    # run diagnostics for the concatenation of the blocks' samples; blocks in time order
+    blocks = [b for b in blocks if b.n]
+    n = sum(b.n for b in blocks)
+    result = {"stiction_xcorr": 0.0, "osc_period_s": None, "osc_index": 0.0, "samples": n}
+    if not n:
+        result["classification"] = classify(0.0, None, 0.0)
+        return result
+    mu_pv = sum(b.n * b.pv_shift + b.pv_sum for b in blocks) / n
+    mu_op = sum(b.n * b.op_shift + b.op_sum for b in blocks) / n
+
+    acf = np.zeros(acf_lag + 1)
+    op_pv = np.zeros(XCORR_MAX_LAG + 1)
+    pv_op = np.zeros(XCORR_MAX_LAG + 1)
+    var_op = 0.0
+    # Centred samples just before the current block, for the straddling pairs
+    prev_pv, prev_op = np.empty(0), np.empty(0)
+    for b in blocks:
+        a, x, y = b.centred_sums(mu_pv, mu_op)
+        acf += a
+        op_pv += x
+        pv_op += y
+        d_op = b.op_shift - mu_op
+        var_op += b.op_sq + 2 * d_op * b.op_sum + b.n * d_op * d_op
+
+        head_pv, head_op = b.head_pv - mu_pv, b.head_op - mu_op
+        acf += _straddle_sums(prev_pv, head_pv, acf_lag)
+        op_pv += _straddle_sums(prev_op, head_pv[:XCORR_MAX_LAG], XCORR_MAX_LAG)
+        pv_op += _straddle_sums(prev_pv[-XCORR_MAX_LAG:], head_op, XCORR_MAX_LAG)
+        prev_pv = np.concatenate((prev_pv, b.tail_pv - mu_pv))[-acf_lag:]
+        prev_op = np.concatenate((prev_op, b.tail_op - mu_op))[-XCORR_MAX_LAG:]
+
+    # stiction.cross_corr_index: population standard deviations
+    var_pv = acf[0]
+    denom = math.sqrt(max(var_op, 0.0) / n) * math.sqrt(max(var_pv, 0.0) / n)
+    if denom > 0 and n >= 5:
+        corr = np.concatenate((pv_op[1:][::-1], op_pv)) / (n * denom)
+        result["stiction_xcorr"] = float(corr.max())
+
+    # oscillation.oscillation_index_acf, lags capped at acf_lag
+    if n >= 10 and var_pv > 0:
+        max_lag = min(max(2, int(n * 0.25)) - 1, acf_lag)
+        result["osc_index"] = float((acf[1:max_lag + 1] / var_pv).max())
+
+    segments = sum(b.segments for b in blocks)
+    if segments:
+        psd = sum(b.psd for b in blocks if b.segments)
+        psd[0] = 0.0
+        k = int(np.argmax(psd))
+        dt = float(np.median([b.dt for b in blocks if b.segments]))
+        if k > 0 and dt > 0:
+            # Parabola through the log power around the peak bin
+            offset = 0.0
+            if k + 1 < len(psd) and psd[k - 1] > 0 and psd[k + 1] > 0:
+                lo, mid, hi = np.log(psd[k - 1:k + 2])
+                curve = lo - 2 * mid + hi
+                offset = 0.5 * (lo - hi) / curve if curve < 0 else 0.0
+            result["osc_period_s"] = float(segment * dt / (k + offset))
+    else:
+        # Too sparse for a segment in any block: every block kept its samples
+        period = dominant_period_fft(np.concatenate([b.raw_pv for b in blocks]),
+                                     np.concatenate([b.raw_ts for b in blocks]))
+        result["osc_period_s"] = float(period) if period is not None else None
+    result["classification"] = classify(result["stiction_xcorr"], result["osc_period_s"], result["osc_index"])
+    return result
+
+
+def block_partials(block_s: int, ts, pv, op, acf_lag: int = ACF_MAX_LAG, segment: int = WELCH_SEGMENT) -> dict:
+    # {block start (epoch s): BlockPartials} for the finite samples
+    ts, pv, op = (np.asarray(v, dtype=float) for v in (ts, pv, op))
+    keep = np.isfinite(ts) & np.isfinite(pv) & np.isfinite(op)
+    order = np.flatnonzero(keep)
+    order = order[np.argsort(ts[order], kind="stable")]
+    ts, pv, op = ts[order], pv[order], op[order]
+    starts = (np.floor(ts / block_s) * block_s).astype(np.int64)
+    bounds = np.concatenate(([0], np.flatnonzero(np.diff(starts)) + 1, [len(ts)]))
+    return {
+        int(starts[lo]): BlockPartials.from_samples(ts[lo:hi], pv[lo:hi], op[lo:hi], acf_lag, segment)
+        for lo, hi in zip(bounds[:-1].tolist(), bounds[1:].tolist()) if hi > lo
+    }
+
+
+class PartialsStore:
+    # One SQLite table of blocks keyed by (loop_id, start). Decoded blocks are
+    # kept in memory until their revision changes, so several worker processes
+    # can share the file.
+    def __init__(self, path: str, block_s: int, params: str):
+        self.path = path
+        self.block_s = block_s
+        self.params = params
+        self.lock = threading.Lock()
+        self._memory = {}
+        self._conn = None
+        self._pid = None
+
+    @property
+    def conn(self) -> sqlite3.Connection:
+        # Opened on first use in each process: a connection must not cross a fork
+        if self._conn is None or self._pid != os.getpid():
+            self._conn = sqlite3.connect(self.path, check_same_thread=False, isolation_level=None, timeout=30)
+            self._pid = os.getpid()
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute("PRAGMA synchronous=NORMAL")
+            columns = [row[1] for row in self._conn.execute("PRAGMA table_info(partials)")]
+            if columns and columns[4:-2] != list(SCALARS):
+                # Written by an older layout; the table is only a cache
+                self._conn.execute("DROP TABLE partials")
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS partials (loop_id TEXT, start INTEGER, params TEXT, revision INTEGER,"
+                f" {', '.join(f'{name} REAL' for name in SCALARS)}, lengths TEXT, data BLOB,"
+                " PRIMARY KEY (loop_id, start))"
+            )
+        return self._conn
+
+    def save(self, loop_id: str, start: int, block: BlockPartials):
+        columns = ("loop_id", "start", "params", "revision") + SCALARS + ("lengths", "data")
+        row = [loop_id, start, self.params, 1] + block.to_row()
+        with self.lock:
+            self.conn.execute(
+                f"INSERT INTO partials ({', '.join(columns)}) VALUES ({', '.join('?' * len(columns))})"
+                f" ON CONFLICT (loop_id, start) DO UPDATE SET revision = partials.revision + 1, "
+                + ", ".join(f"{name} = excluded.{name}" for name in columns[2:] if name != "revision"),
+                row,
+            )
+
+    def load(self, loop_id: str, start: int, end: int) -> dict:
+        # Blocks whose start lies in [start, end), built with the current parameters
+        with self.lock:
+            revisions = self.conn.execute(
+                "SELECT start, revision FROM partials WHERE loop_id = ? AND start >= ? AND start < ? AND params = ?",
+                (loop_id, start, end, self.params)).fetchall()
+            loaded = {}
+            for block_start, revision in revisions:
+                cached = self._memory.get((loop_id, block_start))
+                if cached is None or cached[0] != revision:
+                    row = self.conn.execute(
+                        f"SELECT {', '.join(SCALARS)}, lengths, data FROM partials WHERE loop_id = ? AND start = ?",
+                        (loop_id, block_start)).fetchone()
+                    if row is None:
+                        continue
+                    block = BlockPartials.from_row(row)
+                    block.n = int(block.n)
+                    block.segments = int(block.segments)
+                    cached = self._memory[(loop_id, block_start)] = (revision, block)
+                loaded[block_start] = cached[1]
+            return loaded
+
+    def delete(self, loop_id: str, start: float, end: float) -> int:
+        # Blocks overlapping [start, end) are dropped, e.g. after late data arrived
+        with self.lock:
+            rows = self.conn.execute(
+                "SELECT start FROM partials WHERE loop_id = ? AND start < ? AND start > ?",
+                (loop_id, end, start - self.block_s)).fetchall()
+            for (block_start,) in rows:
+                self._memory.pop((loop_id, block_start), None)
+            self.conn.executemany("DELETE FROM partials WHERE loop_id = ? AND start = ?",
+                                  [(loop_id, block_start) for (block_start,) in rows])
+            return len(rows)
+
+    def prune(self, loop_id: str, before: int) -> int:
+        with self.lock:
+            for key in [k for k in self._memory if k[0] == loop_id and k[1] < before]:
+                del self._memory[key]
+            return self.conn.execute("DELETE FROM partials WHERE loop_id = ? AND start < ?",
+                                     (loop_id, before)).rowcount
+
+
+class PartialsAggregator:
+    # Long-window run diagnostics from cached complete blocks plus blocks
+    # computed from the posted samples. Windows start on a block boundary:
+    # [floor((end - window_s) / block_s) * block_s, end)
+    def __init__(self, path: str, block_s: int = 3600, retention_s: int = 8 * 86400, settle_s: float = 120.0,
+                 acf_lag: int = ACF_MAX_LAG, segment: int = WELCH_SEGMENT):
+        self.block_s = int(block_s)
+        self.retention_s = retention_s
+        self.settle_s = settle_s
+        self.acf_lag = max(int(acf_lag), XCORR_MAX_LAG)
+        self.segment = int(segment)
+        params = f"v={LAYOUT_VERSION};block={self.block_s};acf={self.acf_lag};segment={self.segment}"
+        self.store = PartialsStore(path, self.block_s, params)
+
+    def window(self, loop_id: str, end: float, window_s: float, ts, pv, op):
+        # The samples only need to cover blocks that are not cached yet, i.e.
+        # from the returned cached_until onwards. A stored block is rebuilt
+        # from posted samples that cover all of its samples (late data is
+        # re-sent for the whole block); samples covering only part of one
+        # raise PartialBlockError, as the partials cannot take in samples
+        # between the stored ones. The exception is the window's first block
+        # when the samples run from end - window_s through its stored end:
+        # its cut-off head is the window's doing, so the stored block is used.
+        start = int(math.floor((end - window_s) / self.block_s) * self.block_s)
+        ts = np.asarray(ts, dtype=float)
+        inside = (ts >= start) & (ts < end)
+        fresh = block_partials(self.block_s, ts[inside], np.asarray(pv, dtype=float)[inside],
+                               np.asarray(op, dtype=float)[inside], self.acf_lag, self.segment)
+
+        stored = self.store.load(loop_id, start, int(math.ceil(end)))
+        partial = [b for b, p in fresh.items() if b in stored and not p.covers(stored[b])]
+        if start in partial:
+            head, cached = fresh[start], stored[start]
+            if head.last_ts >= cached.last_ts and abs(head.first_ts - (end - window_s)) <= 2 * cached.dt:
+                del fresh[start]
+                partial.remove(start)
+        if partial:
+            raise PartialBlockError(loop_id, partial)
+
+        # Blocks are only cached once late samples are unlikely
+        settled = end - self.settle_s
+        cached_until = None
+        for block, partials in fresh.items():
+            if block + self.block_s <= settled:
+                self.store.save(loop_id, block, partials)
+                cached_until = max(cached_until or 0, block + self.block_s)
+        cached = {b: p for b, p in stored.items() if b not in fresh}
+        for block in cached:
+            cached_until = max(cached_until or 0, block + self.block_s)
+        self.store.prune(loop_id, int(end - self.retention_s))
+
+        parts = {**cached, **fresh}
+        result = assemble([parts[b] for b in sorted(parts)], self.acf_lag, self.segment)
+        n_blocks = int(math.ceil((end - start) / self.block_s))
+        info = {
+            "window_start": float(start),
+            "window_end": float(end),
+            "blocks_cached": len(cached),
+            "blocks_computed": len(fresh),
+            "blocks_missing": n_blocks - len(parts),
+            "cached_until": float(cached_until) if cached_until is not None else None,
+        }
+        return result, info
+
+    def invalidate(self, loop_id: str, start: float, end: float) -> int:
+        return self.store.delete(loop_id, start, end)
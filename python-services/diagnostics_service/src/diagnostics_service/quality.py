@@ -0,0 +1,166 @@
+import warnings
+import numpy as np
+
+# Data-quality screening ahead of the analysis kernels. Every check works
+# along the last axis, so a (loops, samples) stack of equal-length windows is
+# screened in one pass, and each is linear in the sample count (medians are
+# partitions, run lengths are running max/min). Series must be in time order.
+# A NaN limit switches its check off.
+
+FLATLINE_MIN_SAMPLES = 60
+SPIKE_Z = 8.0
+MAD_SCALE = 1.4826
+MEAN_DEV_SCALE = 1.2533
+MIN_QUALITY = 0.5
+MIN_VALID_SAMPLES = 32
+FILL_MAX_SAMPLES = 3
+
+CHECKS = ("missing", "bad_quality", "manual", "pv_flatline", "op_flatline", "pv_spike", "op_spike", "range", "rate")
+# KPIs keep MAN samples (service factor) and a parked OP (saturation)
+KPI_CHECKS = tuple(c for c in CHECKS if c not in ("manual", "op_flatline"))
+
+
+def _median(a: np.ndarray) -> np.ndarray:
+    if not np.isnan(a).any():
+        return np.median(a, axis=-1, keepdims=True)
+    with warnings.catch_warnings():
+        warnings.simplefilter("ignore", RuntimeWarning)
+        return np.nanmedian(a, axis=-1, keepdims=True)
+
+
+def robust_z(x: np.ndarray) -> np.ndarray:
+    # (x - median) / (1.4826 * MAD); quantized or mostly flat signals have a
+    # zero MAD, so those fall back to the mean absolute deviation
+    med = _median(x)
+    dev = np.abs(x - med)
+    scale = _median(dev) * MAD_SCALE
+    with warnings.catch_warnings():
+        warnings.simplefilter("ignore", RuntimeWarning)
+        mean_dev = np.nanmean(dev, axis=-1, keepdims=True) * MEAN_DEV_SCALE
+    scale = np.where(scale > 0, scale, mean_dev)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        return np.where(scale > 0, (x - med) / scale, 0.0)
+
+
+def flatline(x: np.ndarray, min_samples: int = FLATLINE_MIN_SAMPLES, tol: float = 0.0) -> np.ndarray:
+    # Samples in a run of at least min_samples consecutive values within tol
+    # of their predecessor
+    n = x.shape[-1]
+    mask = np.zeros(x.shape, dtype=bool)
+    if n == 0 or min_samples > n:
+        return mask
+    same = np.abs(np.diff(x, axis=-1)) <= tol
+    idx = np.arange(n)
+    first = np.ones(x.shape, dtype=bool)
+    first[..., 1:] = ~same
+    last = np.ones(x.shape, dtype=bool)
+    last[..., :-1] = ~same
+    start = np.maximum.accumulate(np.where(first, idx, 0), axis=-1)
+    end = np.minimum.accumulate(np.where(last, idx, n)[..., ::-1], axis=-1)[..., ::-1]
+    return (end - start + 1 >= min_samples) & ~np.isnan(x)
+
+
+def spikes(x: np.ndarray, z_max: float = SPIKE_Z) -> np.ndarray:
+    # Single-sample excursions: a jump in and straight back out, both beyond
+    # z_max robust z-scores of the first differences (steps are kept)
+    mask = np.zeros(x.shape, dtype=bool)
+    if x.shape[-1] < 3:
+        return mask
+    z = robust_z(np.diff(x, axis=-1))
+    into, out = z[..., :-1], z[..., 1:]
+    mask[..., 1:-1] = (np.abs(into) > z_max) & (np.abs(out) > z_max) & (np.sign(into) != np.sign(out))
+    return mask
+
+
+def _rate(x: np.ndarray, ts: np.ndarray, max_rate) -> np.ndarray:
+    # Samples reached from their predecessor faster than max_rate per second
+    mask = np.zeros(x.shape, dtype=bool)
+    dt = np.diff(ts, axis=-1)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        rate = np.abs(np.diff(x, axis=-1)) / dt
+    mask[..., 1:] = (dt > 0) & (rate > max_rate)
+    return mask
+
+
+def screen(ts, pv, op, auto=None, quality_ok=None,
+           pv_min=np.nan, pv_max=np.nan, op_min=np.nan, op_max=np.nan,
+           pv_max_rate=np.nan, op_max_rate=np.nan,
+           flatline_samples: int = FLATLINE_MIN_SAMPLES, spike_z: float = SPIKE_Z,
+           checks=CHECKS) -> dict:
+    # Arrays of shape (..., n); limits are scalars or broadcast against (..., 1).
+    # Returns the per-check masks (True = flagged), the validity mask over the
+    # selected checks and the valid fraction per series as its quality score.
+    ts, pv, op = (np.asarray(v, dtype=float) for v in (ts, pv, op))
+    limits = {name: np.asarray(value, dtype=float)[..., None] if np.ndim(value) else value
+              for name, value in (("pv_min", pv_min), ("pv_max", pv_max), ("op_min", op_min),
+                                  ("op_max", op_max), ("pv_max_rate", pv_max_rate), ("op_max_rate", op_max_rate))}
+    missing = ~(np.isfinite(ts) & np.isfinite(pv) & np.isfinite(op))
+    auto = np.ones(pv.shape, dtype=bool) if auto is None else np.asarray(auto, dtype=bool)
+
+    flags = {
+        "missing": missing,
+        "bad_quality": np.zeros(pv.shape, dtype=bool) if quality_ok is None else ~np.asarray(quality_ok, dtype=bool),
+        "manual": ~auto,
+        "pv_flatline": flatline(pv, flatline_samples),
+        # A frozen OP is only a fault in auto; in MAN it is the operator's
+        "op_flatline": flatline(op, flatline_samples) & auto,
+        "pv_spike": spikes(pv, spike_z),
+        "op_spike": spikes(op, spike_z),
+        "range": ((pv < limits["pv_min"]) | (pv > limits["pv_max"])
+                  | (op < limits["op_min"]) | (op > limits["op_max"])),
+        "rate": _rate(pv, ts, limits["pv_max_rate"]) | _rate(op, ts, limits["op_max_rate"]),
+    }
+    valid = np.ones(pv.shape, dtype=bool)
+    for name in checks:
+        valid &= ~flags[name]
+    n = pv.shape[-1]
+    return {
+        "flags": flags,
+        "valid": valid,
+        "valid_samples": valid.sum(axis=-1),
+        "score": valid.sum(axis=-1) / n if n else np.zeros(pv.shape[:-1]),
+    }
+
+
+def usable(result: dict, min_quality: float = MIN_QUALITY, min_samples: int = MIN_VALID_SAMPLES):
+    # Whether the windows are worth analysing at all
+    return (result["score"] >= min_quality) & (result["valid_samples"] >= min_samples)
+
+
+def flag_counts(result: dict, index=()) -> dict:
+    # {check: flagged samples} for one series of the result
+    return {name: int(mask[index].sum()) for name, mask in result["flags"].items()}
+
+
+def _runs(mask: np.ndarray):
+    # Start and stop (exclusive) of each run of True in a 1-D mask
+    edges = np.diff(np.concatenate(([0], mask.astype(np.int8), [0])))
+    return np.flatnonzero(edges == 1), np.flatnonzero(edges == -1)
+
+
+def valid_stretch(valid: np.ndarray, max_fill: int = FILL_MAX_SAMPLES) -> slice:
+    # Longest contiguous stretch of a 1-D validity mask, bridging interior gaps
+    # of up to max_fill flagged samples (a spike, a dropped sample). Analysing
+    # one stretch keeps the kernels off the jumps that joining the valid
+    # pieces end to end would create.
+    valid = np.asarray(valid, dtype=bool)
+    bridged = valid.copy()
+    starts, stops = _runs(~valid)
+    short = (starts > 0) & (stops < len(valid)) & (stops - starts <= max_fill)
+    for start, stop in zip(starts[short], stops[short]):
+        bridged[start:stop] = True
+    starts, stops = _runs(bridged)
+    if not len(starts):
+        return slice(0, 0)
+    longest = int(np.argmax(stops - starts))
+    return slice(int(starts[longest]), int(stops[longest]))
+
+
+def interpolate(x: np.ndarray, valid: np.ndarray) -> np.ndarray:
+    # Flagged samples replaced by linear interpolation between their valid
+    # neighbours, by sample index
+    valid = np.asarray(valid, dtype=bool)
+    if valid.all() or not valid.any():
+        return x
+    idx = np.arange(len(x))
+    return np.interp(idx, idx[valid], x[valid])
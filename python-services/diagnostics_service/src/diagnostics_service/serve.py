@@ -0,0 +1,143 @@
+import gc
+import os
+import sys
+import time
+import signal
+import socket
+import logging
+import argparse
+
+# Pre-forking launcher: imports the app and runs the warm-up pass once, then
+# forks workers that share the warmed interpreter copy-on-write and accept on
+# one listening socket. Workers report ready as soon as they start. Dead
+# workers are replaced; SIGTERM/SIGINT stop them all.
+#
+#   python -m diagnostics_service.serve --workers 4
+#
+# Async jobs run in the worker that accepted them. With more than one worker,
+# set DIAG_JOB_DB so all of them share one job store: any worker then answers
+# polls, cancels and stats. Without it, run one worker.
+
+logger = logging.getLogger("diagnostics_service.serve")
+
+RESPAWN_BACKOFF_S = 1.0
+
+
+def _listen(host: str, port: int, backlog: int) -> socket.socket:
+    family = socket.AF_INET6 if ":" in host else socket.AF_INET
+    # An explicit IPPROTO_TCP: asyncio only sets TCP_NODELAY on accepted
+    # sockets that carry it, and without it keep-alive requests stall on
+    # delayed ACKs
+    sock = socket.socket(family, socket.SOCK_STREAM, socket.IPPROTO_TCP)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    sock.bind((host, port))
+    sock.listen(backlog)
+    sock.set_inheritable(True)
+    return sock
+
+
+def _worker(index: int, workers: int, sock: socket.socket, log_level: str):
+    signal.signal(signal.SIGTERM, signal.SIG_DFL)
+    signal.signal(signal.SIGINT, signal.SIG_DFL)
+    gc.enable()
+    import uvicorn
+    from . import app as app_module
+
+    if workers > 1:
+        # The master requeued interrupted jobs; a respawned worker must not
+        # requeue the ones still running in the others
+        app_module.job_scheduler.recover = False
+    config = uvicorn.Config(app_module.app, lifespan="on", log_level=log_level, access_log=False)
+    uvicorn.Server(config).run(sockets=[sock])
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run the diagnostics service with pre-warmed, pre-forked workers")
+    parser.add_argument("--host", default=os.getenv("DIAG_HOST", "0.0.0.0"))
+    parser.add_argument("--port", type=int, default=int(os.getenv("DIAG_PORT", "8050")))
+    parser.add_argument("--workers", type=int, default=int(os.getenv("DIAG_WORKERS", "1")))
+    parser.add_argument("--backlog", type=int, default=2048)
+    parser.add_argument("--log-level", default=os.getenv("LOG_LEVEL", "info").lower())
+    args = parser.parse_args()
+    logging.basicConfig(level=args.log_level.upper(), format="%(asctime)s %(levelname)s %(name)s: %(message)s")
+
+    # Objects created from here to the fork are never collected in the master,
+    # so skip collections while importing; freezing them keeps the workers'
+    # collector from writing to (and copying) the shared pages
+    gc.disable()
+    started = time.perf_counter()
+    from . import app as app_module
+    imported = time.perf_counter()
+    if os.getenv("DIAG_WARMUP", "1") == "1":
+        app_module.warm_up_app()
+    else:
+        app_module.warmup_state["ready"] = True
+    state = app_module.warmup_state
+    logger.info("Imported in %.2fs, warmed up in %.2fs%s", imported - started, time.perf_counter() - imported,
+                f" (warm-up failed: {state['warmup_error']})" if state["warmup_error"] else "")
+
+    store = app_module.job_scheduler.store
+    if store is not None:
+        store.requeue_running()
+        store.close()
+    elif args.workers > 1:
+        logger.warning("%d workers without DIAG_JOB_DB: a job is only visible to the worker that accepted it",
+                       args.workers)
+
+    sock = _listen(args.host, args.port, args.backlog)
+    gc.collect()
+    gc.freeze()
+
+    children = {}
+    stopping = False
+
+    def spawn(index: int):
+        pid = os.fork()
+        if pid == 0:
+            code = 0
+            try:
+                _worker(index, args.workers, sock, args.log_level)
+            except BaseException:
+                logger.exception("Worker %d failed", index)
+                code = 1
+            finally:
+                os._exit(code)
+        children[pid] = (index, time.monotonic())
+
+    def stop(signum, frame):
+        nonlocal stopping
+        stopping = True
+        for pid in list(children):
+            try:
+                os.kill(pid, signal.SIGTERM)
+            except ProcessLookupError:
+                pass
+
+    signal.signal(signal.SIGTERM, stop)
+    signal.signal(signal.SIGINT, stop)
+    for index in range(max(1, args.workers)):
+        spawn(index)
+    logger.info("Serving on %s:%d with %d worker(s)", args.host, args.port, len(children))
+
+    while children:
+        try:
+            pid, status = os.wait()
+        except ChildProcessError:
+            break
+        except InterruptedError:
+            continue
+        index, spawned = children.pop(pid, (None, 0.0))
+        if index is None or stopping:
+            continue
+        logger.warning("Worker %d (pid %d) exited with status %d, restarting", index, pid,
+                       os.waitstatus_to_exitcode(status))
+        if time.monotonic() - spawned < RESPAWN_BACKOFF_S:
+            time.sleep(RESPAWN_BACKOFF_S)
+        if not stopping:
+            spawn(index)
+    sock.close()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,158 @@
+import re
+import sys
+import time
+import zlib
+import struct
+import threading
+from multiprocessing import resource_tracker, shared_memory
+from typing import Dict, Optional, Tuple
+
+import numpy as np
+
+# Reader side of data_streaming_service.shm_ring; the layout must match
+MAGIC = 0x474E495250534C43
+VERSION = 1
+HEADER_WORDS = 8
+HEADER_BYTES = HEADER_WORDS * 8
+H_MAGIC, H_VERSION, H_CAPACITY, H_HEAD, H_RESERVE = range(5)
+COLUMNS = ("ts", "pv", "op", "sp")
+READ_RETRIES = 5
+WRITE_WAIT_S = 1e-4
+
+
+def segment_name(prefix: str, loop_id: str) -> str:
+    safe = re.sub(r"[^A-Za-z0-9_.-]", "_", loop_id)
+    if safe != loop_id:
+        safe = f"{safe}.{zlib.crc32(loop_id.encode('utf-8')):08x}"
+    return prefix + safe
+
+
+def _attach(name: str) -> shared_memory.SharedMemory:
+    if sys.version_info >= (3, 13):
+        return shared_memory.SharedMemory(name=name, track=False)
+    shm = shared_memory.SharedMemory(name=name)
+    # Before 3.13 attaching registers the segment with this process's
+    # resource tracker, which would unlink the writer's segment at exit
+    resource_tracker.unregister(shm._name, "shared_memory")
+    return shm
+
+
+class _Ring:
+    __slots__ = ("shm", "header", "data", "capacity")
+
+    def __init__(self, shm: shared_memory.SharedMemory):
+        # Checked before any array views exist, so a rejected segment can be closed
+        magic, version, capacity = struct.unpack_from("<3Q", shm.buf)
+        if magic != MAGIC or version != VERSION:
+            shm.close()
+            raise ValueError(f"{shm.name} is not a version {VERSION} sample ring")
+        self.shm = shm
+        self.capacity = capacity
+        self.header = np.ndarray((HEADER_WORDS,), dtype="<u8", buffer=shm.buf)
+        self.data = np.ndarray((len(COLUMNS), capacity), dtype="<f8", buffer=shm.buf, offset=HEADER_BYTES)
+
+    def latest(self) -> Optional[float]:
+        head = int(self.header[H_HEAD])
+        return float(self.data[0, (head - 1) % self.capacity]) if head else None
+
+    def read(self, seconds: float) -> Tuple[bool, Optional[np.ndarray]]:
+        # One attempt at copying the samples of the last ``seconds``. Seqlock
+        # read: the copy counts only if no write was in progress before it
+        # (reserve == head) or started while it ran (reserve unchanged
+        # afterwards); (False, None) tells the caller to retry. Never sleeps,
+        # so callers can hold a lock around it.
+        head = int(self.header[H_HEAD])
+        if int(self.header[H_RESERVE]) != head:
+            return False, None
+        if not head:
+            return True, None
+        slot = head % self.capacity
+        # Slots in time order: [slot, capacity) then [0, slot) once wrapped
+        parts = [(slot, self.capacity), (0, slot)] if head > self.capacity else [(0, head)]
+        ts = self.data[0]
+        cutoff = ts[(head - 1) % self.capacity] - seconds
+
+        first = head - min(head, self.capacity)
+        for lo, hi in parts:
+            if hi > lo and ts[hi - 1] > cutoff:
+                first += int(np.searchsorted(ts[lo:hi], cutoff, side="right"))
+                break
+            first += hi - lo
+        start = first % self.capacity
+        end = start + head - first
+        if end <= self.capacity:
+            window = self.data[:, start:end].copy()
+        else:
+            window = np.concatenate([self.data[:, start:], self.data[:, :end - self.capacity]], axis=1)
+
+        if int(self.header[H_RESERVE]) == head:
+            return True, window
+        return False, None
+
+    def close(self):
+        self.header = self.data = None
+        self.shm.close()
+
+
+class RingReader:
+    # Recent samples straight from the streaming service's shared memory when
+    # both run on one host: a window costs one memcpy, no query or parsing
+
+    def __init__(self, prefix: str = "clpm_ring_", max_age_s: float = 120.0):
+        self.prefix = prefix
+        self.max_age_s = max_age_s
+        self.rings: Dict[str, _Ring] = {}
+        self.lock = threading.Lock()
+
+    def _ring(self, loop_id: str, reattach: bool = False) -> Optional[_Ring]:
+        ring = self.rings.get(loop_id)
+        if ring is not None and not reattach:
+            return ring
+        if ring is not None:
+            ring.close()
+            del self.rings[loop_id]
+        try:
+            ring = _Ring(_attach(segment_name(self.prefix, loop_id)))
+        except (OSError, ValueError):
+            return None
+        self.rings[loop_id] = ring
+        return ring
+
+    def _live_ring(self, loop_id: str, now: float) -> Optional[_Ring]:
+        ring = self._ring(loop_id)
+        if ring is None:
+            return None
+        latest = ring.latest()
+        if latest is None or now - latest > self.max_age_s:
+            # The writer may have restarted and replaced the segment
+            ring = self._ring(loop_id, reattach=True)
+            latest = ring.latest() if ring is not None else None
+            if latest is None or now - latest > self.max_age_s:
+                return None
+        return ring
+
+    def window(self, loop_id: str, seconds: float) -> Optional[Tuple[np.ndarray, ...]]:
+        # (ts, pv, op, sp) of the last ``seconds``, or None when the loop has
+        # no ring, its newest sample is older than max_age_s or the writer
+        # kept the ring busy for every retry
+        now = time.time()
+        for attempt in range(READ_RETRIES):
+            if attempt:
+                # Outside the lock: other requests keep reading meanwhile
+                time.sleep(WRITE_WAIT_S)
+            # The lock also keeps another thread's reattach from closing the
+            # ring mid-copy
+            with self.lock:
+                ring = self._live_ring(loop_id, now)
+                if ring is None:
+                    return None
+                done, window = ring.read(seconds)
+            if done:
+                return None if window is None else tuple(window)
+        return None
+
+    def close(self):
+        with self.lock:
+            for ring in self.rings.values():
+                ring.close()
+            self.rings.clear()
@@ -0,0 +1,139 @@
+import numpy as np
+from numpy.lib.stride_tricks import sliding_window_view
+
+# Classification rule shared with /diagnostics/run
+OSC_INDEX_THRESHOLD = 0.4
+STICTION_XCORR_THRESHOLD = 0.35
+STICTION_OSC_THRESHOLD = 0.2
+
+XCORR_MAX_LAG = 10
+ACF_MAX_LAG_RATIO = 0.25
+# Values per FFT chunk (windows x window length), bounds memory for long series
+CHUNK_VALUES = 1 << 22
+
+
+def classify(xcorr: float, period, oi: float) -> str:
+    classification = "normal"
+    if oi > OSC_INDEX_THRESHOLD and period is not None:
+        classification = "oscillating"
+    if xcorr > STICTION_XCORR_THRESHOLD and oi > STICTION_OSC_THRESHOLD:
+        classification = "stiction"
+    return classification
+
+
+def _cumsum0(x: np.ndarray) -> np.ndarray:
+    out = np.empty(len(x) + 1)
+    out[0] = 0.0
+    np.cumsum(x, out=out[1:])
+    return out
+
+
+def _tiny(var: np.ndarray, mean_square: np.ndarray) -> np.ndarray:
+    # Variances from running sums are never exactly zero for constant windows
+    return var <= 1e-12 * mean_square
+
+
+def sliding_xcorr(op: np.ndarray, pv: np.ndarray, starts: np.ndarray, window: int) -> np.ndarray:
+    # stiction.cross_corr_index for every window, from prefix sums of the
+    # lagged products: O(len(series) x lags) whatever the window count
+    if window < 5:
+        return np.zeros(len(starts))
+    a, b = op - op.mean(), pv - pv.mean()
+    A, B = _cumsum0(a), _cumsum0(b)
+    A2, B2 = _cumsum0(a * a), _cumsum0(b * b)
+    s, e = starts, starts + window
+    mo, mp = (A[e] - A[s]) / window, (B[e] - B[s]) / window
+    ms_o, ms_p = (A2[e] - A2[s]) / window, (B2[e] - B2[s]) / window
+    var_o, var_p = np.maximum(ms_o - mo * mo, 0.0), np.maximum(ms_p - mp * mp, 0.0)
+    flat = _tiny(var_o, ms_o) | _tiny(var_p, ms_p)
+    denom = np.where(flat, 1.0, np.sqrt(var_o * var_p)) * window
+
+    n = len(a)
+    best = np.full(len(starts), -np.inf)
+    for lag in range(-XCORR_MAX_LAG, XCORR_MAX_LAG + 1):
+        m = abs(lag)
+        if m >= window:
+            # No overlapping samples: cross_corr_index scores the lag as 0
+            best = np.maximum(best, 0.0)
+            continue
+        if lag >= 0:
+            # op[i + m] * pv[i] for i in [s, e - m)
+            P = _cumsum0(a[m:] * b[:n - m])
+            raw = P[e - m] - P[s]
+            sum_op, sum_pv = A[e] - A[s + m], B[e - m] - B[s]
+        else:
+            # op[i] * pv[i + m] for i in [s, e - m)
+            P = _cumsum0(a[:n - m] * b[m:])
+            raw = P[e - m] - P[s]
+            sum_op, sum_pv = A[e - m] - A[s], B[e] - B[s + m]
+        centred = raw - mp * sum_op - mo * sum_pv + (window - m) * mo * mp
+        best = np.maximum(best, centred / denom)
+    return np.where(flat, 0.0, best)
+
+
+def _window_dt(ts: np.ndarray, starts: np.ndarray, window: int, rows: slice) -> np.ndarray:
+    # Median sample interval per window, as dominant_period_fft uses
+    diffs = np.diff(ts)
+    if len(diffs) and np.all(diffs == diffs[0]):
+        return np.full(len(starts[rows]), diffs[0])
+    views = sliding_window_view(diffs, window - 1)[starts[rows]]
+    return np.median(views, axis=1)
+
+
+def timeline(ts: np.ndarray, pv: np.ndarray, op: np.ndarray, window: int, step: int) -> dict:
+    # Per-window diagnostics equal to running /diagnostics/run on
+    # series[start:start + window] for start = 0, step, 2 * step, ...
+    n = min(len(ts), len(pv), len(op))
+    ts, pv, op = ts[:n], pv[:n], op[:n]
+    if window < 2 or window > n:
+        raise ValueError(f"window must be between 2 and the series length ({n})")
+    starts = np.arange(0, n - window + 1, max(1, step))
+    n_windows = len(starts)
+
+    xcorr = sliding_xcorr(op, pv, starts, window)
+    osc_index = np.zeros(n_windows)
+    period = np.full(n_windows, np.nan)
+
+    shifted = pv - pv.mean()
+    views = sliding_window_view(shifted, window)
+    max_lag = max(2, int(window * ACF_MAX_LAG_RATIO))
+    n_fft = 1 << int(np.ceil(np.log2(2 * window - 1)))
+    bins = np.arange(window // 2 + 1)
+    chunk = max(1, CHUNK_VALUES // window)
+    for lo in range(0, n_windows, chunk):
+        rows = slice(lo, lo + chunk)
+        x = views[starts[rows]]
+        x = x - x.mean(axis=1, keepdims=True)
+
+        # oscillation_index_acf: autocorrelation through one padded FFT per window
+        if window >= 10:
+            power = np.abs(np.fft.rfft(x, n=n_fft, axis=1)) ** 2
+            ac = np.fft.irfft(power, n=n_fft, axis=1)[:, :max_lag]
+            flat = x.std(axis=1) == 0
+            ratio = ac[:, 1:] / np.where(flat, 1.0, ac[:, 0])[:, None]
+            osc_index[rows] = np.where(flat, 0.0, ratio.max(axis=1))
+
+        # dominant_period_fft: strongest non-DC bin of the window's spectrum
+        if window >= 16:
+            mag = np.abs(np.fft.rfft(x, axis=1))
+            mag[:, 0] = 0.0
+            k = bins[mag.argmax(axis=1)]
+            dt = _window_dt(ts, starts, window, rows)
+            ok = (k > 0) & np.isfinite(dt) & (dt > 0)
+            # Same arithmetic as np.fft.rfftfreq(window, d=dt)
+            f = k * (1.0 / (window * np.where(ok, dt, 1.0)))
+            period[rows] = np.where(ok, 1.0 / np.where(ok, f, 1.0), np.nan)
+
+    has_period = ~np.isnan(period)
+    classification = np.full(n_windows, "normal", dtype=object)
+    classification[(osc_index > OSC_INDEX_THRESHOLD) & has_period] = "oscillating"
+    classification[(xcorr > STICTION_XCORR_THRESHOLD) & (osc_index > STICTION_OSC_THRESHOLD)] = "stiction"
+
+    return {
+        "start": ts[starts],
+        "end": ts[starts + window - 1],
+        "stiction_xcorr": xcorr,
+        "osc_index": osc_index,
+        "osc_period_s": period,
+        "classification": classification,
+    }
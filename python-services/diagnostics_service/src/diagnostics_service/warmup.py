@@ -0,0 +1,96 @@
+import json
+import time
+import asyncio
+import numpy as np
+
+# Warm-up pass run before a worker reports ready: synthetic windows of the
+# common sizes go through the read-only endpoints in-process, over ASGI, so
+# the first live requests do not pay for the middleware stack build, request
+# and response validators, FFT plans and allocator growth.
+
+WARMUP_SIZES = (900, 3600)
+
+
+def synthetic_series(n: int, seed: int = 0) -> dict:
+    # A sticky-looking oscillating loop at 1 Hz
+    rng = np.random.default_rng(seed)
+    ts = 1_700_000_000.0 + np.arange(n, dtype=float)
+    op = 50 + 5 * np.sign(np.sin(2 * np.pi * ts / 120)) + rng.normal(0, 0.2, n)
+    pv = 400 + np.cumsum(op - op.mean()) * 0.01 + rng.normal(0, 0.1, n)
+    sp = np.full(n, 400.0)
+    return {"ts": ts, "pv": pv, "op": op, "sp": sp}
+
+
+async def _request(app, method: str, path: str, body: bytes = b"", query: str = "",
+                   content_type: str = "application/json") -> int:
+    scope = {
+        "type": "http",
+        "asgi": {"version": "3.0"},
+        "http_version": "1.1",
+        "method": method,
+        "scheme": "http",
+        "path": path,
+        "raw_path": path.encode(),
+        "root_path": "",
+        "query_string": query.encode(),
+        "headers": [(b"host", b"warmup"), (b"content-type", content_type.encode()),
+                    (b"content-length", str(len(body)).encode())],
+        "client": ("127.0.0.1", 0),
+        "server": ("127.0.0.1", 0),
+    }
+    messages = [{"type": "http.disconnect"}, {"type": "http.request", "body": body, "more_body": False}]
+    status = []
+
+    async def receive():
+        return messages.pop() if len(messages) > 1 else messages[0]
+
+    async def send(message):
+        if message["type"] == "http.response.start":
+            status.append(message["status"])
+
+    await app(scope, receive, send)
+    return status[0] if status else 0
+
+
+def _cases(n: int):
+    s = synthetic_series(n)
+    series = {name: s[name].tolist() for name in ("ts", "pv", "op")}
+    binary = np.concatenate([s["ts"], s["pv"], s["op"]]).astype("<f8").tobytes()
+    return [
+        ("run", "POST", "/diagnostics/run", {"loop_id": "warmup", "series": series}, ""),
+        ("run_binary", "POST", "/diagnostics/run/binary", binary, "loop_id=warmup&fields=ts,pv,op"),
+        ("timeline", "POST", "/diagnostics/timeline",
+         {"loop_id": "warmup", "series": series, "window_s": max(n // 4, 16), "step_s": max(n // 16, 1)}, ""),
+        ("kpi", "POST", "/kpi/compute",
+         {"loop_id": "warmup", "series": {**series, "sp": s["sp"].tolist()}}, ""),
+    ]
+
+
+def _warm_partials(n: int):
+    from .partials import assemble, block_partials
+    s = synthetic_series(n)
+    blocks = block_partials(max(n // 4, 1), s["ts"], s["pv"], s["op"])
+    assemble([blocks[b] for b in sorted(blocks)])
+
+
+def warm_up(app, sizes=WARMUP_SIZES, rounds: int = 2) -> dict:
+    # {case: [seconds per round]}; raises if an endpoint does not answer 200
+    async def run():
+        timings = {}
+        for n in sizes:
+            for name, method, path, body, query in _cases(n):
+                data = body if isinstance(body, bytes) else json.dumps(body).encode()
+                content_type = "application/octet-stream" if isinstance(body, bytes) else "application/json"
+                for _ in range(max(1, rounds)):
+                    started = time.perf_counter()
+                    status = await _request(app, method, path, data, query, content_type)
+                    if status != 200:
+                        raise RuntimeError(f"warm-up {path} ({n} samples) answered {status}")
+                    timings.setdefault(f"{name}/{n}", []).append(time.perf_counter() - started)
+            for _ in range(max(1, rounds)):
+                started = time.perf_counter()
+                _warm_partials(n)
+                timings.setdefault(f"partials/{n}", []).append(time.perf_counter() - started)
+        return timings
+
+    return asyncio.run(run())
@@ -0,0 +1,111 @@
+import threading
+
+import pytest
+from fastapi.testclient import TestClient
+
+from diagnostics_service.jobs import CANCELLED, DONE, QUEUED, JobScheduler, JobStore
+
+
+def recorder(gate=None):
+    ran = []
+
+    def handler(payload):
+        if gate is not None:
+            gate.wait(5)
+        ran.append(payload["name"])
+        return {"name": payload["name"]}
+    return ran, handler
+
+
+def drain(scheduler, jobs):
+    for job in jobs:
+        for _ in range(500):
+            if scheduler.get(job.id).state not in (QUEUED, "running"):
+                break
+            threading.Event().wait(0.01)
+    scheduler.stop()
+
+
+def test_interactive_jobs_go_first():
+    ran, handler = recorder()
+    scheduler = JobScheduler({"echo": handler}, workers=1, reserved_interactive=0)
+    jobs = [scheduler.submit("echo", {"name": name}, priority)
+            for name, priority in (("b1", "batch"), ("b2", "batch"), ("i1", "interactive"), ("i2", "interactive"))]
+    scheduler.start()
+    drain(scheduler, jobs)
+    assert ran == ["i1", "i2", "b1", "b2"]
+
+
+def test_requesters_take_turns():
+    ran, handler = recorder()
+    scheduler = JobScheduler({"echo": handler}, workers=1, reserved_interactive=0)
+    jobs = [scheduler.submit("echo", {"name": name}, requester=name[0])
+            for name in ("a1", "a2", "a3", "b1")]
+    scheduler.start()
+    drain(scheduler, jobs)
+    assert ran == ["a1", "b1", "a2", "a3"]
+
+
+def test_cancel_queued_and_running():
+    gate = threading.Event()
+    ran, handler = recorder(gate)
+    scheduler = JobScheduler({"echo": handler}, workers=1, reserved_interactive=0)
+    running = scheduler.submit("echo", {"name": "running"})
+    queued = scheduler.submit("echo", {"name": "queued"})
+    scheduler.start()
+    while scheduler.get(running.id).state == QUEUED:
+        threading.Event().wait(0.01)
+    assert scheduler.cancel(queued.id).state == CANCELLED
+    assert scheduler.cancel(running.id).state == CANCELLED
+    gate.set()
+    drain(scheduler, [running])
+    assert ran == ["running"]
+    assert scheduler.get(running.id).result is None
+    assert scheduler.stats()["completed"][CANCELLED] == 2
+
+
+def test_workers_share_the_store(tmp_path):
+    path = str(tmp_path / "jobs.db")
+    ran, handler = recorder()
+    first = JobScheduler({"echo": handler}, workers=1, store=JobStore(path))
+    second = JobScheduler({"echo": handler}, workers=1, store=JobStore(path))
+    second.recover = False
+    jobs = [first.submit("echo", {"name": name}) for name in ("a", "b", "c")]
+
+    # Seen and cancelled through the worker that did not accept it
+    assert second.get(jobs[0].id).state == QUEUED
+    assert second.cancel(jobs[0].id).state == CANCELLED
+    assert second.stats()["queued"]["batch"] == 2
+
+    # Both hold the queued jobs after a start; each runs exactly once
+    second.start()
+    first.start()
+    drain(first, jobs)
+    drain(second, jobs)
+    assert sorted(ran) == ["b", "c"]
+    assert first.get(jobs[0].id).state == CANCELLED
+    assert all(second.get(job.id).state == DONE for job in jobs[1:])
+
+
+@pytest.fixture
+def client(monkeypatch):
+    monkeypatch.setenv("DIAG_WARMUP", "0")
+    from diagnostics_service import app as app_module
+    with TestClient(app_module.app) as client:
+        yield client
+
+
+def test_job_api(client):
+    n = 120
+    payload = {"loop_id": "FIC-101", "series": {"ts": list(range(n)), "pv": [50.0 + i % 7 for i in range(n)],
+                                                 "op": [40.0 + i % 5 for i in range(n)], "sp": [50.0] * n}}
+    response = client.post("/diagnostics/jobs", json={"kind": "kpi", "payload": payload, "priority": "interactive"})
+    assert response.status_code == 202
+    job_id = response.json()["id"]
+
+    job = client.get(f"/diagnostics/jobs/{job_id}", params={"wait": 10}).json()
+    assert job["state"] == DONE
+    assert job["result"]["loop_id"] == "FIC-101"
+    assert client.delete(f"/diagnostics/jobs/{job_id}").status_code == 409
+    assert client.get("/diagnostics/jobs/unknown").status_code == 404
+    assert client.post("/diagnostics/jobs", json={"kind": "kpi", "payload": {}}).status_code == 422
@@ -0,0 +1,104 @@
+import pytest
+from fastapi.testclient import TestClient
+
+from diagnostics_service.kpi import KPI_FIELDS, compute_kpis, empty_kpis, round_js
+
+# Out of time order; one bad-quality sample, a missing PV and a missing SP,
+# OP on and beyond both saturation bounds, a missing valve position and
+# valve positions saturated at 0 and 100
+TS = [1700000005, 1700000000, 1700000002, 1700000001, 1700000003, 1700000004, 1700000006, 1700000007,
+      1700000008, 1700000009, 1700000010, 1700000011, 1700000012, 1700000013]
+PV = [50.4, 49.0, 50.2, 49.6, None, 51.0, 50.9, 50.1, 49.7, 50.3, 55.8, 55.2, 54.6, 55.1]
+OP = [95.0, 40.0, 5.0, 42.5, 44.0, 3.0, 97.5, 60.0, 60.0, 58.25, 61.0, 61.0, 59.5, 62.0]
+SP = [50.0, 50.0, 50.0, 50.0, 50.0, 50.0, 50.0, None, 50.0, 50.0, 55.0, 55.0, 55.0, 55.4]
+MODE = ["AUT", "MAN", "AUT", "auto", "AUT", "CAS", None, "AUT", "AUT", "AUT", "MAN", "MAN", "cas", "AUT"]
+VALVE = [100.0, 39.5, 0.0, 42.0, 43.0, None, 100.0, 59.0, 59.5, 58.0, 60.5, 61.0, 59.0, 61.5]
+QUALITY = [192, 192, 192, 192, 192, 192, 192, 192, 192, 0, 192, 192, 192, 192]
+
+UNSET = dict(settling_time=None, overshoot=None, rise_time=None, process_gain=None, time_constant=None,
+             dead_time=None)
+
+# calculateKPIs in backend/kpi-worker/src/index.js on the same samples (None as null)
+EXPECTED = dict(
+    service_factor=0.636364, effective_sf=0.404959, sat_percent=0.363636, saturation=0.363636,
+    output_travel=179.0, valve_travel=191.0, valve_reversals=5, pi=0.939352, rpi=0.597769,
+    osc_index=0.645825, stiction=0.870768, deadband=1.0, peak_error=1.0, integral_error=0.536,
+    derivative_error=0.67, control_error=0.617, noise_level=2.166667, setpoint_changes=1, mode_changes=9,
+    **UNSET,
+)
+# ... with every sample of good quality
+EXPECTED_ALL_GOOD = dict(
+    service_factor=0.666667, effective_sf=0.444444, sat_percent=0.333333, saturation=0.333333,
+    output_travel=182.5, valve_travel=194.0, valve_reversals=5, pi=0.940221, rpi=0.626814,
+    osc_index=0.702837, stiction=0.858556, deadband=1.5, peak_error=1.0, integral_error=0.517,
+    derivative_error=0.609, control_error=0.597, noise_level=1.83, setpoint_changes=1, mode_changes=9,
+    **UNSET,
+)
+# ... on a single saturated sample without a valve position
+EXPECTED_SINGLE = dict(
+    service_factor=1.0, effective_sf=0.0, sat_percent=1.0, saturation=1.0, output_travel=0.0,
+    valve_travel=None, valve_reversals=0, pi=0.0, rpi=0.0, osc_index=0.0, stiction=0.0, deadband=None,
+    peak_error=0.5, integral_error=0.5, derivative_error=None, control_error=0.5, noise_level=0.0,
+    setpoint_changes=0, mode_changes=0, **UNSET,
+)
+
+
+def test_matches_the_worker():
+    assert compute_kpis(TS, PV, OP, SP, MODE, VALVE, QUALITY) == EXPECTED
+    # Without quality codes every sample counts as good
+    assert compute_kpis(TS, PV, OP, SP, MODE, VALVE) == EXPECTED_ALL_GOOD
+    assert compute_kpis(TS, PV, OP, SP, MODE, VALVE, [192] * len(TS)) == EXPECTED_ALL_GOOD
+    assert compute_kpis([1], [50.5], [2.0], [50.0], ["AUT"], [None]) == EXPECTED_SINGLE
+
+
+def test_no_valid_samples():
+    assert compute_kpis(TS, PV, OP, SP, MODE, VALVE, [0] * len(TS)) == empty_kpis()
+    assert compute_kpis([1, 2], [None, 50.0], [40.0, None], [50.0, 50.0]) == empty_kpis()
+    assert compute_kpis([], [], [], []) == empty_kpis()
+    assert set(empty_kpis()) == set(KPI_FIELDS)
+
+
+@pytest.mark.parametrize("value, decimals, expected", [
+    # Math.round: halves go up, negative halves towards zero
+    (2.5, 0, 3.0), (-2.5, 0, -2.0), (-0.5, 0, 0.0), (0.125, 2, 0.13), (-0.125, 2, -0.12),
+    (1.0005, 3, 1.001), (-1.0005, 3, -1.0), (2.675, 2, 2.68), (-0.0000125, 6, -0.000012),
+])
+def test_round_js(value, decimals, expected):
+    assert round_js(value, decimals) == expected
+
+
+@pytest.fixture(scope="module")
+def client():
+    from diagnostics_service import app as app_module
+    with TestClient(app_module.app) as client:
+        yield client
+
+
+def series(**overrides):
+    return {"ts": TS, "pv": PV, "op": OP, "sp": SP, "mode": MODE, "valve_position": VALVE,
+            "quality_code": QUALITY, **overrides}
+
+
+def test_compute_endpoint(client):
+    resp = client.post("/kpi/compute", json={"loop_id": "FIC-101", "series": series()})
+    assert resp.status_code == 200
+    body = resp.json()
+    assert body["loop_id"] == "FIC-101"
+    assert {name: body[name] for name in EXPECTED} == EXPECTED
+
+    resp = client.post("/kpi/compute", json={"loop_id": "FIC-101", "series": series(quality_code=[192])})
+    assert resp.status_code == 422
+
+
+def test_batch_endpoint(client):
+    items = [
+        {"loop_id": "FIC-101", "series": series()},
+        {"loop_id": "FIC-102", "series": series(quality_code=None)},
+        {"loop_id": "FIC-103", "series": series(quality_code=[0] * len(TS))},
+    ]
+    resp = client.post("/kpi/compute/batch", json={"items": items})
+    assert resp.status_code == 200
+    results = resp.json()["results"]
+    assert [r["loop_id"] for r in results] == ["FIC-101", "FIC-102", "FIC-103"]
+    for result, expected in zip(results, (EXPECTED, EXPECTED_ALL_GOOD, empty_kpis())):
+        assert {name: result[name] for name in expected} == expected
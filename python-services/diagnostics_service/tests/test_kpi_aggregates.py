@@ -0,0 +1,71 @@
+import math
+
+import numpy as np
+import pytest
+
+from diagnostics_service.kpi import compute_kpis
+from diagnostics_service.kpi_aggregates import BucketStore, KpiAggregator, bucket_aggregates, merge_aggregates
+
+T0 = 1_700_000_000.0
+
+
+def loop_samples(n: int, seed: int = 0):
+    rng = np.random.default_rng(seed)
+    ts = T0 + np.arange(n, dtype=float)
+    sp = np.where(np.arange(n) % 500 < 250, 50.0, 55.0)
+    pv = sp + np.sin(ts / 40) + 0.2 * rng.standard_normal(n)
+    op = np.clip(40 + 30 * np.sin(ts / 60) + np.round(rng.standard_normal(n), 1), 0, 100)
+    mode = np.where(np.arange(n) % 700 < 600, "AUT", "MAN").tolist()
+    valve = (op + 0.5 * rng.standard_normal(n)).tolist()
+    quality = np.where(rng.random(n) < 0.02, 0, 192).tolist()
+    pv[rng.random(n) < 0.01] = np.nan
+    return ts, pv.tolist(), op.tolist(), sp.tolist(), mode, valve, quality
+
+
+def assert_same_kpis(merged, full):
+    assert merged.keys() == full.keys()
+    for name, value in full.items():
+        if value is None or merged[name] is None:
+            assert merged[name] == value, name
+        else:
+            assert merged[name] == pytest.approx(value, rel=1e-9, abs=1e-9), name
+
+
+@pytest.mark.parametrize("bucket_s", [5, 60, 900, 3600])
+def test_merged_buckets_match_full_recompute(bucket_s):
+    # 5 s buckets hold fewer samples than the stiction lag edge
+    samples = loop_samples(4000)
+    buckets = bucket_aggregates(bucket_s, *samples)
+    merged = merge_aggregates(buckets[b] for b in sorted(buckets))
+    assert_same_kpis(merged.kpis(), compute_kpis(*samples))
+
+
+def test_round_trip_through_json(tmp_path):
+    samples = loop_samples(3000, seed=1)
+    buckets = bucket_aggregates(600, *samples)
+    store = BucketStore(str(tmp_path))
+    for start, agg in buckets.items():
+        store.save("FIC/101", start, agg)
+    loaded = BucketStore(str(tmp_path)).load("FIC/101", 0, 2 ** 40)
+    assert sorted(loaded) == sorted(buckets)
+    assert_same_kpis(merge_aggregates(loaded[b] for b in sorted(loaded)).kpis(),
+                     merge_aggregates(buckets[b] for b in sorted(buckets)).kpis())
+
+
+def test_window_reuses_cached_buckets(tmp_path):
+    ts, *columns = loop_samples(7200, seed=2)
+    end, window_s = T0 + 7200, 5400
+    aggregator = KpiAggregator(BucketStore(str(tmp_path)), bucket_s=900, retention_s=86400)
+    first, info = aggregator.window("FIC-101", end - 1800, window_s, ts, *columns)
+    assert info["buckets_cached"] == 0
+    since = info["cached_until"]
+
+    # Only the samples the cache does not cover yet
+    fresh = np.flatnonzero(ts >= since)
+    kpis, info = aggregator.window("FIC-101", end, window_s, ts[fresh], *([c[i] for i in fresh] for c in columns))
+    start = math.floor((end - window_s) / 900) * 900
+    assert info["window_start"] == start
+    assert info["buckets_cached"] == (since - start) // 900
+
+    inside = np.flatnonzero((ts >= start) & (ts < end))
+    assert_same_kpis(kpis, compute_kpis(ts[inside], *([c[i] for i in inside] for c in columns)))
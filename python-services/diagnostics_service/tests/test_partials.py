@@ -0,0 +1,118 @@
+import numpy as np
+import pytest
+
+from diagnostics_service.oscillation import dominant_period_fft, oscillation_index_acf
+from diagnostics_service.partials import PartialBlockError, PartialsAggregator, assemble, block_partials
+from diagnostics_service.stiction import cross_corr_index
+
+T0 = 1_700_000_000.0
+
+
+def sticky_loop(n: int, dt: float = 1.0, period: float = 120.0, seed: int = 0):
+    rng = np.random.default_rng(seed)
+    ts = T0 + np.arange(n) * dt
+    pv = 405 + np.sin(2 * np.pi * ts / period) + 0.3 * rng.standard_normal(n)
+    op = 50 + 3 * np.sign(np.sin(2 * np.pi * (ts - 7) / period)) + 0.2 * rng.standard_normal(n)
+    return ts, pv, op
+
+
+def full(ts, pv, op):
+    p, o = pv - pv.mean(), op - op.mean()
+    return cross_corr_index(o, p), oscillation_index_acf(p), dominant_period_fft(p, ts)
+
+
+def assembled(block_s, ts, pv, op, **kw):
+    blocks = block_partials(block_s, ts, pv, op, **kw)
+    return assemble([blocks[b] for b in sorted(blocks)], **kw)
+
+
+@pytest.mark.parametrize("n, block_s", [(3000, 600), (6000, 3600), (4000, 100)])
+def test_blocks_match_full_recompute(n, block_s):
+    ts, pv, op = sticky_loop(n)
+    result = assembled(block_s, ts, pv, op)
+    xcorr, osc_index, _ = full(ts, pv, op)
+    assert result["samples"] == n
+    assert result["stiction_xcorr"] == pytest.approx(xcorr, abs=1e-9)
+    assert result["osc_index"] == pytest.approx(osc_index, abs=1e-9)
+
+
+def test_welch_period_of_dense_loop():
+    ts, pv, op = sticky_loop(3 * 3600)
+    assert assembled(3600, ts, pv, op)["osc_period_s"] == pytest.approx(120.0, rel=0.05)
+
+
+@pytest.mark.parametrize("dt", [2.0, 5.0, 30.0])
+def test_sparse_loop_period_matches_full_recompute(dt):
+    # Under WELCH_SEGMENT samples per block: no Welch segment anywhere
+    ts, pv, op = sticky_loop(int(2 * 86400 / dt), dt=dt, period=40 * dt)
+    result = assembled(3600, ts, pv, op)
+    period = dominant_period_fft(pv - pv.mean(), ts)
+    assert period is not None
+    assert result["osc_period_s"] == pytest.approx(period, rel=1e-12)
+
+
+@pytest.fixture
+def aggregator(tmp_path):
+    return PartialsAggregator(str(tmp_path / "partials.db"), block_s=3600, settle_s=120)
+
+
+def test_incremental_window_matches_full(aggregator):
+    ts, pv, op = sticky_loop(12 * 3600)
+    end = ts[-1] + 1
+    cold, info = aggregator.window("L1", end, 6 * 3600, ts, pv, op)
+    assert info["blocks_cached"] == 0 and info["cached_until"] is not None
+
+    recent = ts >= info["cached_until"]
+    warm, warm_info = aggregator.window("L1", end, 6 * 3600, ts[recent], pv[recent], op[recent])
+    assert warm_info["blocks_cached"] > 0 and warm_info["blocks_missing"] == 0
+    assert warm == cold
+
+    inside = ts >= info["window_start"]
+    xcorr = full(ts[inside], pv[inside], op[inside])[0]
+    assert warm["stiction_xcorr"] == pytest.approx(xcorr, abs=1e-9)
+
+
+def test_whole_block_resend_replaces_it(aggregator):
+    ts, pv, op = sticky_loop(6 * 3600)
+    end = ts[-1] + 1
+    _, info = aggregator.window("L1", end, 6 * 3600, ts, pv, op)
+
+    late = pv.copy()
+    late[10000:10100] += 5
+    block = np.floor(ts[10000] / 3600) * 3600
+    resend = ((ts >= block) & (ts < block + 3600)) | (ts >= info["cached_until"])
+    result, info = aggregator.window("L1", end, 6 * 3600, ts[resend], late[resend], op[resend])
+    assert info["blocks_missing"] == 0
+
+    inside = ts >= info["window_start"]
+    assert result["stiction_xcorr"] == pytest.approx(full(ts[inside], late[inside], op[inside])[0], abs=1e-9)
+
+
+def test_partial_resend_is_rejected(aggregator):
+    ts, pv, op = sticky_loop(6 * 3600)
+    end = ts[-1] + 1
+    aggregator.window("L1", end, 6 * 3600, ts, pv, op)
+
+    block = np.floor(ts[10000] / 3600) * 3600
+    late_only = (ts >= block + 600) & (ts < block + 900)
+    with pytest.raises(PartialBlockError) as error:
+        aggregator.window("L1", end, 6 * 3600, ts[late_only], pv[late_only], op[late_only])
+    assert error.value.blocks == [int(block)]
+
+    # Also inside the window's first block
+    first = (ts >= end - 6 * 3600 + 300) & (ts < end - 6 * 3600 + 400)
+    with pytest.raises(PartialBlockError):
+        aggregator.window("L1", end, 6 * 3600, ts[first], pv[first], op[first])
+
+    # Nothing was replaced
+    _, info = aggregator.window("L1", end, 6 * 3600, ts[:0], pv[:0], op[:0])
+    assert info["blocks_missing"] == 1
+
+
+def test_sliding_full_window_posts_are_accepted(aggregator):
+    # A client posting [end - window_s, end) every time cuts the stored first block
+    ts, pv, op = sticky_loop(2 * 86400)
+    for end in (T0 + 86400 + 1800, T0 + 86400 + 2400):
+        inside = (ts >= end - 86400) & (ts < end)
+        result, info = aggregator.window("L1", end, 86400, ts[inside], pv[inside], op[inside])
+    assert info["blocks_cached"] >= 1
@@ -0,0 +1,100 @@
+import numpy as np
+import pytest
+from fastapi.testclient import TestClient
+
+from diagnostics_service.quality import flatline, interpolate, screen, spikes, valid_stretch
+
+
+def loop(n: int = 600, seed: int = 0):
+    rng = np.random.default_rng(seed)
+    ts = np.arange(n, dtype=float)
+    pv = 50 + np.sin(2 * np.pi * ts / 60) + 0.1 * rng.standard_normal(n)
+    op = 40 + 2 * np.sign(np.sin(2 * np.pi * (ts - 5) / 60)) + 0.1 * rng.standard_normal(n)
+    return ts, pv, op
+
+
+def test_flatline_and_spike_masks():
+    x = np.arange(200, dtype=float)
+    x[50:120] = 7.0
+    assert np.flatnonzero(flatline(x, 60)).tolist() == list(range(50, 120))
+    assert not flatline(x, 71).any()
+
+    _, pv, _ = loop()
+    stepped = pv.copy()
+    stepped[400:] += 50
+    pv[300] += 50
+    assert np.flatnonzero(spikes(pv)).tolist() == [300]
+    assert not spikes(stepped).any()
+
+
+def test_screen_is_stacked_and_limits_are_optional():
+    ts, pv, op = loop()
+    op[10:20] = 101.0
+    result = screen(np.stack([ts, ts]), np.stack([pv, pv]), np.stack([op, op]), op_max=np.array([np.nan, 100.0]))
+    assert result["valid_samples"].tolist() == [600, 590]
+    assert not result["flags"]["range"][0].any()
+
+
+def test_valid_stretch_bridges_short_gaps():
+    valid = np.ones(100, dtype=bool)
+    valid[[0, 20, 21]] = False    # leading sample is not bridged, a 2-sample gap is
+    valid[40:50] = False          # too long to bridge
+    assert valid_stretch(valid, max_fill=3) == slice(50, 100)
+    valid[60:90] = False
+    assert valid_stretch(valid, max_fill=3) == slice(1, 40)
+    assert valid_stretch(np.zeros(5, dtype=bool)) == slice(0, 0)
+
+
+def test_interpolate_masked_samples():
+    x = np.array([0.0, 1.0, 99.0, 99.0, 4.0])
+    valid = np.array([True, True, False, False, True])
+    assert interpolate(x, valid).tolist() == [0.0, 1.0, 2.0, 3.0, 4.0]
+    assert interpolate(x, np.ones(5, dtype=bool)) is x
+
+
+@pytest.fixture(scope="module")
+def client():
+    from diagnostics_service import app as app_module
+    with TestClient(app_module.app) as client:
+        yield client
+
+
+def run(client, ts, pv, op, **kw):
+    body = {"loop_id": "FIC-101", "series": {"ts": list(ts), "pv": list(pv), "op": list(op), **kw.pop("series", {})}}
+    return client.post("/diagnostics/run", json={**body, **kw})
+
+
+def test_unscreened_run_truncates(client):
+    ts, pv, op = loop()
+    response = run(client, ts, pv, op[:500])
+    assert response.status_code == 200
+    assert response.json() == run(client, ts[:500], pv[:500], op[:500]).json()
+    assert response.json()["quality_score"] is None
+    assert run(client, ts, pv, op[:500], screen=True).status_code == 422
+
+
+def test_screened_run_interpolates_spikes(client):
+    ts, pv, op = loop()
+    clean = run(client, ts, pv, op).json()
+    pv[[100, 300, 450]] += 40
+    result = run(client, ts, pv, op, screen=True).json()
+    assert result["quality_flags"]["pv_spike"] == 3
+    assert result["analysed_samples"] == 600
+    assert result["classification"] == clean["classification"]
+    assert result["stiction_xcorr"] == pytest.approx(clean["stiction_xcorr"], abs=0.02)
+
+
+def test_screened_run_analyses_longest_stretch(client):
+    ts, pv, op = loop()
+    mode = ["AUT"] * 600
+    mode[380:420] = ["MAN"] * 40
+    result = run(client, ts, pv, op, screen=True, series={"mode": mode}).json()
+    assert result["valid_samples"] == 560
+    assert result["analysed_samples"] == 380
+    expected = run(client, ts[:380], pv[:380], op[:380]).json()
+    assert result["stiction_xcorr"] == pytest.approx(expected["stiction_xcorr"], abs=1e-12)
+
+    # Plenty of valid samples, but no stretch long enough
+    mode = (["AUT"] * 20 + ["MAN"] * 10) * 20
+    result = run(client, ts, pv, op, screen=True, series={"mode": mode}).json()
+    assert result["classification"] == "bad_data"
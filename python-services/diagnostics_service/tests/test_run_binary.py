@@ -0,0 +1,108 @@
+import numpy as np
+import pytest
+from fastapi.testclient import TestClient
+
+
+def loop(n: int = 600, seed: int = 0):
+    rng = np.random.default_rng(seed)
+    ts = 1_700_000_000.0 + np.arange(n)
+    pv = 50 + np.sin(2 * np.pi * ts / 60) + 0.1 * rng.standard_normal(n)
+    op = 40 + 2 * np.sign(np.sin(2 * np.pi * (ts - 5) / 60)) + 0.1 * rng.standard_normal(n)
+    return ts, pv, op
+
+
+@pytest.fixture(scope="module")
+def client():
+    from diagnostics_service import app as app_module
+    with TestClient(app_module.app) as client:
+        yield client
+
+
+def post_binary(client, body: bytes, fields: str = "ts,pv,op", screen: bool = False):
+    return client.post("/diagnostics/run/binary", content=body,
+                       params={"loop_id": "FIC-101", "fields": fields, "screen": screen},
+                       headers={"Content-Type": "application/octet-stream"})
+
+
+def run_json(client, ts, pv, op, screen: bool = False):
+    series = {"ts": ts.tolist(), "pv": pv.tolist(), "op": op.tolist()}
+    resp = client.post("/diagnostics/run", json={"loop_id": "FIC-101", "series": series, "screen": screen})
+    assert resp.status_code == 200
+    return resp.json()
+
+
+def test_binary_matches_json(client):
+    ts, pv, op = loop()
+    expected = run_json(client, ts, pv, op)
+    resp = post_binary(client, np.concatenate([ts, pv, op]).astype("<f8").tobytes())
+    assert resp.status_code == 200
+    assert resp.json() == expected
+    # Columns in any order, SP accepted and ignored
+    resp = post_binary(client, np.concatenate([op, ts, np.full(len(ts), 50.0), pv]).tobytes(), "op,ts,sp,pv")
+    assert resp.json() == expected
+
+
+@pytest.mark.parametrize("fields", ["ts,pv", "ts,pv,op,mode", ""])
+def test_binary_rejects_bad_fields(client, fields):
+    ts, pv, op = loop()
+    assert post_binary(client, np.concatenate([ts, pv, op]).tobytes(), fields).status_code == 422
+
+
+def test_binary_rejects_bad_lengths_and_dtypes(client):
+    ts, pv, op = loop()
+    body = np.concatenate([ts, pv, op])
+    # Not a whole number of float64 columns
+    assert post_binary(client, body.tobytes()[:-8]).status_code == 422
+    assert post_binary(client, body.tobytes() + b"\0").status_code == 422
+    # Too few samples
+    assert post_binary(client, b"").status_code == 422
+    assert post_binary(client, np.concatenate([ts[:1], pv[:1], op[:1]]).tobytes()).status_code == 422
+    # float32, big-endian and text bodies whose lengths happen to fit
+    for bad in (np.concatenate([body, body]).astype("<f4"), body.astype(">f8")):
+        resp = post_binary(client, bad.tobytes())
+        assert resp.status_code == 422
+        assert "little-endian float64" in resp.json()["detail"]
+    assert post_binary(client, b"1700000000.0,50.0,40.0\n" * 24).status_code == 422
+
+
+def test_binary_nan_handling(client):
+    ts, pv, op = loop()
+    pv[[10, 200]] = np.nan
+    op[300] = np.inf
+    body = np.concatenate([ts, pv, op]).tobytes()
+
+    # Unscreened: samples with a non-finite PV or OP are dropped
+    keep = np.isfinite(pv) & np.isfinite(op)
+    resp = post_binary(client, body)
+    assert resp.status_code == 200
+    assert resp.json() == run_json(client, ts[keep], pv[keep], op[keep])
+    assert resp.json()["osc_index"] is not None
+
+    # Screened: flagged as missing and interpolated over
+    resp = post_binary(client, body, screen=True)
+    assert resp.status_code == 200
+    assert resp.json()["valid_samples"] == len(ts) - 3
+    assert resp.json()["classification"] != "bad_data"
+
+    # Nothing left to diagnose
+    pv[:] = np.nan
+    assert post_binary(client, np.concatenate([ts, pv, op]).tobytes()).status_code == 422
+    resp = post_binary(client, np.concatenate([ts, pv, op]).tobytes(), screen=True)
+    assert resp.json()["classification"] == "bad_data"
+
+    # Missing or unordered times are rejected, screened or not
+    ts[5] = np.nan
+    assert post_binary(client, np.concatenate([ts, pv, op]).tobytes(), screen=True).status_code == 422
+    ts[5], ts[6] = ts[7], ts[4]
+    assert post_binary(client, np.concatenate([ts, pv, op]).tobytes()).status_code == 422
+
+
+def test_batch_matches_single_runs(client):
+    items = []
+    for seed, screen in ((0, False), (1, True), (2, False)):
+        ts, pv, op = loop(300 + 100 * seed, seed)
+        items.append({"loop_id": f"L{seed}", "series": {"ts": ts.tolist(), "pv": pv.tolist(), "op": op.tolist()},
+                      "screen": screen})
+    resp = client.post("/diagnostics/run/batch", json={"items": items})
+    assert resp.status_code == 200
+    assert resp.json()["results"] == [client.post("/diagnostics/run", json=item).json() for item in items]
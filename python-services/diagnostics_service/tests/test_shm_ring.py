@@ -0,0 +1,147 @@
+import time
+import uuid
+
+import numpy as np
+import pytest
+from fastapi.testclient import TestClient
+
+from diagnostics_service import shm_ring
+from diagnostics_service.shm_ring import H_HEAD, H_RESERVE, READ_RETRIES, RingReader, segment_name
+
+writer_module = pytest.importorskip("data_streaming_service.shm_ring")
+RingWriter = writer_module.RingWriter
+
+
+@pytest.fixture
+def prefix():
+    return f"clpm_test_{uuid.uuid4().hex[:8]}_"
+
+
+@pytest.fixture
+def rings(prefix):
+    writers, readers = [], []
+
+    def make(loop_id, capacity, max_age_s=120.0):
+        writer = RingWriter(writer_module.segment_name(prefix, loop_id), capacity)
+        reader = RingReader(prefix, max_age_s)
+        writers.append(writer)
+        readers.append(reader)
+        return writer, reader
+
+    yield make
+    for reader in readers:
+        reader.close()
+    for writer in writers:
+        if hasattr(writer, "header"):
+            writer.close()
+
+
+def write(writer, ts):
+    ts = np.asarray(ts, dtype=float)
+    writer.write(ts, ts + 0.25, ts + 0.5, np.full(len(ts), 50.0))
+
+
+def test_segment_names_match_the_writer():
+    for loop_id in ("FIC-101", "TIC 201/PV", "ü"):
+        assert segment_name("p_", loop_id) == writer_module.segment_name("p_", loop_id)
+
+
+def test_window_across_wraparound(rings):
+    writer, reader = rings("FIC-101", capacity=10)
+    now = time.time()
+    for lo in range(0, 25, 7):
+        write(writer, now - 25 + np.arange(lo, min(25, lo + 7)))
+
+    ts, pv, op, sp = reader.window("FIC-101", 100)
+    assert ts.tolist() == (now - 25 + np.arange(15, 25)).tolist()
+    assert pv.tolist() == (ts + 0.25).tolist() and op.tolist() == (ts + 0.5).tolist()
+    assert (sp == 50.0).all()
+    # Newer than the newest sample less 3.5 s, split over the wrap point
+    assert reader.window("FIC-101", 3.5)[0].tolist() == (now - 25 + np.arange(21, 25)).tolist()
+    # One write larger than the ring keeps its newest samples
+    write(writer, now + np.arange(-30, 0))
+    assert reader.window("FIC-101", 100)[0].tolist() == (now + np.arange(-10, 0)).tolist()
+
+
+def test_torn_read_retries_outside_the_lock(rings, monkeypatch):
+    writer, reader = rings("FIC-101", capacity=10)
+    now = time.time()
+    write(writer, now + np.arange(-5, 0))
+    head = int(writer.header[H_HEAD])
+    state = {"sleeps": 0, "finish_after": 2}
+
+    def sleep(seconds):
+        assert not reader.lock.locked()
+        state["sleeps"] += 1
+        if state["sleeps"] == state["finish_after"]:
+            # The write in progress completes
+            writer.header[H_RESERVE] = head
+
+    monkeypatch.setattr(shm_ring.time, "sleep", sleep)
+    writer.header[H_RESERVE] = head + 1
+    assert reader.window("FIC-101", 100)[0].tolist() == (now + np.arange(-5, 0)).tolist()
+    assert state["sleeps"] == 2
+
+    # A write that never completes: given up after READ_RETRIES attempts
+    state.update(sleeps=0, finish_after=None)
+    writer.header[H_RESERVE] = head + 1
+    assert reader.window("FIC-101", 100) is None
+    assert state["sleeps"] == READ_RETRIES - 1
+    writer.header[H_RESERVE] = head
+
+
+def test_reattach_after_writer_restarts(rings, prefix):
+    writer, reader = rings("FIC-101", capacity=10, max_age_s=60)
+    now = time.time()
+    write(writer, now - 200 + np.arange(5))
+    # Attached, but the newest sample is too old
+    assert reader.window("FIC-101", 100) is None
+    assert "FIC-101" in reader.rings
+
+    # The writer restarts: the old segment is unlinked, a new one created
+    writer.close()
+    restarted = RingWriter(segment_name(prefix, "FIC-101"), 20)
+    try:
+        write(restarted, now + np.arange(-12, 0))
+        assert reader.window("FIC-101", 100)[0].tolist() == (now + np.arange(-12, 0)).tolist()
+        assert reader.rings["FIC-101"].capacity == 20
+    finally:
+        reader.close()
+        restarted.close()
+
+
+def test_missing_loop(rings):
+    _, reader = rings("FIC-101", capacity=10)
+    assert reader.window("FIC-101", 100) is None  # nothing written yet
+    assert reader.window("TIC-201", 100) is None
+
+
+@pytest.fixture
+def client(monkeypatch, prefix):
+    monkeypatch.setenv("DIAG_WARMUP", "0")
+    monkeypatch.setenv("SHM_RING_PREFIX", prefix)
+    from diagnostics_service import app as app_module
+    app_module._ring_reader.cache_clear()
+    with TestClient(app_module.app) as client:
+        yield client
+    app_module._ring_reader().close()
+    app_module._ring_reader.cache_clear()
+
+
+def test_run_recent_endpoint(client, prefix):
+    writer = RingWriter(segment_name(prefix, "FIC-101"), 600)
+    try:
+        now = time.time()
+        ts = now - 600 + np.arange(600.0)
+        pv = 50 + np.sin(2 * np.pi * ts / 60)
+        op = 40 + 2 * np.sign(np.sin(2 * np.pi * (ts - 5) / 60))
+        pv[10] = np.nan
+        writer.write(ts, pv, op, np.full(600, 50.0))
+
+        resp = client.post("/diagnostics/run/recent", json={"loop_id": "FIC-101", "window_s": 300})
+        assert resp.status_code == 200
+        assert resp.json()["loop_id"] == "FIC-101"
+        resp = client.post("/diagnostics/run/recent", json={"loop_id": "TIC-201"})
+        assert resp.status_code == 404
+    finally:
+        writer.close()
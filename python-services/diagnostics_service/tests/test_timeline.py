@@ -0,0 +1,47 @@
+import numpy as np
+import pytest
+
+from diagnostics_service.oscillation import dominant_period_fft, oscillation_index_acf
+from diagnostics_service.stiction import cross_corr_index
+from diagnostics_service.timeline import classify, timeline
+
+
+def loop(n: int, jitter: float = 0.0, seed: int = 0):
+    rng = np.random.default_rng(seed)
+    ts = 1_700_000_000.0 + np.arange(n) + jitter * rng.random(n)
+    pv = 50 + np.sin(2 * np.pi * ts / 90) * (np.arange(n) > n // 3) + 0.2 * rng.standard_normal(n)
+    op = 40 + 5 * np.sign(np.sin(2 * np.pi * (ts - 9) / 90)) + 0.2 * rng.standard_normal(n)
+    # A stretch of frozen PV: flat windows score 0
+    pv[n // 5:n // 5 + 80] = 50.0
+    return ts, pv, op
+
+
+def run(ts, pv, op):
+    # The /diagnostics/run kernels on one window
+    pv, op = pv - pv.mean(), op - op.mean()
+    xcorr = cross_corr_index(op, pv)
+    period = dominant_period_fft(pv, ts)
+    oi = float(oscillation_index_acf(pv))
+    return xcorr, np.nan if period is None else period, oi, classify(xcorr, period, oi)
+
+
+@pytest.mark.parametrize("window, step, jitter", [(5, 1, 0.0), (12, 7, 0.0), (64, 16, 0.3), (300, 50, 0.0)])
+def test_windows_match_per_window_run(window, step, jitter):
+    ts, pv, op = loop(1200, jitter)
+    result = timeline(ts, pv, op, window, step)
+    starts = range(0, len(ts) - window + 1, step)
+    assert len(result["start"]) == len(starts)
+    for row, start in enumerate(starts):
+        xcorr, period, oi, classification = run(*(x[start:start + window] for x in (ts, pv, op)))
+        assert result["start"][row] == ts[start]
+        assert result["end"][row] == ts[start + window - 1]
+        assert result["stiction_xcorr"][row] == pytest.approx(xcorr, abs=1e-9)
+        assert result["osc_index"][row] == pytest.approx(oi, abs=1e-9)
+        assert result["osc_period_s"][row] == pytest.approx(period, rel=1e-12, nan_ok=True)
+        assert result["classification"][row] == classification
+
+
+def test_window_longer_than_series():
+    ts, pv, op = loop(100)
+    with pytest.raises(ValueError):
+        timeline(ts, pv, op, 101, 1)
@@ -0,0 +1,285 @@
+"""In-process stand-in for the InfluxDB 2.x write and query HTTP API.
+
+Implements just enough of the API for the CLPM Python services to run
+offline: ``/ping`` and ``/health``, line protocol writes to
+``/api/v2/write``, and the Flux query shapes issued by
+``diagnostics_client`` (pivoted PV/OP/SP rows for a set of loops, and
+``schema.tagValues`` for ``loop_id``). Samples are kept per loop in growing
+NumPy arrays.
+"""
+
+import re
+import gzip
+import json
+import time
+import threading
+import numpy as np
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, List, Optional, Tuple
+
+_LOOP_RE = re.compile(r'r\.loop_id == "((?:[^"\\]|\\.)*)"')
+_RANGE_RE = re.compile(r'range\(start:\s*([^,\s]+),\s*stop:\s*([^)\s]+)\)')
+_TAG_VALUES_RE = re.compile(r'schema\.tagValues')
+
+
+def _parse_time(value: str) -> int:
+    """Parse an RFC3339 Flux time literal to epoch nanoseconds."""
+    return int(np.datetime64(value.rstrip("Z"), "ns").astype(np.int64))
+
+
+class _LoopColumns:
+    """Growing time-ordered columns for one loop."""
+
+    def __init__(self, capacity: int = 1024):
+        self.size = 0
+        self.ts = np.empty(capacity, dtype=np.int64)
+        self.values = np.empty((3, capacity))  # pv, op, sp
+
+    def append(self, ts: np.ndarray, values: np.ndarray):
+        n = len(ts)
+        if self.size + n > len(self.ts):
+            capacity = max(2 * len(self.ts), self.size + n)
+            self.ts = np.resize(self.ts, capacity)
+            grown = np.empty((3, capacity))
+            grown[:, :self.size] = self.values[:, :self.size]
+            self.values = grown
+        self.ts[self.size:self.size + n] = ts
+        self.values[:, self.size:self.size + n] = values
+        self.size += n
+        # Writes normally arrive in time order; restore it if they did not
+        if self.size > n and ts[0] < self.ts[self.size - n - 1]:
+            order = np.argsort(self.ts[:self.size], kind="stable")
+            self.ts[:self.size] = self.ts[:self.size][order]
+            self.values[:, :self.size] = self.values[:, :self.size][:, order]
+
+    def trim_before(self, cutoff_ns: int):
+        cut = int(np.searchsorted(self.ts[:self.size], cutoff_ns))
+        if cut:
+            self.ts[:self.size - cut] = self.ts[cut:self.size]
+            self.values[:, :self.size - cut] = self.values[:, cut:self.size]
+            self.size -= cut
+
+    def range(self, start_ns: int, stop_ns: int) -> Tuple[np.ndarray, np.ndarray]:
+        ts = self.ts[:self.size]
+        lo, hi = np.searchsorted(ts, [start_ns, stop_ns])
+        return ts[lo:hi].copy(), self.values[:, lo:hi].copy()
+
+
+class SeriesStore:
+    """
+    Thread-safe per-loop sample store with write statistics.
+
+    Every write records the delay between each sample's timestamp and its
+    arrival, which is the ingest half of end-to-end freshness.
+    """
+
+    def __init__(self, retention_s: float = 3600.0):
+        """
+        Initialize the store.
+
+        Args:
+            retention_s: Samples older than this (relative to now) are dropped
+        """
+        self.retention_ns = int(retention_s * 1e9)
+        self.loops: Dict[str, _LoopColumns] = {}
+        self.lock = threading.Lock()
+        self.reset_stats()
+
+    def reset_stats(self):
+        """Reset write counters and freshness samples."""
+        with self.lock:
+            self.samples_received = 0
+            self.writes = 0
+            self.queries = 0
+            self._lags: List[np.ndarray] = []
+
+    def insert(self, loop_id: str, ts: np.ndarray, values: np.ndarray, record_lag: bool = True):
+        """
+        Insert samples for one loop.
+
+        Args:
+            loop_id: Loop identifier
+            ts: Epoch nanoseconds
+            values: ``(3, n)`` array of PV, OP and SP (NaN where missing)
+            record_lag: Count the samples in the write statistics
+        """
+        with self.lock:
+            columns = self.loops.get(loop_id)
+            if columns is None:
+                columns = self.loops[loop_id] = _LoopColumns()
+            columns.append(ts, values)
+            if record_lag:
+                self._lags.append((time.time_ns() - ts) / 1e9)
+                self.samples_received += len(ts)
+
+    def write_line_protocol(self, body: str):
+        """Parse and store a line protocol body (fields ``pv``, ``op``, ``sp``)."""
+        arrival = time.time_ns()
+        rows: Dict[str, Tuple[List[int], List[List[float]]]] = {}
+        for line in body.splitlines():
+            if not line or line.startswith("#"):
+                continue
+            head, fields, ts = line.rsplit(" ", 2)
+            loop_id = None
+            for tag in head.split(",")[1:]:
+                key, _, value = tag.partition("=")
+                if key == "loop_id":
+                    loop_id = value.replace("\\ ", " ").replace("\\,", ",").replace("\\=", "=")
+            if loop_id is None:
+                continue
+            parsed = dict(item.split("=", 1) for item in fields.split(","))
+            ts_list, values = rows.setdefault(loop_id, ([], [[], [], []]))
+            ts_list.append(int(ts))
+            for i, name in enumerate(("pv", "op", "sp")):
+                values[i].append(float(parsed[name].rstrip("i")) if name in parsed else np.nan)
+
+        cutoff = arrival - self.retention_ns
+        with self.lock:
+            self.writes += 1
+            for loop_id, (ts_list, values) in rows.items():
+                ts = np.array(ts_list, dtype=np.int64)
+                columns = self.loops.get(loop_id)
+                if columns is None:
+                    columns = self.loops[loop_id] = _LoopColumns()
+                columns.append(ts, np.array(values))
+                columns.trim_before(cutoff)
+                self._lags.append((arrival - ts) / 1e9)
+                self.samples_received += len(ts)
+
+    def query(self, loop_ids: List[str], start_ns: int, stop_ns: int) -> Dict[str, Tuple[np.ndarray, np.ndarray]]:
+        """Get ``(ts, values)`` per loop in ``[start_ns, stop_ns)``."""
+        with self.lock:
+            self.queries += 1
+            return {
+                loop_id: self.loops[loop_id].range(start_ns, stop_ns)
+                for loop_id in loop_ids if loop_id in self.loops
+            }
+
+    def ingest_lags(self) -> np.ndarray:
+        """Seconds from sample timestamp to arrival, for every sample since the last reset."""
+        with self.lock:
+            return np.concatenate(self._lags) if self._lags else np.empty(0)
+
+    def loop_ids(self) -> List[str]:
+        """Get the stored loop IDs."""
+        with self.lock:
+            return sorted(self.loops)
+
+
+def _format_csv(result: Dict[str, Tuple[np.ndarray, np.ndarray]]) -> bytes:
+    """Format query results as unannotated Flux CSV, one table per loop."""
+    tables = []
+    for table, (loop_id, (ts, values)) in enumerate(sorted(result.items())):
+        if not len(ts):
+            continue
+        times = np.char.add(np.datetime_as_string(ts.astype("datetime64[ns]"), unit="ns"), "Z")
+        valid = ~np.isnan(values[0]) & ~np.isnan(values[1])
+        lines = [",result,table,_time,loop_id,op,pv,sp"]
+        pv, op, sp = values[0].tolist(), values[1].tolist(), values[2].tolist()
+        for i in np.flatnonzero(valid).tolist():
+            s = "" if sp[i] != sp[i] else repr(sp[i])
+            lines.append(f",_result,{table},{times[i]},{loop_id},{op[i]!r},{pv[i]!r},{s}")
+        tables.append("\r\n".join(lines))
+    return ("\r\n\r\n".join(tables) + "\r\n").encode("utf-8") if tables else b""
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    store: SeriesStore = None
+
+    def log_message(self, format, *args):
+        pass
+
+    def _reply(self, status: int, body: bytes = b"", content_type: str = "text/plain"):
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        if body:
+            self.wfile.write(body)
+
+    def _body(self) -> bytes:
+        body = self.rfile.read(int(self.headers.get("Content-Length", "0")))
+        if self.headers.get("Content-Encoding") == "gzip":
+            body = gzip.decompress(body)
+        return body
+
+    def do_GET(self):
+        path = self.path.split("?")[0]
+        if path == "/ping":
+            self._reply(204)
+        elif path == "/health":
+            self._reply(200, json.dumps({"name": "influxdb", "status": "pass"}).encode(), "application/json")
+        else:
+            self._reply(404)
+
+    def do_HEAD(self):
+        self.do_GET()
+
+    def do_POST(self):
+        path = self.path.split("?")[0]
+        if path == "/api/v2/write":
+            self.store.write_line_protocol(self._body().decode("utf-8"))
+            self._reply(204)
+        elif path == "/api/v2/query":
+            self._handle_query(json.loads(self._body() or b"{}").get("query", ""))
+        else:
+            self._reply(404)
+
+    def _handle_query(self, flux: str):
+        if _TAG_VALUES_RE.search(flux):
+            body = "".join(f",_result,0,{loop_id}\r\n" for loop_id in self.store.loop_ids())
+            self._reply(200, (",result,table,_value\r\n" + body).encode(), "text/csv")
+            return
+
+        time_range = _RANGE_RE.search(flux)
+        loop_ids = [m.replace('\\"', '"').replace("\\\\", "\\") for m in _LOOP_RE.findall(flux)]
+        if not time_range or not loop_ids:
+            self._reply(400, b'{"message": "unsupported query"}', "application/json")
+            return
+        start, stop = (_parse_time(value) for value in time_range.groups())
+        self._reply(200, _format_csv(self.store.query(loop_ids, start, stop)), "text/csv")
+
+
+class InfluxStandIn:
+    """Runs the stand-in HTTP server on a background thread."""
+
+    def __init__(self, host: str = "127.0.0.1", port: int = 0, retention_s: float = 3600.0):
+        """
+        Initialize the server.
+
+        Args:
+            host: Interface to listen on
+            port: Port to listen on (0 picks a free port)
+            retention_s: Sample retention in seconds
+        """
+        self.store = SeriesStore(retention_s)
+        handler = type("Handler", (_Handler,), {"store": self.store})
+        self.server = ThreadingHTTPServer((host, port), handler)
+        self.server.daemon_threads = True
+        self._thread: Optional[threading.Thread] = None
+
+    @property
+    def url(self) -> str:
+        """Base URL of the server."""
+        host, port = self.server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def start(self):
+        """Start serving on a daemon thread."""
+        self._thread = threading.Thread(target=self.server.serve_forever, name="influx-standin", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        """Stop serving."""
+        self.server.shutdown()
+        self.server.server_close()
+
+
+if __name__ == "__main__":
+    standin = InfluxStandIn(port=8086)
+    print(f"InfluxDB stand-in listening on {standin.url} (Ctrl+C to stop)")
+    try:
+        standin.server.serve_forever()
+    except KeyboardInterrupt:
+        pass
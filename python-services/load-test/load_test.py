@@ -0,0 +1,389 @@
+#!/usr/bin/env python3
+"""End-to-end load test: streaming service -> InfluxDB stand-in -> diagnostics.
+
+Starts the data streaming service with N simulated loops writing to an
+in-process InfluxDB stand-in, and the diagnostics service under uvicorn,
+then drives a mix of diagnostics requests through ``diagnostics_client``
+while measuring ingest throughput, freshness and request latency. Runs
+fully offline.
+"""
+
+import os
+import sys
+import json
+import time
+import random
+import socket
+import tempfile
+import argparse
+import subprocess
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+import requests
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+STREAMING_SRC = os.path.join(HERE, "..", "data-streaming-service", "src")
+DIAGNOSTICS_SRC = os.path.join(HERE, "..", "diagnostics_service", "src")
+CLIENT_SRC = os.path.join(HERE, "..", "diagnostics_client", "src")
+
+# Add the service sources to the Python path
+sys.path.insert(0, HERE)
+sys.path.insert(0, STREAMING_SRC)
+sys.path.insert(0, CLIENT_SRC)
+
+from influx_standin import InfluxStandIn
+from data_streaming_service.scenarios import FaultScenarioSimulator
+from diagnostics_client.client import DiagnosticsClient
+from diagnostics_client.influx import InfluxSeriesReader
+
+REQUEST_KINDS = ("run", "binary", "batch")
+
+
+def percentiles(values) -> Dict[str, Optional[float]]:
+    """Get p50/p95/p99/max of a sequence (None when empty)."""
+    values = np.asarray(values, dtype=float)
+    if not len(values):
+        return {"p50": None, "p95": None, "p99": None, "max": None}
+    p50, p95, p99 = np.percentile(values, [50, 95, 99])
+    return {"p50": float(p50), "p95": float(p95), "p99": float(p99), "max": float(values.max())}
+
+
+def parse_mix(spec: str) -> Dict[str, float]:
+    """Parse a request mix such as ``run=0.6,binary=0.2,batch=0.2``."""
+    mix = {}
+    for item in spec.split(","):
+        if not item.strip():
+            continue
+        kind, _, weight = item.partition("=")
+        kind = kind.strip()
+        if kind not in REQUEST_KINDS:
+            raise ValueError(f"Unknown request kind {kind!r}, expected one of {REQUEST_KINDS}")
+        mix[kind] = float(weight) if weight else 1.0
+    if not mix or sum(mix.values()) <= 0:
+        raise ValueError("Request mix must have a positive weight")
+    return mix
+
+
+def free_port() -> int:
+    """Pick a free local TCP port."""
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def wait_for(url: str, timeout: float = 30.0):
+    """Wait until ``url`` answers with a 2xx status."""
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            if requests.get(url, timeout=1.0).ok:
+                return
+        except requests.RequestException:
+            pass
+        time.sleep(0.2)
+    raise TimeoutError(f"{url} did not become ready within {timeout}s")
+
+
+class ServiceProcess:
+    """A service running as a child process."""
+
+    def __init__(self, name: str, args: List[str], env: Dict[str, str], cwd: str):
+        self.name = name
+        self.log_path = os.path.join(cwd, f"{name}.log")
+        self._log = open(self.log_path, "w")
+        self.process = subprocess.Popen(
+            [sys.executable] + args, env={**os.environ, **env}, cwd=cwd,
+            stdout=self._log, stderr=subprocess.STDOUT
+        )
+
+    def stop(self):
+        """Stop the process gracefully, killing it if it does not exit."""
+        if self.process.poll() is None:
+            self.process.terminate()
+            try:
+                self.process.wait(timeout=15)
+            except subprocess.TimeoutExpired:
+                self.process.kill()
+                self.process.wait()
+        self._log.close()
+
+
+def backfill(standin: InfluxStandIn, n_loops: int, window_s: float, interval: float, seed: int):
+    """
+    Pre-load one window of history so diagnostics see full windows immediately.
+
+    Uses the same scenario simulator and loop IDs as the streaming service.
+    These samples are not counted as ingest.
+    """
+    steps = int(window_s / interval) + 1
+    simulator = FaultScenarioSimulator(n_loops=n_loops, seed=seed, dt=interval)
+    start_ns = time.time_ns() - int(steps * interval * 1e9)
+    batch = simulator.simulate(steps, start_ns)
+    for i, loop_id in enumerate(simulator.loop_ids):
+        rows = slice(i, None, n_loops)  # simulate() orders by time, then loop
+        standin.store.insert(loop_id, batch.ts[rows], np.vstack([batch.pv[rows], batch.op[rows], batch.sp[rows]]),
+                             record_lag=False)
+    return simulator.loop_ids
+
+
+class DiagnosticsDriver:
+    """
+    Issues a weighted mix of diagnostics requests from a pool of workers.
+
+    Each request reads one window from the stand-in (one query per request)
+    and diagnoses it: ``run`` posts JSON for one loop, ``binary`` posts raw
+    columns for one loop and ``batch`` diagnoses ``batch_size`` loops in one
+    call. With ``rate`` set, requests are paced to about that many per
+    second in total; otherwise every worker sends back to back.
+    """
+
+    def __init__(self, reader: InfluxSeriesReader, client: DiagnosticsClient, loop_ids: List[str],
+                 window_s: float, mix: Dict[str, float], concurrency: int = 8,
+                 rate: float = 0.0, batch_size: int = 10, seed: int = 0):
+        self.reader = reader
+        self.client = client
+        self.loop_ids = loop_ids
+        self.window_s = window_s
+        self.kinds = list(mix)
+        self.weights = [mix[kind] for kind in self.kinds]
+        self.concurrency = concurrency
+        self.rate = rate
+        self.batch_size = batch_size
+        self.seed = seed
+
+        self.lock = threading.Lock()
+        self.latency: Dict[str, List[float]] = {kind: [] for kind in REQUEST_KINDS}
+        self.diagnose_latency: Dict[str, List[float]] = {kind: [] for kind in REQUEST_KINDS}
+        self.freshness: List[float] = []
+        self.loops_diagnosed = 0
+        self.errors = 0
+
+    def _request(self, kind: str, rng: random.Random):
+        """Issue one request and record its timings."""
+        size = self.batch_size if kind == "batch" else 1
+        loop_ids = rng.sample(self.loop_ids, min(size, len(self.loop_ids)))
+        started = time.perf_counter()
+        stop = datetime.utcnow()
+        series = self.reader.fetch(loop_ids, stop - timedelta(seconds=self.window_s), stop + timedelta(seconds=1))
+        now = time.time()
+        fetched = time.perf_counter()
+
+        items = [(loop_id, series[loop_id]) for loop_id in loop_ids if loop_id in series and len(series[loop_id])]
+        if not items:
+            raise RuntimeError("no data returned")
+        if kind == "batch":
+            self.client.run_batch(items)
+        elif kind == "binary":
+            self.client.run_binary(*items[0])
+        else:
+            self.client.run(*items[0])
+        finished = time.perf_counter()
+
+        with self.lock:
+            self.latency[kind].append(finished - started)
+            self.diagnose_latency[kind].append(finished - fetched)
+            self.freshness.extend(now - s.ts[-1] for _, s in items)
+            self.loops_diagnosed += len(items)
+
+    def _worker(self, index: int, deadline: float):
+        rng = random.Random(self.seed * 1000 + index)
+        interval = self.concurrency / self.rate if self.rate > 0 else 0.0
+        next_at = time.monotonic() + rng.uniform(0, interval)
+        while True:
+            if interval:
+                delay = next_at - time.monotonic()
+                if delay > 0:
+                    time.sleep(delay)
+                next_at += interval
+            if time.monotonic() >= deadline:
+                return
+            kind = rng.choices(self.kinds, weights=self.weights)[0]
+            try:
+                self._request(kind, rng)
+            except Exception:
+                with self.lock:
+                    self.errors += 1
+
+    def run(self, duration: float) -> Dict[str, Any]:
+        """
+        Drive requests for ``duration`` seconds.
+
+        Returns:
+            Request counts, latency percentiles (seconds) and freshness
+        """
+        deadline = time.monotonic() + duration
+        started = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=self.concurrency) as executor:
+            for future in [executor.submit(self._worker, i, deadline) for i in range(self.concurrency)]:
+                future.result()
+        elapsed = time.perf_counter() - started
+
+        all_latency = [value for values in self.latency.values() for value in values]
+        return {
+            "requests": len(all_latency),
+            "requests_per_s": len(all_latency) / elapsed,
+            "loops_per_s": self.loops_diagnosed / elapsed,
+            "errors": self.errors,
+            "latency": percentiles(all_latency),
+            "latency_by_kind": {kind: percentiles(values) for kind, values in self.latency.items() if values},
+            "diagnose_latency_by_kind": {
+                kind: percentiles(values) for kind, values in self.diagnose_latency.items() if values
+            },
+            "query_freshness": percentiles(self.freshness),
+        }
+
+
+def read_stream_metrics(url: str) -> Dict[str, float]:
+    """Read unlabelled samples from the streaming service's Prometheus endpoint."""
+    metrics = {}
+    try:
+        for line in requests.get(url, timeout=2.0).text.splitlines():
+            if line and not line.startswith("#") and "{" not in line:
+                name, value = line.rsplit(" ", 1)
+                metrics[name] = float(value)
+    except requests.RequestException:
+        pass
+    return metrics
+
+
+def run_scale_step(args, standin: InfluxStandIn, diagnostics_url: str, n_loops: int,
+                   windows: List[float], workdir: str) -> List[Dict[str, Any]]:
+    """Run every window size against one streaming service with ``n_loops`` loops."""
+    standin.store.loops.clear()
+    loop_ids = backfill(standin, n_loops, max(windows), args.stream_interval, args.seed)
+
+    metrics_port = free_port()
+    streaming = ServiceProcess("streaming", ["-m", "data_streaming_service.app"], {
+        "PYTHONPATH": STREAMING_SRC,
+        "STREAM_SOURCE": "scenario",
+        "SCENARIO_LOOPS": str(n_loops),
+        "SCENARIO_SEED": str(args.seed),
+        "STREAM_INTERVAL": str(args.stream_interval),
+        "STREAM_SINKS": "influx",
+        "INFLUXDB_URL": standin.url,
+        "INFLUXDB_TOKEN": "load-test",
+        "METRICS_PORT": str(metrics_port),
+        "METRICS_HOST": "127.0.0.1",
+        "LOG_LEVEL": "WARNING",
+        "LOG_FILE": "",
+        "PIPELINE_STATS_INTERVAL": "3600",
+    }, workdir)
+
+    rows = []
+    try:
+        wait_for(f"http://127.0.0.1:{metrics_port}/health")
+        time.sleep(args.warmup)
+
+        reader = InfluxSeriesReader(url=standin.url, token="load-test", pool_size=args.concurrency)
+        client = DiagnosticsClient(base_url=diagnostics_url, pool_size=args.concurrency)
+        for window_s in windows:
+            standin.store.reset_stats()
+            before = read_stream_metrics(f"http://127.0.0.1:{metrics_port}/metrics")
+            started = time.perf_counter()
+
+            driver = DiagnosticsDriver(reader, client, loop_ids, window_s, args.mix, args.concurrency,
+                                       args.rate, args.batch_size, args.seed)
+            diagnostics = driver.run(args.duration)
+
+            elapsed = time.perf_counter() - started
+            after = read_stream_metrics(f"http://127.0.0.1:{metrics_port}/metrics")
+            rows.append({
+                "loops": n_loops,
+                "window_s": window_s,
+                "ingest": {
+                    "samples_per_s": standin.store.samples_received / elapsed,
+                    "expected_per_s": n_loops / args.stream_interval,
+                    "writes": standin.store.writes,
+                    "lag": percentiles(standin.store.ingest_lags()),
+                    "cycle_overruns": (after.get("clpm_stream_cycle_overruns_total", 0)
+                                       - before.get("clpm_stream_cycle_overruns_total", 0)),
+                },
+                "diagnostics": diagnostics,
+            })
+            print_row(rows[-1])
+        reader.close()
+        client.close()
+    finally:
+        streaming.stop()
+    return rows
+
+
+def _ms(value: Optional[float]) -> str:
+    return "-" if value is None else f"{value * 1000:.1f}"
+
+
+def print_header():
+    print(f"{'loops':>6} {'window':>7} {'ingest/s':>9} {'expect/s':>9} {'lag p95':>8} "
+          f"{'fresh p50':>9} {'fresh p95':>9} {'req/s':>7} {'p50 ms':>8} {'p95 ms':>8} "
+          f"{'p99 ms':>8} {'errors':>6}")
+
+
+def print_row(row: Dict[str, Any]):
+    ingest, diagnostics = row["ingest"], row["diagnostics"]
+    print(f"{row['loops']:>6} {row['window_s']:>6.0f}s {ingest['samples_per_s']:>9.1f} "
+          f"{ingest['expected_per_s']:>9.1f} {_ms(ingest['lag']['p95']):>8} "
+          f"{_ms(diagnostics['query_freshness']['p50']):>9} {_ms(diagnostics['query_freshness']['p95']):>9} "
+          f"{diagnostics['requests_per_s']:>7.1f} {_ms(diagnostics['latency']['p50']):>8} "
+          f"{_ms(diagnostics['latency']['p95']):>8} {_ms(diagnostics['latency']['p99']):>8} "
+          f"{diagnostics['errors']:>6}", flush=True)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="End-to-end load test of the CLPM Python services")
+    parser.add_argument("--loops", default="10,100,500", help="Comma separated loop counts to test")
+    parser.add_argument("--windows", default="60,300,900", help="Comma separated diagnostics windows (seconds)")
+    parser.add_argument("--duration", type=float, default=20.0, help="Measurement seconds per window")
+    parser.add_argument("--warmup", type=float, default=3.0, help="Seconds of streaming before measuring")
+    parser.add_argument("--stream-interval", type=float, default=1.0, help="Streaming interval in seconds")
+    parser.add_argument("--mix", type=parse_mix, default=parse_mix("run=0.6,binary=0.2,batch=0.2"),
+                        help="Request mix, e.g. run=0.6,binary=0.2,batch=0.2")
+    parser.add_argument("--concurrency", type=int, default=8, help="Concurrent diagnostics workers")
+    parser.add_argument("--rate", type=float, default=0.0, help="Target requests/s in total (0 = closed loop)")
+    parser.add_argument("--batch-size", type=int, default=10, help="Loops per batch request")
+    parser.add_argument("--seed", type=int, default=0, help="Random seed")
+    parser.add_argument("--out", help="Write the results as JSON to this file")
+    args = parser.parse_args()
+
+    loop_counts = [int(value) for value in args.loops.split(",") if value.strip()]
+    windows = [float(value) for value in args.windows.split(",") if value.strip()]
+
+    workdir = tempfile.mkdtemp(prefix="clpm-load-test-")
+    standin = InfluxStandIn(retention_s=max(windows) + 120)
+    standin.start()
+
+    diagnostics_port = free_port()
+    diagnostics_url = f"http://127.0.0.1:{diagnostics_port}"
+    diagnostics = ServiceProcess("diagnostics", [
+        "-m", "uvicorn", "diagnostics_service.app:app",
+        "--host", "127.0.0.1", "--port", str(diagnostics_port), "--log-level", "warning"
+    ], {"PYTHONPATH": DIAGNOSTICS_SRC}, workdir)
+
+    print(f"InfluxDB stand-in: {standin.url}")
+    print(f"Diagnostics: {diagnostics_url}")
+    print(f"Logs: {workdir}\n")
+
+    results = []
+    try:
+        wait_for(f"{diagnostics_url}/openapi.json")
+        print_header()
+        for n_loops in loop_counts:
+            results.extend(run_scale_step(args, standin, diagnostics_url, n_loops, windows, workdir))
+    finally:
+        diagnostics.stop()
+        standin.stop()
+
+    if args.out:
+        with open(args.out, "w", encoding="utf-8") as f:
+            json.dump({
+                "config": {**vars(args), "mix": args.mix},
+                "results": results,
+            }, f, indent=2)
+        print(f"\nResults written to {args.out}")
+
+
+if __name__ == "__main__":
+    main()